@@ -0,0 +1,1045 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Benchmarks
+Performance benchmarks for the AI services entry points
+"""
+
+import os
+import re
+import math
+import sys
+import json
+import random
+import argparse
+import statistics
+import subprocess
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+SERVICE_DIR = Path(__file__).resolve().parent
+
+# Modules imported by the backend-facing entry points
+IMPORT_TARGETS = ['utils', 'parking_detector', 'video_processor', 'chatbot_service']
+
+# Command line invocations that must stay fast (no model load, no video decode)
+CLI_TARGETS = {
+    'video_processor_help': ['video_processor.py', '--help'],
+    'video_processor_invalid_config': [
+        'video_processor.py', '--video_path', 'missing.mp4', '--slot_config', '{not json'
+    ]
+}
+
+def _summarize(samples: List[float]) -> Dict:
+    """Summarize timing samples in milliseconds"""
+    return {
+        'runs': len(samples),
+        'min_ms': round(min(samples), 2),
+        'median_ms': round(statistics.median(samples), 2),
+        'max_ms': round(max(samples), 2)
+    }
+
+def _run_python(args: List[str]) -> subprocess.CompletedProcess:
+    """Run a fresh interpreter inside the service directory"""
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=SERVICE_DIR,
+        capture_output=True,
+        text=True
+    )
+
+def benchmark_imports(repeats: int = 5) -> Dict:
+    """
+    Measure cold import time of each entry point module
+
+    Every sample runs in a fresh interpreter so module caches never hide
+    the cost of heavy dependencies.
+
+    Args:
+        repeats: Number of fresh interpreters per module
+
+    Returns:
+        Dictionary of timing summaries keyed by module name
+    """
+    results = {}
+
+    for module_name in IMPORT_TARGETS:
+        code = (
+            "import time; start = time.perf_counter(); "
+            f"import {module_name}; "
+            "print((time.perf_counter() - start) * 1000)"
+        )
+        samples = []
+        for _ in range(repeats):
+            proc = _run_python(['-c', code])
+            if proc.returncode != 0:
+                results[module_name] = {'error': proc.stderr.strip().splitlines()[-1:]}
+                break
+            samples.append(float(proc.stdout.strip().splitlines()[-1]))
+        else:
+            results[module_name] = _summarize(samples)
+
+    return results
+
+def benchmark_cli_startup(repeats: int = 5) -> Dict:
+    """
+    Measure wall time of CLI invocations that exit before any processing
+
+    Args:
+        repeats: Number of runs per invocation
+
+    Returns:
+        Dictionary of timing summaries keyed by invocation name
+    """
+    results = {}
+
+    for name, args in CLI_TARGETS.items():
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _run_python(args)
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = _summarize(samples)
+
+    return results
+
+# Hand-written chat queries; build_intent_corpus() extends them with generated variants
+INTENT_QUERIES = [
+    "Where can I find parking?",
+    "How full is the parking lot?",
+    "What are the parking rates?",
+    "I need directions to the parking area",
+    "How long can I park here?",
+    "There's a problem with slot 15",
+    "Any free space on level 2 right now?",
+    "how much does it cost for 3 hours tomorrow",
+    "Is the north lot busy today? how busy is it",
+    "report broken gate at section B, the barrier is not working",
+    "help! how do I use this app, what can you do",
+    "price price price fee charge",
+    "available slots available now in zone 4",
+    "navigate me to the lot, where is the lot located",
+    "parking spot near floor 3 for 45 minutes",
+    "separately, what is the duration limit on weekends? weekend rates?",
+    "slot15 lot7 area51 12hours 30 minute",
+    "",
+    "hello there"
+]
+
+_CORPUS_WORDS = [
+    'find', 'parking', 'available', 'slot', 'free', 'space', 'where', 'park', 'spot',
+    'how', 'full', 'occupancy', 'rate', 'busy', 'spaces', 'left', 'now', 'get', 'there',
+    'directions', 'navigate', 'is', 'lot', 'location', 'long', 'time', 'limit', 'duration',
+    'much', 'hours', 'cost', 'price', 'fee', 'charge', 'pay', 'problem', 'issue', 'broken',
+    'not', 'working', 'report', 'complaint', 'help', 'assist', 'support', 'use', 'what',
+    'can', 'do', 'today', 'current', 'tomorrow', 'weekend', 'level', 'floor', 'section',
+    'area', 'zone', 'the', 'a', 'please', 'my', 'car', '2', '15', '3 hours', '20 minutes'
+]
+
+def build_intent_corpus(size: int = 2000, seed: int = 7) -> List[str]:
+    """Deterministic regression corpus of chat messages"""
+    rng = random.Random(seed)
+    corpus = list(INTENT_QUERIES)
+    while len(corpus) < size:
+        words = rng.choices(_CORPUS_WORDS, k=rng.randint(1, 14))
+        joiner = rng.choice([' ', ' ', ' ', ''])
+        corpus.append(joiner.join(words).capitalize() + rng.choice(['', '?', '!', '.']))
+    return corpus[:size]
+
+def reference_analyze(intent_patterns: Dict[str, List[str]], message: str) -> Tuple[str, float, Dict[str, Any]]:
+    """Original per-pattern re.search/re.findall intent analysis, kept as the regression oracle"""
+    message_lower = message.lower()
+    best_intent = 'general'
+    best_confidence = 0.0
+
+    for intent, patterns in intent_patterns.items():
+        for pattern in patterns:
+            if re.search(pattern, message_lower):
+                confidence = len(re.findall(pattern, message_lower)) * 0.3
+                if confidence > best_confidence:
+                    best_intent = intent
+                    best_confidence = min(confidence, 1.0)
+
+    entities = {}
+    numbers = re.findall(r'\b\d+\b', message_lower)
+    if numbers:
+        entities['numbers'] = [int(n) for n in numbers]
+    time_patterns = {
+        'now': r'\bnow\b|\bcurrent\b|\btoday\b',
+        'hours': r'(\d+)\s*hour',
+        'minutes': r'(\d+)\s*minute',
+        'tomorrow': r'\btomorrow\b',
+        'weekend': r'\bweekend\b'
+    }
+    for time_type, pattern in time_patterns.items():
+        matches = re.findall(pattern, message_lower)
+        if matches:
+            entities[time_type] = matches
+    for keyword in ['lot', 'level', 'floor', 'section', 'area', 'zone']:
+        if keyword in message_lower:
+            entities['location_type'] = keyword
+
+    return best_intent, best_confidence, entities
+
+def _queries_per_second(func, corpus: List[str], min_time: float = 0.5) -> float:
+    """Run func over the corpus repeatedly for at least min_time seconds"""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for message in corpus:
+            func(message)
+        count += len(corpus)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed
+
+def benchmark_intents(corpus_size: int = 2000) -> Dict:
+    """
+    Measure the compiled intent engine against the original matcher
+
+    Agreement with the original matcher is checked by tests/test_oracles.py.
+
+    Args:
+        corpus_size: Number of regression messages
+
+    Returns:
+        Dictionary with queries/second for both implementations
+    """
+    from chatbot_service import ChatbotService
+
+    chatbot = ChatbotService(api_key='')
+    corpus = build_intent_corpus(corpus_size)
+
+    return {
+        'corpus_size': len(corpus),
+        'reference_qps': round(_queries_per_second(
+            lambda m: reference_analyze(chatbot.intent_patterns, m), corpus)),
+        'engine_qps': round(_queries_per_second(chatbot._analyze_intent, corpus))
+    }
+
+def benchmark_intent_batch(corpus_size: int = 20000, processes: int = None) -> Dict:
+    """
+    Compare per-call process_query() against classify_batch() for log replay
+
+    Args:
+        corpus_size: Number of messages to classify
+        processes: Worker processes for the fan-out run (defaults to CPU count)
+
+    Returns:
+        Dictionary with mismatches and messages/second per mode
+    """
+    from chatbot_service import ChatbotService
+
+    chatbot = ChatbotService(api_key='')
+    corpus = build_intent_corpus(corpus_size)
+    processes = processes or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    per_call = [chatbot.process_query(message) for message in corpus]
+    per_call_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = chatbot.classify_batch(corpus)
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = chatbot.classify_batch(corpus, processes=processes)
+    parallel_seconds = time.perf_counter() - start
+
+    intents = batch.intents
+    confidences = batch.confidences.tolist()
+    mismatches = 0
+    for i, result in enumerate(per_call):
+        entities = {name: column[i] for name, column in batch.entities.items()
+                    if column[i] is not None}
+        if (result['intent'], result['confidence'], result['entities']) != \
+                (intents[i], confidences[i], entities):
+            mismatches += 1
+    mismatches += int(parallel.intent_codes.tolist() != batch.intent_codes.tolist())
+
+    return {
+        'corpus_size': len(corpus),
+        'mismatches': mismatches,
+        'processes': processes,
+        'process_query_mps': round(len(corpus) / per_call_seconds),
+        'batch_mps': round(len(corpus) / batch_seconds),
+        'batch_parallel_mps': round(len(corpus) / parallel_seconds)
+    }
+
+class _StandInLLMHandler(BaseHTTPRequestHandler):
+    """Chat completions stand-in that answers after a configurable delay"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if request.get('stream'):
+            self._stream_response()
+            return
+
+        time.sleep(self.server.latency)
+
+        body = json.dumps({
+            'choices': [{'message': {'role': 'assistant', 'content': 'Stand-in LLM response'}}]
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_response(self):
+        """Send the response as server-sent events spread over the configured latency"""
+        tokens = [word + ' ' for word in 'Stand-in streamed LLM response with several tokens'.split()]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        for token in tokens:
+            time.sleep(self.server.latency / len(tokens))
+            event = {'choices': [{'delta': {'content': token}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+class _StandInLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients abandoning timed-out requests reset their connections
+        pass
+
+def start_stand_in_llm(latency: float = 0.05) -> Tuple[_StandInLLMServer, str]:
+    """
+    Start a local stand-in for the chat completions API
+
+    Args:
+        latency: Seconds to wait before answering each request
+
+    Returns:
+        Tuple of (server, api_base URL); call server.shutdown() when done
+    """
+    server = _StandInLLMServer(('127.0.0.1', 0), _StandInLLMHandler)
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def _percentiles(samples: List[float]) -> Dict:
+    """p50/p95/p99/max of latency samples given in seconds, reported in milliseconds"""
+    ordered = sorted(samples)
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'max_ms': pick(1.0)}
+
+def hashing_encoder(dimensions: int = 512):
+    """
+    Deterministic stand-in for a sentence embedding model
+
+    Hashes word unigrams and character trigrams into a fixed-size vector, so
+    the semantic intent path can be timed without downloading a model.
+    """
+    import zlib
+    import numpy as np
+
+    def encode(texts: List[str]):
+        vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r'[a-z0-9]+', text.lower())
+            padded = f" {' '.join(words)} "
+            features = words + [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for feature in features:
+                vectors[row, zlib.crc32(feature.encode('utf-8')) % dimensions] += 1.0
+        return vectors
+
+    return encode
+
+def benchmark_semantic_intents(queries: int = 2000) -> Dict:
+    """
+    Latency of regex-only intents against regex with semantic fallback
+
+    Uses the local sentence-transformers model when installed, otherwise a
+    hashing stand-in encoder (reported as 'encoder').
+
+    Args:
+        queries: Number of messages classified per mode
+
+    Returns:
+        Latency percentiles and intent coverage per mode
+    """
+    import tempfile
+    from chatbot_service import ChatbotService
+    from semantic_intent import SemanticIntentClassifier, SENTENCE_TRANSFORMERS_AVAILABLE
+
+    encoder = None if SENTENCE_TRANSFORMERS_AVAILABLE else hashing_encoder()
+    classifier_options = {'encoder': encoder} if encoder is None else \
+        {'encoder': encoder, 'model_name': 'hashing-stand-in'}
+    corpus = build_intent_corpus(queries)
+
+    def run(chatbot):
+        samples = []
+        general = 0
+        for message in corpus:
+            start = time.perf_counter()
+            query = chatbot._analyze_intent(message)
+            samples.append(time.perf_counter() - start)
+            general += query.intent == 'general'
+        return dict(_percentiles(samples), general_rate=round(general / len(corpus), 3))
+
+    regex_chatbot = ChatbotService(api_key='')
+    with tempfile.TemporaryDirectory() as cache_dir:
+        semantic_chatbot = ChatbotService(api_key='')
+        semantic_chatbot.semantic_classifier = SemanticIntentClassifier(cache_dir=cache_dir, **classifier_options)
+
+        start = time.perf_counter()
+        semantic_chatbot.semantic_classifier.warmup()
+        centroid_build_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        # Second classifier reads the centroids back from the disk cache
+        start = time.perf_counter()
+        SemanticIntentClassifier(cache_dir=cache_dir, **classifier_options).centroids
+        centroid_load_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        results = {
+            'centroid_build_ms': centroid_build_ms,
+            'centroid_cache_load_ms': centroid_load_ms,
+            'regex': run(regex_chatbot),
+            'regex_with_semantic_fallback': run(semantic_chatbot),
+            'embedding_cache': semantic_chatbot.semantic_classifier.get_stats()
+        }
+    return results
+
+def benchmark_llm(latency: float = 0.05, requests: int = 100, concurrency: int = 16,
+                  timeout: float = 1.0) -> Dict:
+    """
+    Measure async chatbot latency against a stand-in LLM server
+
+    Args:
+        latency: Simulated upstream latency in seconds
+        requests: Number of concurrent queries to issue
+        concurrency: ChatbotService async concurrency limit
+        timeout: Per-call LLM timeout in seconds
+
+    Returns:
+        Latency percentiles and LLM call statistics
+    """
+    from chatbot_service import ChatbotService
+
+    server, api_base = start_stand_in_llm(latency)
+    chatbot = ChatbotService(api_key='stand-in', api_base=api_base,
+                             llm_timeout=timeout, max_concurrency=concurrency)
+    queries = build_intent_corpus(requests)
+
+    async def timed_query(message):
+        start = time.perf_counter()
+        await chatbot.process_query_async(message)
+        return time.perf_counter() - start
+
+    async def run():
+        try:
+            start = time.perf_counter()
+            samples = await asyncio.gather(*(timed_query(q) for q in queries))
+            return samples, time.perf_counter() - start
+        finally:
+            await chatbot.aclose()
+
+    try:
+        samples, wall_time = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    return {
+        'upstream_latency_ms': latency * 1000,
+        'timeout_ms': timeout * 1000,
+        'requests': requests,
+        'concurrency': concurrency,
+        'wall_time_s': round(wall_time, 3),
+        'latency': _percentiles(samples),
+        'llm_stats': chatbot.llm_stats,
+        'response_cache': chatbot.get_cache_stats()
+    }
+
+def benchmark_streaming(latency: float = 0.5, requests: int = 10) -> Dict:
+    """
+    Compare time-to-first-byte of buffered and streamed responses
+
+    Args:
+        latency: Simulated total generation time in seconds
+        requests: Sequential queries per mode
+
+    Returns:
+        Time-to-first-byte and total latency percentiles for both modes
+    """
+    from chatbot_service import ChatbotService
+
+    server, api_base = start_stand_in_llm(latency)
+    chatbot = ChatbotService(api_key='stand-in', api_base=api_base,
+                             llm_timeout=latency * 4, response_cache_size=0)
+    queries = build_intent_corpus(requests, seed=11)
+
+    async def run():
+        buffered, first_chunk, streamed = [], [], []
+        try:
+            for message in queries:
+                start = time.perf_counter()
+                await chatbot.process_query_async(message)
+                buffered.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                first = None
+                async for event in chatbot.stream_query_async(message):
+                    if event['type'] == 'chunk' and first is None:
+                        first = time.perf_counter() - start
+                first_chunk.append(first if first is not None else time.perf_counter() - start)
+                streamed.append(time.perf_counter() - start)
+        finally:
+            await chatbot.aclose()
+        return buffered, first_chunk, streamed
+
+    try:
+        buffered, first_chunk, streamed = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    return {
+        'generation_latency_ms': latency * 1000,
+        'buffered_ttfb': _percentiles(buffered),
+        'streamed_ttfb': _percentiles(first_chunk),
+        'streamed_total': _percentiles(streamed),
+        'llm_stats': chatbot.llm_stats
+    }
+
+def synthetic_lots(count: int, seed: int = 3) -> List[Dict]:
+    """Deterministic parking lot context entries"""
+    rng = random.Random(seed)
+    lots = []
+    for i in range(count):
+        total = rng.randint(20, 500)
+        available = rng.randint(0, total)
+        lots.append({
+            'id': i + 1,
+            'name': f"Lot {i + 1}",
+            'available_slots': available,
+            'total_slots': total,
+            'occupancy_rate': round((total - available) / total * 100, 1)
+        })
+    return lots
+
+def reference_build_prompt(system_context: str, message: str, context: Dict, query) -> List[Dict]:
+    """Original prompt construction (every lot listed, system context sent twice)"""
+    lots_info = [
+        f"Lot {lot.get('name', 'Unknown')}: {lot.get('available_slots', 0)} available out of "
+        f"{lot.get('total_slots', 0)} total slots"
+        for lot in context['parking_lots']
+    ]
+    context_info = f"Current parking status:\n{chr(10).join(lots_info)}\n"
+    prompt = f"""
+            {system_context}
+            
+            Context information:
+            {context_info}
+            
+            User query intent: {query.intent}
+            Detected entities: {query.entities}
+            
+            User message: "{message}"
+            
+            Please provide a helpful response based on the context and intent.
+            """
+    return [
+        {"role": "system", "content": system_context},
+        {"role": "user", "content": prompt}
+    ]
+
+def benchmark_prompts(lot_counts: Tuple[int, ...] = (1, 10, 100, 1000, 5000)) -> Dict:
+    """
+    Measure LLM prompt size and build latency against the number of lots
+
+    Args:
+        lot_counts: Context sizes to measure
+
+    Returns:
+        Prompt size (characters, estimated tokens) and build time per lot count
+    """
+    from chatbot_service import ChatbotService, PromptBuilder
+
+    chatbot = ChatbotService(api_key='')
+    message = "Where can I find parking near lot 7 right now?"
+    query = chatbot._analyze_intent(message)
+
+    def measure(build, context):
+        messages = build(chatbot.system_context, message, context, query)
+        text = ''.join(m['content'] for m in messages)
+        repeats = 20
+        start = time.perf_counter()
+        for _ in range(repeats):
+            build(chatbot.system_context, message, context, query)
+        return {
+            'chars': len(text),
+            'est_tokens': PromptBuilder.estimate_tokens(text),
+            'build_ms': round((time.perf_counter() - start) / repeats * 1000, 3)
+        }
+
+    results = {}
+    for count in lot_counts:
+        context = {'parking_lots': synthetic_lots(count), 'current_time': '2024-01-01T12:00:00'}
+        results[str(count)] = {
+            'reference': measure(reference_build_prompt, context),
+            'prompt_builder': measure(chatbot.prompt_builder.build, context)
+        }
+    return results
+
+def synthetic_slot_config(size: Tuple[int, int], slot_count: int) -> List[Dict]:
+    """
+    Lay out parking slots in a grid covering a frame
+
+    Args:
+        size: Frame size (width, height)
+        slot_count: Number of slots
+
+    Returns:
+        Slot configuration in the video processor's format
+    """
+    width, height = size
+    # Slots are about twice as tall as wide
+    cols = min(slot_count, max(1, round(math.sqrt(2 * slot_count * width / height))))
+    rows = max(1, math.ceil(slot_count / cols))
+    cell_w, cell_h = width // cols, height // rows
+    margin_x, margin_y = max(cell_w // 10, 1), max(cell_h // 10, 1)
+
+    slots = []
+    for i in range(slot_count):
+        row, col = divmod(i, cols)
+        slots.append({
+            'id': i + 1,
+            'slot_number': f"{chr(ord('A') + row % 26)}{col + 1}",
+            'coordinates': {
+                'x': col * cell_w + margin_x,
+                'y': row * cell_h + margin_y,
+                'width': cell_w - 2 * margin_x,
+                'height': cell_h - 2 * margin_y
+            }
+        })
+    return slots
+
+def write_synthetic_video(path: str, size: Tuple[int, int] = (1280, 720), duration: float = 5.0,
+                          fps: int = 30, slot_count: int = 24, moving_vehicles: int = 4,
+                          seed: int = 11) -> List[Dict]:
+    """
+    Write a deterministic synthetic parking lot video
+
+    The lot is a grid of marked slots. Parked vehicles are filled rectangles
+    that arrive and leave at seeded times; a few more drive across the lot.
+    The same arguments always produce the same frames.
+
+    Args:
+        path: Output path (.mp4 or .avi)
+        size: Frame size (width, height)
+        duration: Length in seconds
+        fps: Frames per second
+        slot_count: Number of parking slots
+        moving_vehicles: Number of vehicles driving through
+        seed: Random seed for the scene
+
+    Returns:
+        Slot configuration matching the drawn slots
+    """
+    import cv2
+    import numpy as np
+
+    width, height = size
+    frames = max(1, int(round(duration * fps)))
+    rng = np.random.default_rng(seed)
+    slots = synthetic_slot_config(size, slot_count)
+
+    background = rng.integers(60, 110, (height, width, 3), dtype=np.uint8)
+    for slot in slots:
+        c = slot['coordinates']
+        cv2.rectangle(background, (c['x'], c['y']), (c['x'] + c['width'], c['y'] + c['height']),
+                      (230, 230, 230), 2)
+
+    # Each slot is occupied over one seeded [arrival, departure) frame range, or never
+    stays = []
+    for slot in slots:
+        if rng.random() < 0.7:
+            arrival, departure = sorted(rng.integers(-frames, 2 * frames, 2).tolist())
+            stays.append((arrival, departure, tuple(int(c) for c in rng.integers(0, 255, 3))))
+        else:
+            stays.append(None)
+
+    drivers = [(int(rng.integers(0, width)), int(rng.integers(0, max(height - 60, 1))),
+                int(rng.integers(2, 9)), tuple(int(c) for c in rng.integers(0, 255, 3)))
+               for _ in range(moving_vehicles)]
+
+    fourcc = 'MJPG' if path.lower().endswith('.avi') else 'mp4v'
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write synthetic video: {path}")
+    try:
+        frame = np.empty_like(background)
+        for i in range(frames):
+            np.copyto(frame, background)
+            for slot, stay in zip(slots, stays):
+                if stay and stay[0] <= i < stay[1]:
+                    c = slot['coordinates']
+                    inset_x, inset_y = c['width'] // 8, c['height'] // 10
+                    cv2.rectangle(frame, (c['x'] + inset_x, c['y'] + inset_y),
+                                  (c['x'] + c['width'] - inset_x, c['y'] + c['height'] - inset_y),
+                                  stay[2], -1)
+            for x, y, speed, color in drivers:
+                left = (x + i * speed) % width
+                cv2.rectangle(frame, (left, y), (left + 60, y + 40), color, -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return slots
+
+# Decoder settings compared by benchmark_decode(); None entries are filled per video
+DECODE_SETTINGS = {
+    'default': {},
+    'ffmpeg_1_thread': {'backend': 'ffmpeg', 'threads': 1},
+    'ffmpeg_all_threads': {'backend': 'ffmpeg', 'threads': 0},
+    'hw_acceleration': {'hw_acceleration': True},
+    'grayscale': {'threads': 0, 'grayscale': True},
+    'half_resolution': {'threads': 0, 'max_width': None},
+    'half_resolution_grayscale': {'threads': 0, 'max_width': None, 'grayscale': True}
+}
+
+def benchmark_decode(video_paths: List[str] = None, repeats: int = 3) -> Dict:
+    """
+    Measure decode throughput of videos under different decoder settings
+
+    Args:
+        video_paths: Videos to decode (a synthetic 720p video is generated if omitted)
+        repeats: Full decodes per setting; the fastest is reported
+
+    Returns:
+        Frames per second and milliseconds per frame per video and setting
+    """
+    import tempfile
+    from utils import DecodeOptions, FrameSource, probe_video
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not video_paths:
+            video_paths = [os.path.join(tmp_dir, 'synthetic_720p.mp4')]
+            write_synthetic_video(video_paths[0])
+
+        results = {}
+        for video_path in video_paths:
+            info = probe_video(video_path, open_capture=False)[1]
+            video_results = {'video': info}
+
+            for name, settings in DECODE_SETTINGS.items():
+                settings = dict(settings)
+                if 'max_width' in settings:
+                    settings['max_width'] = max(info['width'] // 2, 1)
+                decode = DecodeOptions(**settings)
+
+                best = None
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    with FrameSource(video_path, decode) as source:
+                        if not source.isOpened():
+                            break
+                        backend = source.getBackendName()
+                        frames = sum(1 for _ in source)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+
+                if best is None or not frames:
+                    video_results[name] = {'error': 'could not decode with these settings'}
+                    continue
+                video_results[name] = {
+                    'backend': backend,
+                    'frames': frames,
+                    'fps': round(frames / best, 1),
+                    'ms_per_frame': round(best / frames * 1000, 3)
+                }
+            results[os.path.basename(video_path)] = video_results
+
+    return results
+
+def _pipeline_case(case: Dict) -> Dict:
+    """Run one process_video measurement (called in a fresh interpreter)"""
+    from profiling import peak_rss_mb
+    from synthetic_detector import SyntheticDetector
+    from video_processor import VideoProcessor
+
+    processor = VideoProcessor(case.get('model_path'))
+    if case['detector'] == 'mock':
+        processor.detector.model = None
+        processor.detector.synthetic = SyntheticDetector(seed=case['seed'])
+    elif processor.detector.model is None:
+        return {'error': 'model could not be loaded'}
+
+    start = time.perf_counter()
+    results = processor.process_video(case['video_path'], case['slot_config'], case['analysis_type'])
+    elapsed = time.perf_counter() - start
+
+    return {
+        'detector': 'mock' if processor.detector.model is None else 'yolo',
+        'frames': results['total_frames'],
+        'processed_frames': results['processed_frames'],
+        'wall_s': round(elapsed, 3),
+        'fps': round(results['total_frames'] / elapsed, 1) if elapsed > 0 else 0.0,
+        'stages': results['processing_stats']['stages'],
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def benchmark_pipeline(resolutions: List[Tuple[int, int]] = ((1280, 720),), duration: float = 10.0,
+                       slot_count: int = 24, analysis_types: Tuple[str, ...] = ('occupancy', 'duration', 'full'),
+                       detector: str = 'mock', model_path: str = None, seed: int = 11) -> Dict:
+    """
+    Measure process_video throughput, stage latency and peak RSS on synthetic videos
+
+    Every case runs in a fresh interpreter so peak RSS belongs to that case
+    alone. Videos and (with the mock detector) detections are seeded, so
+    runs on different commits process identical inputs.
+
+    Args:
+        resolutions: Video sizes (width, height)
+        duration: Video length in seconds
+        slot_count: Number of parking slots
+        analysis_types: Analysis types to run
+        detector: 'mock' (offline) or 'yolo' (real model)
+        model_path: YOLO weights for the real model (default model if omitted)
+        seed: Seed for the video and mock detections
+
+    Returns:
+        Results per resolution and analysis type
+    """
+    import tempfile
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for width, height in resolutions:
+            video_path = os.path.join(tmp_dir, f'synthetic_{width}x{height}.mp4')
+            slot_config = write_synthetic_video(video_path, (width, height), duration,
+                                                slot_count=slot_count, seed=seed)
+
+            resolution_results = {}
+            for analysis_type in analysis_types:
+                case = {
+                    'video_path': video_path,
+                    'slot_config': slot_config,
+                    'analysis_type': analysis_type,
+                    'detector': detector,
+                    'model_path': model_path,
+                    'seed': seed
+                }
+                code = (
+                    "import sys, json; from benchmark import _pipeline_case; "
+                    "print(json.dumps(_pipeline_case(json.loads(sys.argv[1]))))"
+                )
+                proc = _run_python(['-c', code, json.dumps(case)])
+                if proc.returncode != 0:
+                    resolution_results[analysis_type] = {'error': proc.stderr.strip().splitlines()[-1:]}
+                    continue
+                resolution_results[analysis_type] = json.loads(proc.stdout.strip().splitlines()[-1])
+            results[f'{width}x{height}'] = resolution_results
+
+    return results
+
+def synthetic_detections(size: Tuple[int, int], count: int, seed: int = 5) -> List[Dict]:
+    """Random vehicle detections inside a frame"""
+    rng = random.Random(seed)
+    width, height = size
+    detections = []
+    for _ in range(count):
+        w, h = rng.randint(30, 150), rng.randint(30, 150)
+        detections.append({
+            'bbox': [rng.randint(0, width - w), rng.randint(0, height - h), w, h],
+            'confidence': rng.uniform(0.3, 0.99),
+            'class_id': 2,
+            'class': 'car'
+        })
+    return detections
+
+def _best_ms(func, repeats: int) -> float:
+    """Fastest of several timed calls in milliseconds"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 3)
+
+def benchmark_association(sizes: Tuple[Tuple[int, int], ...] = ((10, 10), (100, 100), (1000, 200)),
+                          nms_counts: Tuple[int, ...] = (100, 500, 2000), repeats: int = 3) -> Dict:
+    """
+    Measure detect_in_regions, non_max_suppression and the mock detector at scale
+
+    detect_in_regions runs against fixed synthetic detections so only the
+    slot association is measured, not the model. The mock detector is
+    measured per slot count to show it stays negligible next to association.
+
+    Args:
+        sizes: (slot count, detection count) pairs for detect_in_regions
+        nms_counts: Detection counts for non_max_suppression
+        repeats: Calls per measurement; the fastest is reported
+
+    Returns:
+        Milliseconds per call per size
+    """
+    import numpy as np
+    from parking_detector import ParkingDetector
+    from synthetic_detector import SyntheticDetector
+    from utils import non_max_suppression
+
+    frame_size = (1920, 1080)
+    frame = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    detector = ParkingDetector()
+
+    regions = {}
+    for slot_count, detection_count in sizes:
+        slots = synthetic_slot_config(frame_size, slot_count)
+        detections = synthetic_detections(frame_size, detection_count)
+        detector.detect_vehicles = lambda _frame, _slots=None, detections=detections: detections
+        regions[f'{slot_count}_slots_{detection_count}_detections'] = {
+            'ms': _best_ms(lambda: detector.detect_in_regions(frame, slots), repeats)
+        }
+
+    nms = {}
+    for count in nms_counts:
+        detections = synthetic_detections(frame_size, count)
+        nms[f'{count}_detections'] = {
+            'ms': _best_ms(lambda: non_max_suppression(detections, 0.5), repeats)
+        }
+
+    mock = {}
+    for slot_count in sorted({slot_count for slot_count, _ in sizes}):
+        slots = synthetic_slot_config(frame_size, slot_count)
+        synthetic = SyntheticDetector(seed=0)
+        mock[f'{slot_count}_slots'] = {
+            'ms': _best_ms(lambda: synthetic.detect(frame, slots), repeats)
+        }
+
+    return {'detect_in_regions': regions, 'non_max_suppression': nms, 'synthetic_detector': mock}
+
+# Metrics compared against a baseline; higher is better only for throughput
+REGRESSION_TOLERANCE_PCT = 10.0
+COMPARED_METRICS = {'fps': True, 'ms': False, 'wall_s': False, 'peak_rss_mb': False,
+                    'mean_ms': False, 'p50_ms': False, 'p90_ms': False, 'p99_ms': False}
+
+def compare_results(baseline: Dict, current: Dict, path: str = '') -> Dict:
+    """
+    Compare two benchmark result trees metric by metric
+
+    Args:
+        baseline: Results of an earlier run
+        current: Results of this run
+        path: Key path of the compared subtrees
+
+    Returns:
+        Flat mapping of metric path to baseline, current, percent change and
+        whether it got worse by more than REGRESSION_TOLERANCE_PCT
+    """
+    changes = {}
+    for key, value in current.items():
+        if key not in baseline:
+            continue
+        key_path = f'{path}.{key}' if path else key
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            changes.update(compare_results(baseline[key], value, key_path))
+        elif key in COMPARED_METRICS and isinstance(value, (int, float)) and baseline[key]:
+            change = (value - baseline[key]) / baseline[key] * 100
+            changes[key_path] = {
+                'baseline': baseline[key],
+                'current': value,
+                'change_pct': round(change, 1),
+                'regression': (-change if COMPARED_METRICS[key] else change) > REGRESSION_TOLERANCE_PCT
+            }
+    return changes
+
+def _git_commit() -> str:
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR,
+                              capture_output=True, text=True)
+        return proc.stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='AI Parking System Benchmarks')
+    parser.add_argument('benchmark', choices=['imports', 'intents', 'llm', 'prompts', 'decode', 'pipeline'],
+                       help='Benchmark to run')
+    parser.add_argument('--repeats', type=int, default=5, help='Samples per measurement')
+    parser.add_argument('--output', help='Optional path to save results as JSON')
+    parser.add_argument('--videos', nargs='+',
+                       help='Videos for the decode benchmark (synthetic if omitted)')
+    parser.add_argument('--resolutions', nargs='+', default=['1280x720'],
+                       help='Synthetic video sizes for the pipeline benchmark (WIDTHxHEIGHT)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Synthetic video length in seconds')
+    parser.add_argument('--slots', type=int, default=24, help='Parking slots in the synthetic lot')
+    parser.add_argument('--detector', default='mock', choices=['mock', 'yolo'],
+                       help='Mock detector (offline) or a real YOLO model')
+    parser.add_argument('--model_path', help='YOLO weights for --detector yolo')
+    parser.add_argument('--seed', type=int, default=11, help='Seed for synthetic videos and mock detections')
+    parser.add_argument('--baseline', help='Earlier results JSON to compare against')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'imports':
+        results = {
+            'module_import': benchmark_imports(args.repeats),
+            'cli_startup': benchmark_cli_startup(args.repeats)
+        }
+    elif args.benchmark == 'intents':
+        results = {
+            'engine': benchmark_intents(),
+            'batch': benchmark_intent_batch(),
+            'semantic': benchmark_semantic_intents()
+        }
+    elif args.benchmark == 'llm':
+        results = {
+            'fast_upstream': benchmark_llm(latency=0.05, timeout=1.0),
+            'slow_upstream': benchmark_llm(latency=2.0, timeout=0.25),
+            'streaming': benchmark_streaming()
+        }
+    elif args.benchmark == 'prompts':
+        results = benchmark_prompts()
+    elif args.benchmark == 'decode':
+        results = benchmark_decode(args.videos, args.repeats)
+    elif args.benchmark == 'pipeline':
+        resolutions = [tuple(int(v) for v in r.lower().split('x')) for r in args.resolutions]
+        results = {
+            'process_video': benchmark_pipeline(resolutions, args.duration, args.slots,
+                                                detector=args.detector, model_path=args.model_path,
+                                                seed=args.seed),
+            'association': benchmark_association(repeats=args.repeats)
+        }
+
+    results = {
+        'benchmark': args.benchmark,
+        'python': sys.version.split()[0],
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results['baseline_commit'] = baseline.get('commit')
+        results['comparison'] = compare_results(baseline.get('results', {}), results['results'])
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -7,22 +7,32 @@ LLM-powered chatbot for parking system queries
 import json
 import os
 import re
+import heapq
+import asyncio
+import textwrap
+import time
+import itertools
+import multiprocessing
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-import requests
+from typing import Dict, List, Optional, Any, Tuple, Iterable, Iterator, AsyncIterator
 from dataclasses import dataclass
 
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    print("Warning: OpenAI library not available, using mock responses")
+from utils import setup_logging, module_available, lazy_import
 
-from utils import setup_logging
+from semantic_intent import SemanticIntentClassifier, SENTENCE_TRANSFORMERS_AVAILABLE
+
+np = lazy_import('numpy')
+
+# openai/aiohttp are imported only when a client is actually configured
+OPENAI_AVAILABLE = module_available('openai')
+AIOHTTP_AVAILABLE = module_available('aiohttp')
 
 logger = setup_logging(__name__)
 
+DEFAULT_API_BASE = 'https://api.openai.com/v1'
+
 @dataclass
 class ParkingQuery:
     """Data class for parking-related queries"""
@@ -31,21 +41,927 @@ class ParkingQuery:
     confidence: float
     original_text: str
 
+# Entity patterns, applied to the lowercased message in this order
+ENTITY_PATTERNS = {
+    'numbers': r'\b\d+\b',  # Could be lot numbers, slot numbers, etc.
+    'now': r'\bnow\b|\bcurrent\b|\btoday\b',
+    'hours': r'(\d+)\s*hour',
+    'minutes': r'(\d+)\s*minute',
+    'tomorrow': r'\btomorrow\b',
+    'weekend': r'\bweekend\b'
+}
+
+# Location references; the last keyword (in this order) present in the message wins
+LOCATION_KEYWORDS = ['lot', 'level', 'floor', 'section', 'area', 'zone']
+
+_REGEX_META = set('.^$*+?{}[]\\|()')
+_DIGIT_TRIGGER = r'\d'
+
+def _literal_triggers(pattern: str) -> Optional[List[str]]:
+    """
+    Find literal strings one of which must start every match of a pattern
+    
+    Args:
+        pattern: Regular expression source
+        
+    Returns:
+        List of trigger literals (or the digit trigger), None if the pattern
+        has no usable literal prefix and must always be evaluated
+    """
+    if '|' in pattern and ('(' in pattern or '[' in pattern or '\\|' in pattern):
+        return None
+    
+    triggers = []
+    for alternative in pattern.split('|'):
+        while alternative.startswith(r'\b'):
+            alternative = alternative[2:]
+        if alternative.startswith('(') and not alternative.startswith('(?'):
+            alternative = alternative[1:]
+        if alternative.startswith(_DIGIT_TRIGGER):
+            triggers.append(_DIGIT_TRIGGER)
+            continue
+        
+        end = 0
+        while end < len(alternative) and alternative[end] not in _REGEX_META:
+            end += 1
+        # A quantifier makes the preceding character optional
+        if end < len(alternative) and alternative[end] in '*?{':
+            end -= 1
+        if end <= 0:
+            return None
+        triggers.append(alternative[:end])
+    
+    return triggers
+
+@dataclass
+class _Rule:
+    """Precompiled pattern with the trigger literals its matches start with"""
+    name: str
+    regex: re.Pattern
+    triggers: Optional[List[str]]
+
+@dataclass
+class IntentMatch:
+    """Result of a single intent engine scan"""
+    intent: str
+    confidence: float
+    entities: Dict[str, Any]
+    intent_hits: Dict[str, int]
+
+class IntentEngine:
+    """
+    Compiled single-pass intent and entity matcher
+    
+    One combined alternation (one named group per trigger literal) is
+    scanned over the message once to find every position where any
+    intent or entity pattern could start. Each pattern is then matched only
+    at its candidate positions, which reproduces re.findall() counts exactly.
+    """
+    
+    def __init__(self, intent_patterns: Dict[str, List[str]],
+                 entity_patterns: Optional[Dict[str, str]] = None,
+                 location_keywords: Optional[List[str]] = None):
+        """
+        Compile intent and entity patterns
+        
+        Args:
+            intent_patterns: Mapping of intent to regex patterns (order matters for ties)
+            entity_patterns: Mapping of entity type to regex pattern
+            location_keywords: Keywords reported as 'location_type'
+        """
+        entity_patterns = ENTITY_PATTERNS if entity_patterns is None else entity_patterns
+        self.location_keywords = LOCATION_KEYWORDS if location_keywords is None else location_keywords
+        
+        self.intent_rules = [
+            (intent, self._compile(intent, pattern))
+            for intent, patterns in intent_patterns.items()
+            for pattern in patterns
+        ]
+        self.entity_rules = [self._compile(name, pattern) for name, pattern in entity_patterns.items()]
+        
+        triggers = set(self.location_keywords)
+        for rule in [rule for _, rule in self.intent_rules] + self.entity_rules:
+            triggers.update(rule.triggers or [])
+        
+        literals = sorted((t for t in triggers if t != _DIGIT_TRIGGER), key=len, reverse=True)
+        if _DIGIT_TRIGGER in triggers:
+            literals.append(_DIGIT_TRIGGER)
+        
+        # Each alternative consumes only the trigger's first character and checks
+        # the rest in a lookahead: the regex engine skips alternatives on their
+        # leading literal, search() can jump between possible first characters,
+        # and overlapping triggers are still found at every position.
+        alternatives = []
+        self._group_triggers = {}
+        for i, literal in enumerate(literals):
+            if literal == _DIGIT_TRIGGER:
+                alternatives.append(f"{_DIGIT_TRIGGER}(?P<t{i}>)")
+                self._group_triggers[f"t{i}"] = [literal]
+                continue
+            
+            alternatives.append(f"{re.escape(literal[0])}(?=(?P<t{i}>{re.escape(literal[1:])}))")
+            # The longest literal wins the alternation, so it also satisfies its prefixes
+            covered = [literal] + [other for other in literals
+                                   if other != literal and other != _DIGIT_TRIGGER
+                                   and literal.startswith(other)]
+            if _DIGIT_TRIGGER in triggers and literal[0].isdigit():
+                covered.append(_DIGIT_TRIGGER)
+            self._group_triggers[f"t{i}"] = covered
+        
+        self._scanner = re.compile('|'.join(alternatives)) if alternatives else None
+        
+        # Trigger -> indices of the rules that can only match where it occurs
+        self._intent_index = self._index_rules([rule for _, rule in self.intent_rules])
+        self._entity_index = self._index_rules(self.entity_rules)
+    
+    @staticmethod
+    def _index_rules(rules: List[_Rule]) -> Tuple[List[int], Dict[str, List[int]]]:
+        """Split rules into always-evaluated ones and a trigger -> rule indices map"""
+        always = []
+        by_trigger: Dict[str, List[int]] = {}
+        for index, rule in enumerate(rules):
+            if rule.triggers is None:
+                always.append(index)
+            else:
+                for trigger in rule.triggers:
+                    by_trigger.setdefault(trigger, []).append(index)
+        return always, by_trigger
+    
+    @staticmethod
+    def _candidate_rules(index: Tuple[List[int], Dict[str, List[int]]],
+                         positions: Dict[str, List[int]]) -> List[int]:
+        """Indices (in pattern order) of rules whose trigger occurs in the message"""
+        always, by_trigger = index
+        candidates = set(always)
+        for trigger in positions:
+            rules = by_trigger.get(trigger)
+            if rules:
+                candidates.update(rules)
+        return sorted(candidates)
+    
+    @staticmethod
+    def _compile(name: str, pattern: str) -> _Rule:
+        return _Rule(name=name, regex=re.compile(pattern), triggers=_literal_triggers(pattern))
+    
+    def _scan(self, message: str) -> Dict[str, List[int]]:
+        """Collect start positions of every trigger in one pass over the message"""
+        positions: Dict[str, List[int]] = {}
+        if self._scanner is None:
+            return positions
+        
+        group_triggers = self._group_triggers
+        for match in self._scanner.finditer(message):
+            start = match.start()
+            for trigger in group_triggers[match.lastgroup]:
+                positions.setdefault(trigger, []).append(start)
+        return positions
+    
+    @staticmethod
+    def _find_all(rule: _Rule, message: str, positions: Dict[str, List[int]]) -> List:
+        """Equivalent of rule.regex.findall(message) using the scanned candidate positions"""
+        if rule.triggers is None:
+            return rule.regex.findall(message)
+        
+        if len(rule.triggers) == 1:
+            candidates = positions.get(rule.triggers[0], ())
+        else:
+            candidates = sorted({pos for trigger in rule.triggers for pos in positions.get(trigger, ())})
+        
+        regex = rule.regex
+        matches = []
+        cursor = 0
+        for pos in candidates:
+            if pos < cursor:
+                continue
+            match = regex.match(message, pos)
+            if match:
+                matches.append(match)
+                cursor = match.end() if match.end() > pos else pos + 1
+        
+        if regex.groups == 0:
+            return [m.group(0) for m in matches]
+        if regex.groups == 1:
+            return [m.group(1) for m in matches]
+        return [m.groups() for m in matches]
+    
+    def analyze(self, message: str) -> IntentMatch:
+        """
+        Classify a (lowercased) message and extract its entities
+        
+        Args:
+            message: Lowercased user message
+            
+        Returns:
+            IntentMatch with best intent, confidence, entities and per-intent hit counts
+        """
+        positions = self._scan(message)
+        
+        best_intent = 'general'
+        best_confidence = 0.0
+        intent_hits = {}
+        
+        # Rules are evaluated in pattern order so ties resolve as before
+        for index in self._candidate_rules(self._intent_index, positions):
+            intent, rule = self.intent_rules[index]
+            hits = len(self._find_all(rule, message, positions))
+            if not hits:
+                continue
+            intent_hits[intent] = intent_hits.get(intent, 0) + hits
+            
+            confidence = hits * 0.3
+            if confidence > best_confidence:
+                best_intent = intent
+                best_confidence = min(confidence, 1.0)
+        
+        entities = {}
+        for index in self._candidate_rules(self._entity_index, positions):
+            rule = self.entity_rules[index]
+            matches = self._find_all(rule, message, positions)
+            if matches:
+                entities[rule.name] = [int(n) for n in matches] if rule.name == 'numbers' else matches
+        
+        for keyword in reversed(self.location_keywords):
+            if keyword in positions:
+                entities['location_type'] = keyword
+                break
+        
+        return IntentMatch(
+            intent=best_intent,
+            confidence=best_confidence,
+            entities=entities,
+            intent_hits=intent_hits
+        )
+
+@dataclass
+class IntentBatch:
+    """
+    Columnar intent classification results for a batch of messages
+    
+    Row i of every column belongs to the i-th input message. Entity columns
+    hold None for messages without that entity.
+    """
+    labels: List[str]
+    intent_codes: 'np.ndarray'
+    confidences: 'np.ndarray'
+    entities: Dict[str, List[Any]]
+    
+    def __len__(self) -> int:
+        return len(self.intent_codes)
+    
+    @property
+    def intents(self) -> List[str]:
+        """Intent label per message"""
+        labels = self.labels
+        return [labels[code] for code in self.intent_codes.tolist()]
+    
+    def intent_counts(self) -> Dict[str, int]:
+        """Number of messages classified as each intent"""
+        counts = np.bincount(self.intent_codes, minlength=len(self.labels))
+        return {label: int(count) for label, count in zip(self.labels, counts.tolist())}
+
+# Intent engine of a batch worker process, built once by _init_batch_worker
+_batch_engine: Optional[IntentEngine] = None
+
+def _init_batch_worker(intent_patterns: Dict[str, List[str]]):
+    global _batch_engine
+    _batch_engine = IntentEngine(intent_patterns)
+
+def _classify_chunk(messages: List[str], engine: Optional[IntentEngine] = None,
+                    labels: Optional[Dict[str, int]] = None) -> Tuple[List[int], List[float], List[Dict]]:
+    """Classify a chunk of messages into (intent codes, confidences, entity dicts)"""
+    engine = engine or _batch_engine
+    analyze = engine.analyze
+    codes, confidences, entities = [], [], []
+    for message in messages:
+        match = analyze(message.lower())
+        codes.append(labels[match.intent])
+        confidences.append(match.confidence)
+        entities.append(match.entities)
+    return codes, confidences, entities
+
+def _worker_classify_chunk(args: Tuple[List[str], Dict[str, int]]):
+    messages, labels = args
+    return _classify_chunk(messages, labels=labels)
+
+class ResponseCache:
+    """
+    TTL + LRU cache of generated responses
+    
+    Keys combine the intent, the extracted entities, the user's location and
+    a coarse snapshot of the parking state (availability bucketed per lot),
+    so repeated questions against an unchanged lot state skip the LLM. When
+    the bucketed lot state changes, entries built on the previous state are
+    dropped; users in different locations share the lot state and never
+    invalidate each other's entries.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, bucket_percent: int = 5):
+        """
+        Initialize response cache
+        
+        Args:
+            max_entries: Maximum number of cached responses (least recently used evicted)
+            ttl: Seconds a cached response stays valid
+            bucket_percent: Width of the availability buckets in percent
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bucket_percent = bucket_percent
+        self._entries: OrderedDict = OrderedDict()
+        self._snapshot = None
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'latency_saved': 0.0
+        }
+    
+    def context_snapshot(self, context: Optional[Dict]) -> Tuple:
+        """Coarse, hashable view of the lot state that responses depend on"""
+        if not context:
+            return ()
+        
+        lots = []
+        for lot in context.get('parking_lots', []):
+            total = lot.get('total_slots', 0) or 0
+            available = lot.get('available_slots', 0) or 0
+            bucket = int(available * 100 / total) // self.bucket_percent if total > 0 else -1
+            lots.append((str(lot.get('id', lot.get('name', ''))), bucket))
+        
+        return tuple(sorted(lots))
+    
+    def make_key(self, query_analysis: ParkingQuery, snapshot: Tuple,
+                 context: Optional[Dict] = None) -> Tuple:
+        """Build the cache key for an analyzed query under a lot state snapshot"""
+        entities = json.dumps(query_analysis.entities, sort_keys=True)
+        # Without a recognized intent the answer depends on the wording itself
+        text = ''
+        if query_analysis.intent == 'general':
+            text = ' '.join(re.sub(r'[^\w\s]', ' ', query_analysis.original_text.lower()).split())
+        location = str((context or {}).get('user_location', ''))
+        return (query_analysis.intent, entities, text, location, snapshot)
+    
+    def observe_snapshot(self, snapshot: Tuple):
+        """Drop entries built on the previous lot state once the state changes"""
+        # Queries without lot data say nothing about the current state
+        if not snapshot or snapshot == self._snapshot:
+            return
+        
+        if self._snapshot is not None:
+            stale = [key for key in self._entries if key[-1] == self._snapshot]
+            for key in stale:
+                del self._entries[key]
+            self.stats['invalidations'] += len(stale)
+        self._snapshot = snapshot
+    
+    def get(self, key: Tuple) -> Optional[str]:
+        """Return a cached response, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        
+        response, expires_at, generation_time = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        self.stats['latency_saved'] += generation_time
+        return response
+    
+    def put(self, key: Tuple, response: str, generation_time: float):
+        """
+        Store a generated response
+        
+        Args:
+            key: Key from make_key()
+            response: Response text
+            generation_time: Seconds it took to generate (credited on later hits)
+        """
+        self._entries[key] = (response, time.monotonic() + self.ttl, generation_time)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    def clear(self):
+        """Remove all cached responses"""
+        self._entries.clear()
+        self._snapshot = None
+    
+    def get_stats(self) -> Dict:
+        """Get hit rate, latency saved and size statistics"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'latency_saved': round(self.stats['latency_saved'], 3),
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl
+        }
+
+class PromptBuilder:
+    """
+    Builds compact LLM prompts within a token budget
+    
+    The system context is sent once (as the system message) and only the
+    top-K most relevant lots are listed, ranked by recommendation score with
+    lots mentioned in the message first. A one-line summary keeps the
+    totals of all lots available to the model.
+    """
+    
+    def __init__(self, token_budget: int = 600, max_lots: int = 5, scorer=None):
+        """
+        Initialize prompt builder
+        
+        Args:
+            token_budget: Approximate maximum prompt size in tokens (system + user)
+            max_lots: Maximum number of lots listed individually
+            scorer: Function lot -> relevance score (higher is better)
+        """
+        self.token_budget = token_budget
+        self.max_lots = max_lots
+        self.scorer = scorer or (lambda lot: 0.0)
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token estimate (~4 characters per token for English text)"""
+        return (len(text) + 3) // 4
+    
+    @staticmethod
+    def _mentioned(lot: Dict, message_lower: str, numbers: List[int]) -> bool:
+        """Check whether the user refers to a lot by name or number"""
+        name = str(lot.get('name', '')).lower()
+        if name:
+            # Whole-word occurrence only, so "l2" does not match "l250"
+            start = message_lower.find(name)
+            while start != -1:
+                end = start + len(name)
+                if ((start == 0 or not message_lower[start - 1].isalnum()) and
+                        (end == len(message_lower) or not message_lower[end].isalnum())):
+                    return True
+                start = message_lower.find(name, start + 1)
+        return lot.get('id') in numbers
+    
+    def select_lots(self, lots: List[Dict], query_analysis: ParkingQuery) -> List[Dict]:
+        """
+        Pick the most relevant lots for a query
+        
+        Args:
+            lots: All parking lots from the context
+            query_analysis: Analyzed user query
+            
+        Returns:
+            Up to max_lots lots, most relevant first
+        """
+        message_lower = query_analysis.original_text.lower()
+        numbers = query_analysis.entities.get('numbers', [])
+        
+        def relevance(lot):
+            return (self._mentioned(lot, message_lower, numbers), self.scorer(lot))
+        
+        return heapq.nlargest(self.max_lots, lots, key=relevance)
+    
+    def build(self, system_context: str, message: str, context: Optional[Dict],
+              query_analysis: ParkingQuery) -> List[Dict]:
+        """
+        Build chat messages for the LLM
+        
+        Args:
+            system_context: System instructions
+            message: User's message
+            context: Optional context (parking lot data, user info, etc.)
+            query_analysis: Analyzed user query
+            
+        Returns:
+            List of chat messages
+        """
+        system_content = textwrap.dedent(system_context).strip()
+        
+        tail = [
+            f"User query intent: {query_analysis.intent}",
+            f"Detected entities: {json.dumps(query_analysis.entities, sort_keys=True)}",
+            f"User message: \"{message}\"",
+            "Please provide a helpful response based on the context and intent."
+        ]
+        head = []
+        lot_lines = []
+        
+        if context:
+            if context.get('parking_lots'):
+                lots = context['parking_lots']
+                total_available = sum(lot.get('available_slots', 0) for lot in lots)
+                total_slots = sum(lot.get('total_slots', 0) for lot in lots)
+                selected = self.select_lots(lots, query_analysis)
+                head.append(
+                    f"Current parking status ({len(lots)} lots, {total_available} of "
+                    f"{total_slots} slots available overall; most relevant lots):"
+                )
+                lot_lines = [
+                    f"- Lot {lot.get('name', 'Unknown')}: {lot.get('available_slots', 0)} "
+                    f"available out of {lot.get('total_slots', 0)} total slots"
+                    for lot in selected
+                ]
+            
+            if 'current_time' in context:
+                tail.insert(0, f"Current time: {context['current_time']}")
+            
+            if 'user_location' in context:
+                tail.insert(0, f"User location: {context['user_location']}")
+        
+        # Add lot lines, most relevant first, while they fit in the budget
+        used = self.estimate_tokens(system_content) + sum(
+            self.estimate_tokens(line) + 1 for line in head + tail
+        )
+        for line in lot_lines:
+            cost = self.estimate_tokens(line) + 1
+            if used + cost > self.token_budget:
+                break
+            head.append(line)
+            used += cost
+        
+        return [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": '\n'.join(head + tail)}
+        ]
+
+class RecommendationIndex:
+    """
+    Parking lots kept in recommendation order
+    
+    Lots live in a binary heap ordered by (-score, position), so the ranking
+    is the same as a stable descending sort by score over the lot list. An
+    update rescores one lot and pushes a new heap entry in O(log N), leaving
+    the old entry behind as stale; top-K queries pop until K current entries
+    are found and push those back, discarding stale ones for good. Lots
+    without available slots (or without any slots) are not indexed, like
+    the unavailable lots the suggestions always skipped.
+    """
+    
+    def __init__(self, scorer):
+        """
+        Initialize recommendation index
+        
+        Args:
+            scorer: Function lot -> recommendation score (higher is better)
+        """
+        self.scorer = scorer
+        self._heap: List[tuple] = []
+        self._entries: Dict[Any, Tuple[tuple, tuple, Dict]] = {}
+        self._positions: Dict[Any, int] = {}
+        self._next_position = 0
+        self._sequence = 0
+        self._synced_version = None
+    
+    @staticmethod
+    def lot_key(lot: Dict) -> Any:
+        """Stable identifier of a lot: its id, or its name without one"""
+        key = lot.get('id')
+        return key if key is not None else lot.get('name')
+    
+    @staticmethod
+    def indexable(lot: Dict) -> bool:
+        """Whether a lot can be suggested (and scored without dividing by zero)"""
+        return lot.get('available_slots', 0) > 0 and lot.get('total_slots', 1) > 0
+    
+    @staticmethod
+    def _signature(lot: Dict, position: int) -> tuple:
+        """Fields that affect a lot's score, rank or suggestion"""
+        return (lot.get('available_slots', 0), lot.get('total_slots', 1),
+                lot.get('occupancy_rate', 100), lot.get('name', 'Unknown'),
+                lot.get('location'), position)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def update(self, key: Any, lot: Dict, position: Optional[int] = None):
+        """
+        Insert or update a lot
+        
+        Args:
+            key: Stable lot identifier (see lot_key())
+            lot: Lot data (available_slots, total_slots, occupancy_rate, name)
+            position: Tie-break order among equal scores (defaults to the
+                lot's existing position, or after all known lots)
+        """
+        if position is None:
+            position = self._positions.get(key, self._next_position)
+        self._positions[key] = position
+        self._next_position = max(self._next_position, position + 1)
+        
+        if not self.indexable(lot):
+            self._entries.pop(key, None)
+            return
+        
+        current = self._entries.get(key)
+        signature = self._signature(lot, position)
+        if current is not None and current[1] == signature:
+            return
+        
+        # The sequence number keeps ranks unique (and keys out of comparisons)
+        # while two lots briefly share a position during a reorder
+        rank = (-self.scorer(lot), position, self._sequence, key)
+        self._sequence += 1
+        heapq.heappush(self._heap, rank)
+        self._entries[key] = (rank, signature, dict(lot))
+        
+        # Rebuild once stale entries dominate, keeping the heap O(N)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry[0] for entry in self._entries.values()]
+            heapq.heapify(self._heap)
+    
+    def remove(self, key: Any):
+        """Remove a lot from the index"""
+        self._entries.pop(key, None)
+        self._positions.pop(key, None)
+    
+    def sync(self, lots: List[Dict], version: Any = None) -> bool:
+        """
+        Bring the index in line with a full lot list
+        
+        Each lot is compared with its indexed signature (availability,
+        totals, rate, name, location and position), so only lots that are
+        new, moved or changed are rescored; lots no longer present are
+        removed. Lots may be updated in place between calls. The walk is
+        skipped only when an explicit `version` equals the last synced one.
+        
+        Args:
+            lots: Current parking lots, in context order
+            version: Version of the lot list (e.g. a backend revision counter)
+            
+        Returns:
+            True if the list was walked, False if its version was unchanged
+        """
+        if version is not None and version == self._synced_version:
+            return False
+        
+        seen = set()
+        for position, lot in enumerate(lots):
+            key = self.lot_key(lot)
+            if key is None or key in seen:
+                key = ('#', position)
+            seen.add(key)
+            self.update(key, lot, position)
+        
+        for key in [key for key in self._positions if key not in seen]:
+            self.remove(key)
+        self._next_position = len(lots)
+        self._synced_version = version
+        return True
+    
+    def top(self, k: int, min_available: int = 1) -> List[Tuple[Dict, float]]:
+        """
+        Get the best-ranked lots
+        
+        Args:
+            k: Number of lots to return
+            min_available: Skip lots with fewer available slots
+            
+        Returns:
+            Up to k (lot, score) pairs, best first
+        """
+        results = []
+        current = []
+        while self._heap and len(results) < k:
+            rank = heapq.heappop(self._heap)
+            entry = self._entries.get(rank[3])
+            if entry is None or entry[0] != rank:
+                continue  # Stale: the lot was updated or removed since
+            current.append(rank)
+            lot = entry[2]
+            if lot.get('available_slots', 0) >= min_available:
+                results.append((lot, -rank[0]))
+        
+        for rank in current:
+            heapq.heappush(self._heap, rank)
+        return results
+
+class _Session:
+    """Ring buffer of recent turns plus running entity aggregates for one session"""
+    
+    __slots__ = ('turns', 'intents', 'entities', 'entity_messages', 'length', 'last_seen')
+    
+    def __init__(self, window: int, now: float):
+        self.turns: deque = deque(maxlen=window)
+        self.intents: deque = deque()
+        # entity type -> values mentioned in the window (oldest first), and
+        # how many turns in the window mention the type
+        self.entities: Dict[str, deque] = {}
+        self.entity_messages: Dict[str, int] = {}
+        self.length = 0
+        self.last_seen = now
+
+class ConversationStore:
+    """
+    Session-keyed conversation context with bounded memory
+    
+    Each session keeps its last `window` turns in a ring buffer and maintains
+    the intent list and entity aggregates of handle_conversation_context()
+    incrementally, so recording a turn and reading the context cost O(1) in
+    the history length. Sessions idle for longer than idle_timeout, and the
+    least recently active sessions beyond max_sessions, are evicted.
+    """
+    
+    def __init__(self, window: int = 5, idle_timeout: float = 1800.0, max_sessions: int = 10000):
+        """
+        Initialize conversation store
+        
+        Args:
+            window: Number of recent turns kept per session
+            idle_timeout: Seconds of inactivity after which a session is dropped
+            max_sessions: Maximum number of sessions kept (least recently active evicted)
+        """
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict = OrderedDict()
+        self.stats = {'turns': 0, 'idle_evictions': 0, 'capacity_evictions': 0}
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+    
+    @staticmethod
+    def _entity_values(value) -> list:
+        return value if isinstance(value, list) else [value]
+    
+    def add_message(self, session_id: str, message: Dict):
+        """
+        Record a conversation turn
+        
+        Args:
+            session_id: Session identifier
+            message: Turn data; 'intent' and 'entities' feed the context aggregates
+        """
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(self.window, now)
+        else:
+            self._sessions.move_to_end(session_id)
+            session.last_seen = now
+        
+        if len(session.turns) == session.turns.maxlen:
+            self._forget(session, session.turns[0])
+        
+        has_intent = 'intent' in message
+        if has_intent:
+            session.intents.append(message['intent'])
+        entity_counts = []
+        for entity_type, entity_value in message.get('entities', {}).items():
+            values = session.entities.get(entity_type)
+            if values is None:
+                values = session.entities[entity_type] = deque()
+                session.entity_messages[entity_type] = 0
+            new_values = self._entity_values(entity_value)
+            values.extend(new_values)
+            session.entity_messages[entity_type] += 1
+            entity_counts.append((entity_type, len(new_values)))
+        
+        # Keep what this turn contributed, so it can be removed exactly later
+        session.turns.append((message, has_intent, entity_counts))
+        session.length += 1
+        self.stats['turns'] += 1
+        
+        self.evict_idle(now)
+    
+    @staticmethod
+    def _forget(session: _Session, turn: Tuple[Dict, bool, List[Tuple[str, int]]]):
+        """Remove the aggregates contributed by the turn leaving the window"""
+        _, has_intent, entity_counts = turn
+        if has_intent:
+            session.intents.popleft()
+        for entity_type, count in entity_counts:
+            values = session.entities[entity_type]
+            for _ in range(count):
+                values.popleft()
+            session.entity_messages[entity_type] -= 1
+            if not session.entity_messages[entity_type]:
+                del session.entities[entity_type]
+                del session.entity_messages[entity_type]
+    
+    def get_context(self, session_id: str) -> Dict:
+        """
+        Get the conversation context of a session
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            Dictionary shaped like handle_conversation_context() output
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return {'previous_intents': [], 'mentioned_entities': {}, 'conversation_length': 0}
+        return {
+            'previous_intents': list(session.intents),
+            'mentioned_entities': {entity_type: list(values)
+                                   for entity_type, values in session.entities.items()},
+            'conversation_length': session.length
+        }
+    
+    def get_history(self, session_id: str) -> List[Dict]:
+        """Get the turns currently kept for a session, oldest first"""
+        session = self._sessions.get(session_id)
+        return [turn[0] for turn in session.turns] if session is not None else []
+    
+    def end_session(self, session_id: str):
+        """Drop a session"""
+        self._sessions.pop(session_id, None)
+    
+    def evict_idle(self, now: Optional[float] = None):
+        """Drop idle sessions and enforce the session limit"""
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.idle_timeout
+        # Sessions are ordered by last activity, so only the front needs checking
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.stats['idle_evictions'] += 1
+        
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.stats['capacity_evictions'] += 1
+    
+    def get_stats(self) -> Dict:
+        """Get session count and eviction statistics"""
+        return dict(self.stats, sessions=len(self._sessions), max_sessions=self.max_sessions,
+                    window=self.window, idle_timeout=self.idle_timeout)
+
 class ChatbotService:
     """LLM-powered chatbot for parking system assistance"""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-3.5-turbo",
+                 api_base: Optional[str] = None, llm_timeout: float = 8.0,
+                 max_concurrency: int = 8, response_cache_size: int = 1024,
+                 response_cache_ttl: float = 300.0, mock_stream_delay: float = 0.0,
+                 prompt_token_budget: int = 600, max_prompt_lots: int = 5,
+                 semantic_intents: bool = False, semantic_encoder=None,
+                 regex_confidence_threshold: float = 0.6, conversation_window: int = 5,
+                 session_idle_timeout: float = 1800.0, max_sessions: int = 10000):
         """
         Initialize chatbot service
         
         Args:
             api_key: OpenAI API key (if None, uses environment variable)
             model: OpenAI model to use
+            api_base: Chat completions API base URL (if None, uses OPENAI_API_BASE or OpenAI)
+            llm_timeout: Per-call LLM timeout in seconds before falling back to mock responses
+            max_concurrency: Maximum number of concurrent async LLM calls
+            response_cache_size: Maximum cached LLM responses, 0 disables the cache
+            response_cache_ttl: Seconds a cached LLM response stays valid
+            mock_stream_delay: Seconds between chunks when streaming mock responses
+            prompt_token_budget: Approximate LLM prompt size limit in tokens
+            max_prompt_lots: Maximum number of lots listed in the LLM prompt
+            semantic_intents: Fall back to embedding-based intent classification
+                when regex matches are weak
+            semantic_encoder: Optional function texts -> embeddings (defaults to
+                a local sentence-transformers model)
+            regex_confidence_threshold: Regex confidence at or above which the
+                semantic classifier is skipped
+            conversation_window: Turns kept per chat session
+            session_idle_timeout: Seconds after which an idle chat session is dropped
+            max_sessions: Maximum number of chat sessions kept in memory
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         self.model = model
+        self.api_base = (api_base or os.getenv('OPENAI_API_BASE') or DEFAULT_API_BASE).rstrip('/')
+        self.llm_timeout = llm_timeout
+        self.max_concurrency = max_concurrency
         self.client = None
         
+        # Async HTTP session and concurrency limit per event loop, created on first use
+        self._http_sessions: Dict[asyncio.AbstractEventLoop, tuple] = {}
+        self._http_sessions_lock = threading.Lock()
+        self.llm_stats = {'calls': 0, 'timeouts': 0, 'errors': 0, 'fallbacks': 0}
+        
+        self.response_cache = (ResponseCache(response_cache_size, response_cache_ttl)
+                               if response_cache_size > 0 else None)
+        self.mock_stream_delay = mock_stream_delay
+        self.prompt_builder = PromptBuilder(prompt_token_budget, max_prompt_lots,
+                                            scorer=self._calculate_recommendation_score)
+        self.recommendation_index = RecommendationIndex(self._calculate_recommendation_score)
+        
+        self.conversations = ConversationStore(conversation_window, session_idle_timeout, max_sessions)
+        self.regex_confidence_threshold = regex_confidence_threshold
+        self.semantic_classifier = None
+        if semantic_intents:
+            if semantic_encoder is not None or SENTENCE_TRANSFORMERS_AVAILABLE:
+                self.semantic_classifier = SemanticIntentClassifier(encoder=semantic_encoder)
+            else:
+                logger.warning("sentence-transformers not available, using regex intents only")
+        
         # Intent patterns for parking queries
         self.intent_patterns = {
             'find_parking': [
@@ -78,6 +994,9 @@ class ChatbotService:
             ]
         }
         
+        # Compiled once; call set_intent_patterns() to change patterns later
+        self.intent_engine = IntentEngine(self.intent_patterns)
+        
         # System context for the chatbot
         self.system_context = """
         You are an AI assistant for a smart parking system. You help users with:
@@ -99,6 +1018,8 @@ class ChatbotService:
         """Initialize OpenAI client"""
         if OPENAI_AVAILABLE and self.api_key:
             try:
+                import openai
+                
                 openai.api_key = self.api_key
                 self.client = openai
                 logger.info("OpenAI client initialized successfully")
@@ -109,13 +1030,15 @@ class ChatbotService:
             logger.warning("OpenAI not available or no API key, using mock responses")
             self.client = None
     
-    def process_query(self, user_message: str, context: Optional[Dict] = None) -> Dict:
+    def process_query(self, user_message: str, context: Optional[Dict] = None,
+                      session_id: Optional[str] = None) -> Dict:
         """
         Process user query and generate response
         
         Args:
             user_message: User's message/question
             context: Optional context (parking lot data, user info, etc.)
+            session_id: Optional chat session; the turn is added to its conversation context
             
         Returns:
             Dictionary with response and metadata
@@ -124,6 +1047,7 @@ class ChatbotService:
         
         # Analyze intent
         query_analysis = self._analyze_intent(user_message)
+        self._record_turn(session_id, query_analysis)
         
         # Generate response based on intent
         if self.client:
@@ -131,8 +1055,77 @@ class ChatbotService:
         else:
             response = self._generate_mock_response(query_analysis, context)
         
+        return {'response': response, **self._response_metadata(query_analysis, context)}
+    
+    def classify_batch(self, messages: Iterable[str], processes: Optional[int] = None,
+                       chunk_size: int = 5000) -> IntentBatch:
+        """
+        Classify many messages at once (e.g. replaying chat logs)
+        
+        Gives the same intent, confidence and entities as process_query()
+        with regex intents only, but skips response generation and
+        per-message logging.
+        
+        Args:
+            messages: List or stream of user messages
+            processes: Worker processes to fan out to (None or 1 runs in-process)
+            chunk_size: Messages per work unit
+            
+        Returns:
+            IntentBatch with one row per message, in input order
+        """
+        labels = ['general'] + [intent for intent in self.intent_patterns if intent != 'general']
+        label_codes = {label: code for code, label in enumerate(labels)}
+        
+        iterator = iter(messages)
+        chunks = iter(lambda: list(itertools.islice(iterator, chunk_size)), [])
+        
+        codes: List[int] = []
+        confidences: List[float] = []
+        entity_rows: List[Dict] = []
+        
+        def collect(result):
+            codes.extend(result[0])
+            confidences.extend(result[1])
+            entity_rows.extend(result[2])
+        
+        if processes and processes > 1:
+            with multiprocessing.Pool(processes, initializer=_init_batch_worker,
+                                      initargs=(self.intent_patterns,)) as pool:
+                work = ((chunk, label_codes) for chunk in chunks)
+                for result in pool.imap(_worker_classify_chunk, work):
+                    collect(result)
+        else:
+            for chunk in chunks:
+                collect(_classify_chunk(chunk, self.intent_engine, label_codes))
+        
+        entity_types = []
+        for row in entity_rows:
+            for entity_type in row:
+                if entity_type not in entity_types:
+                    entity_types.append(entity_type)
+        
+        logger.info(f"Classified {len(codes)} messages in batch")
+        return IntentBatch(
+            labels=labels,
+            intent_codes=np.asarray(codes, dtype=np.int16),
+            confidences=np.asarray(confidences, dtype=np.float64),
+            entities={entity_type: [row.get(entity_type) for row in entity_rows]
+                      for entity_type in entity_types}
+        )
+    
+    def _record_turn(self, session_id: Optional[str], query_analysis: ParkingQuery):
+        """Add an analyzed user turn to its session's conversation context"""
+        if session_id is not None:
+            self.conversations.add_message(session_id, {
+                'role': 'user',
+                'intent': query_analysis.intent,
+                'entities': query_analysis.entities
+            })
+    
+    def _response_metadata(self, query_analysis: ParkingQuery, context: Optional[Dict]) -> Dict:
+        """Intent/entity metadata returned alongside every response"""
         return {
-            'response': response,
             'intent': query_analysis.intent,
             'confidence': query_analysis.confidence,
             'entities': query_analysis.entities,
@@ -140,118 +1133,386 @@ class ChatbotService:
             'context_used': context is not None
         }
     
-    def _analyze_intent(self, message: str) -> ParkingQuery:
-        """Analyze user message to determine intent"""
-        message_lower = message.lower()
+    def stream_query(self, user_message: str, context: Optional[Dict] = None,
+                     session_id: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Process user query and yield the response as it is generated
         
-        # Check each intent pattern
-        best_intent = 'general'
-        best_confidence = 0.0
+        Yields a 'metadata' event (intent, confidence, entities) before any
+        text, then 'chunk' events with response text, then a 'done' event
+        carrying the full response.
+        
+        Args:
+            user_message: User's message/question
+            context: Optional context (parking lot data, user info, etc.)
+            session_id: Optional chat session; the turn is added to its conversation context
+            
+        Yields:
+            Event dictionaries with a 'type' key
+        """
+        logger.info(f"Streaming query: {user_message[:100]}...")
+        
+        query_analysis = self._analyze_intent(user_message)
+        self._record_turn(session_id, query_analysis)
+        yield {'type': 'metadata', **self._response_metadata(query_analysis, context)}
+        
+        if self.client:
+            chunks = self._stream_llm_response(user_message, context, query_analysis)
+        else:
+            chunks = self._stream_mock_response(query_analysis, context)
+        
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield {'type': 'chunk', 'content': chunk}
+        
+        yield {'type': 'done', 'response': ''.join(parts)}
+    
+    async def stream_query_async(self, user_message: str, context: Optional[Dict] = None,
+                                 session_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        Async variant of stream_query using the pooled HTTP session
         
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, message_lower):
-                    confidence = len(re.findall(pattern, message_lower)) * 0.3
-                    if confidence > best_confidence:
-                        best_intent = intent
-                        best_confidence = min(confidence, 1.0)
+        Args:
+            user_message: User's message/question
+            context: Optional context (parking lot data, user info, etc.)
+            session_id: Optional chat session; the turn is added to its conversation context
+            
+        Yields:
+            Event dictionaries with a 'type' key
+        """
+        logger.info(f"Streaming query: {user_message[:100]}...")
+        
+        query_analysis = self._analyze_intent(user_message)
+        self._record_turn(session_id, query_analysis)
+        yield {'type': 'metadata', **self._response_metadata(query_analysis, context)}
+        
+        if self._async_llm_available():
+            chunks = self._stream_llm_response_async(user_message, context, query_analysis)
+        else:
+            chunks = self._stream_mock_response_async(query_analysis, context)
+        
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield {'type': 'chunk', 'content': chunk}
+        
+        yield {'type': 'done', 'response': ''.join(parts)}
+    
+    @staticmethod
+    def _chunk_text(text: str, words_per_chunk: int = 3) -> List[str]:
+        """Split text into chunks of a few words, keeping the original spacing"""
+        words = re.findall(r'\S+\s*', text)
+        return [''.join(words[i:i + words_per_chunk]) for i in range(0, len(words), words_per_chunk)]
+    
+    def _stream_mock_response(self, query_analysis: ParkingQuery,
+                              context: Optional[Dict]) -> Iterator[str]:
+        """Stream the mock response in word chunks (offline streaming mode)"""
+        for i, chunk in enumerate(self._chunk_text(self._generate_mock_response(query_analysis, context))):
+            if i and self.mock_stream_delay:
+                time.sleep(self.mock_stream_delay)
+            yield chunk
+    
+    async def _stream_mock_response_async(self, query_analysis: ParkingQuery,
+                                          context: Optional[Dict]) -> AsyncIterator[str]:
+        """Async variant of _stream_mock_response"""
+        for i, chunk in enumerate(self._chunk_text(self._generate_mock_response(query_analysis, context))):
+            if i and self.mock_stream_delay:
+                await asyncio.sleep(self.mock_stream_delay)
+            yield chunk
+    
+    def _stream_llm_response(self, message: str, context: Optional[Dict],
+                             query_analysis: ParkingQuery) -> Iterator[str]:
+        """Stream response tokens from the OpenAI LLM"""
+        cache_key, cached = self._cache_lookup(query_analysis, context)
+        if cached is not None:
+            yield from self._chunk_text(cached)
+            return
+        
+        parts = []
+        try:
+            start = time.perf_counter()
+            stream = self.client.ChatCompletion.create(
+                model=self.model,
+                messages=self._build_llm_messages(message, context, query_analysis),
+                max_tokens=300,
+                temperature=0.7,
+                request_timeout=self.llm_timeout,
+                stream=True
+            )
+            for event in stream:
+                content = event.choices[0].delta.get('content')
+                if content:
+                    parts.append(content)
+                    yield content
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {str(e)}")
+            # Fall back only if nothing has been sent yet
+            if not parts:
+                yield from self._stream_mock_response(query_analysis, context)
+            return
+        
+        if cache_key is not None and parts:
+            self.response_cache.put(cache_key, ''.join(parts).strip(), time.perf_counter() - start)
+    
+    def set_intent_patterns(self, intent_patterns: Dict[str, List[str]]):
+        """Replace the intent patterns and recompile the intent engine"""
+        self.intent_patterns = intent_patterns
+        self.intent_engine = IntentEngine(intent_patterns)
+    
+    def _analyze_intent(self, message: str) -> ParkingQuery:
+        """Analyze user message to determine intent"""
+        match = self.intent_engine.analyze(message.lower())
+        intent, confidence = match.intent, match.confidence
         
-        # Extract entities (simple keyword extraction)
-        entities = self._extract_entities(message_lower)
+        # Regex stays the fast path; embeddings only decide weak or missing matches
+        if self.semantic_classifier is not None and confidence < self.regex_confidence_threshold:
+            semantic_intent, similarity = self.semantic_classifier.classify(message)
+            if semantic_intent is not None and similarity > confidence:
+                intent, confidence = semantic_intent, min(similarity, 1.0)
         
         return ParkingQuery(
-            intent=best_intent,
-            entities=entities,
-            confidence=best_confidence,
+            intent=intent,
+            entities=match.entities,
+            confidence=confidence,
             original_text=message
         )
     
     def _extract_entities(self, message: str) -> Dict[str, Any]:
         """Extract entities from user message"""
-        entities = {}
-        
-        # Extract numbers (could be lot numbers, slot numbers, etc.)
-        numbers = re.findall(r'\b\d+\b', message)
-        if numbers:
-            entities['numbers'] = [int(n) for n in numbers]
-        
-        # Extract time references
-        time_patterns = {
-            'now': r'\bnow\b|\bcurrent\b|\btoday\b',
-            'hours': r'(\d+)\s*hour',
-            'minutes': r'(\d+)\s*minute',
-            'tomorrow': r'\btomorrow\b',
-            'weekend': r'\bweekend\b'
-        }
-        
-        for time_type, pattern in time_patterns.items():
-            matches = re.findall(pattern, message)
-            if matches:
-                entities[time_type] = matches
-        
-        # Extract location references
-        location_keywords = ['lot', 'level', 'floor', 'section', 'area', 'zone']
-        for keyword in location_keywords:
-            if keyword in message:
-                entities['location_type'] = keyword
+        return self.intent_engine.analyze(message).entities
+    
+    def _build_llm_messages(self, message: str, context: Optional[Dict],
+                            query_analysis: ParkingQuery) -> List[Dict]:
+        """Build the chat messages sent to the LLM"""
+        return self.prompt_builder.build(self.system_context, message, context, query_analysis)
+    
+    def _cache_lookup(self, query_analysis: ParkingQuery,
+                      context: Optional[Dict]) -> Tuple[Optional[Tuple], Optional[str]]:
+        """Return (cache key, cached response) for a query; both None without a cache"""
+        if self.response_cache is None:
+            return None, None
         
-        return entities
+        snapshot = self.response_cache.context_snapshot(context)
+        self.response_cache.observe_snapshot(snapshot)
+        key = self.response_cache.make_key(query_analysis, snapshot, context)
+        return key, self.response_cache.get(key)
     
     def _generate_llm_response(self, message: str, context: Optional[Dict], 
                               query_analysis: ParkingQuery) -> str:
         """Generate response using OpenAI LLM"""
+        cache_key, cached = self._cache_lookup(query_analysis, context)
+        if cached is not None:
+            return cached
+        
         try:
-            # Prepare context information
-            context_info = ""
-            if context:
-                if 'parking_lots' in context:
-                    lots_info = []
-                    for lot in context['parking_lots']:
-                        lots_info.append(
-                            f"Lot {lot.get('name', 'Unknown')}: "
-                            f"{lot.get('available_slots', 0)} available out of "
-                            f"{lot.get('total_slots', 0)} total slots"
-                        )
-                    context_info += f"Current parking status:\n{chr(10).join(lots_info)}\n"
-                
-                if 'user_location' in context:
-                    context_info += f"User location: {context['user_location']}\n"
-                
-                if 'current_time' in context:
-                    context_info += f"Current time: {context['current_time']}\n"
-            
-            # Prepare the prompt
-            prompt = f"""
-            {self.system_context}
-            
-            Context information:
-            {context_info}
-            
-            User query intent: {query_analysis.intent}
-            Detected entities: {query_analysis.entities}
-            
-            User message: "{message}"
-            
-            Please provide a helpful response based on the context and intent.
-            """
-            
+            start = time.perf_counter()
             # Make API call
             response = self.client.ChatCompletion.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_context},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_llm_messages(message, context, query_analysis),
                 max_tokens=300,
-                temperature=0.7
+                temperature=0.7,
+                request_timeout=self.llm_timeout
             )
             
-            return response.choices[0].message.content.strip()
+            text = response.choices[0].message.content.strip()
+            if cache_key is not None:
+                self.response_cache.put(cache_key, text, time.perf_counter() - start)
+            return text
             
         except Exception as e:
             logger.error(f"LLM response generation failed: {str(e)}")
             return self._generate_mock_response(query_analysis, context)
     
+    async def process_query_async(self, user_message: str, context: Optional[Dict] = None,
+                                  session_id: Optional[str] = None) -> Dict:
+        """
+        Process user query without blocking the event loop
+        
+        LLM calls share a pooled HTTP session, are capped by a semaphore and
+        bounded by llm_timeout (including time spent waiting for a slot); on
+        timeout or error the mock response is returned instead.
+        
+        Args:
+            user_message: User's message/question
+            context: Optional context (parking lot data, user info, etc.)
+            session_id: Optional chat session; the turn is added to its conversation context
+            
+        Returns:
+            Dictionary with response and metadata (same shape as process_query)
+        """
+        logger.info(f"Processing query: {user_message[:100]}...")
+        
+        query_analysis = self._analyze_intent(user_message)
+        self._record_turn(session_id, query_analysis)
+        
+        if self._async_llm_available():
+            response = await self._generate_llm_response_async(user_message, context, query_analysis)
+        else:
+            response = self._generate_mock_response(query_analysis, context)
+        
+        return {'response': response, **self._response_metadata(query_analysis, context)}
+    
+    def _async_llm_available(self) -> bool:
+        """Check whether async LLM calls can be made"""
+        return bool(self.api_key) and AIOHTTP_AVAILABLE
+    
+    async def _get_session(self) -> tuple:
+        """
+        Get the pooled HTTP session and concurrency limit for the running event loop
+        
+        Each event loop gets its own session (sessions cannot be shared across
+        loops). Sessions of loops that have been closed since, e.g. by one
+        asyncio.run() per request, are closed here instead of being leaked.
+        
+        Returns:
+            Tuple of (aiohttp.ClientSession, asyncio.Semaphore)
+        """
+        import aiohttp
+        
+        await self._close_stale_sessions()
+        loop = asyncio.get_running_loop()
+        with self._http_sessions_lock:
+            pooled = self._http_sessions.get(loop)
+            if pooled is None or pooled[0].closed:
+                connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+                session = aiohttp.ClientSession(
+                    connector=connector,
+                    headers={'Authorization': f"Bearer {self.api_key}"}
+                )
+                pooled = self._http_sessions[loop] = (session, asyncio.Semaphore(self.max_concurrency))
+        return pooled
+    
+    async def _close_stale_sessions(self):
+        """Close the sessions of event loops that have been closed"""
+        with self._http_sessions_lock:
+            stale = [self._http_sessions.pop(loop) for loop in list(self._http_sessions)
+                     if loop.is_closed()]
+        for session, _ in stale:
+            # The connections died with their loop; this releases the connector
+            await session.close()
+    
+    async def _generate_llm_response_async(self, message: str, context: Optional[Dict],
+                                           query_analysis: ParkingQuery) -> str:
+        """Generate response using the chat completions HTTP API"""
+        cache_key, cached = self._cache_lookup(query_analysis, context)
+        if cached is not None:
+            return cached
+        
+        self.llm_stats['calls'] += 1
+        try:
+            start = time.perf_counter()
+            text = await asyncio.wait_for(
+                self._post_chat_completion(self._build_llm_messages(message, context, query_analysis)),
+                timeout=self.llm_timeout
+            )
+            if cache_key is not None:
+                self.response_cache.put(cache_key, text, time.perf_counter() - start)
+            return text
+        except asyncio.TimeoutError:
+            self.llm_stats['timeouts'] += 1
+            logger.warning(f"LLM call timed out after {self.llm_timeout}s, using mock response")
+        except Exception as e:
+            self.llm_stats['errors'] += 1
+            logger.error(f"LLM response generation failed: {str(e)}")
+        
+        self.llm_stats['fallbacks'] += 1
+        return self._generate_mock_response(query_analysis, context)
+    
+    async def _post_chat_completion(self, messages: List[Dict]) -> str:
+        """POST a chat completion request through the pooled session"""
+        session, semaphore = await self._get_session()
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': 300,
+            'temperature': 0.7
+        }
+        
+        async with semaphore:
+            async with session.post(f"{self.api_base}/chat/completions", json=payload) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+        
+        return data['choices'][0]['message']['content'].strip()
+    
+    async def _stream_llm_response_async(self, message: str, context: Optional[Dict],
+                                         query_analysis: ParkingQuery) -> AsyncIterator[str]:
+        """Stream response tokens from the chat completions HTTP API"""
+        cache_key, cached = self._cache_lookup(query_analysis, context)
+        if cached is not None:
+            for chunk in self._chunk_text(cached):
+                yield chunk
+            return
+        
+        self.llm_stats['calls'] += 1
+        parts = []
+        start = time.perf_counter()
+        stream = self._iter_chat_completion_stream(self._build_llm_messages(message, context, query_analysis))
+        try:
+            while True:
+                # llm_timeout bounds the wait for each token, including the first
+                try:
+                    content = await asyncio.wait_for(stream.__anext__(), timeout=self.llm_timeout)
+                except StopAsyncIteration:
+                    break
+                parts.append(content)
+                yield content
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.llm_stats['timeouts'] += 1
+                logger.warning(f"LLM stream stalled for {self.llm_timeout}s")
+            else:
+                self.llm_stats['errors'] += 1
+                logger.error(f"LLM streaming failed: {str(e)}")
+            
+            if not parts:
+                self.llm_stats['fallbacks'] += 1
+                async for chunk in self._stream_mock_response_async(query_analysis, context):
+                    yield chunk
+            return
+        finally:
+            await stream.aclose()
+        
+        if cache_key is not None and parts:
+            self.response_cache.put(cache_key, ''.join(parts).strip(), time.perf_counter() - start)
+    
+    async def _iter_chat_completion_stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        """POST a streaming chat completion request and yield content deltas"""
+        session, semaphore = await self._get_session()
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': 300,
+            'temperature': 0.7,
+            'stream': True
+        }
+        
+        async with semaphore:
+            async with session.post(f"{self.api_base}/chat/completions", json=payload) as resp:
+                resp.raise_for_status()
+                # Server-sent events: one "data: {...}" line per delta
+                async for raw_line in resp.content:
+                    line = raw_line.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    content = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                    if content:
+                        yield content
+    
+    async def aclose(self):
+        """Close the pooled HTTP session of the running event loop and those of closed loops"""
+        loop = asyncio.get_running_loop()
+        with self._http_sessions_lock:
+            pooled = self._http_sessions.pop(loop, None)
+        if pooled is not None and not pooled[0].closed:
+            await pooled[0].close()
+        await self._close_stale_sessions()
+    
     def _generate_mock_response(self, query_analysis: ParkingQuery, 
                                context: Optional[Dict]) -> str:
         """Generate mock response based on intent"""
@@ -319,24 +1580,54 @@ class ChatbotService:
         
         return base_response
     
-    def get_parking_suggestions(self, context: Dict) -> List[Dict]:
-        """Get parking suggestions based on context"""
-        suggestions = []
-        
-        if 'parking_lots' in context:
-            for lot in context['parking_lots']:
-                if lot.get('available_slots', 0) > 0:
-                    suggestions.append({
-                        'lot_name': lot.get('name', 'Unknown'),
-                        'available_slots': lot.get('available_slots', 0),
-                        'total_slots': lot.get('total_slots', 0),
-                        'occupancy_rate': lot.get('occupancy_rate', 0),
-                        'recommendation_score': self._calculate_recommendation_score(lot)
-                    })
-        
-        # Sort by recommendation score
-        suggestions.sort(key=lambda x: x['recommendation_score'], reverse=True)
-        return suggestions[:3]  # Return top 3 suggestions
+    def get_cache_stats(self) -> Dict:
+        """Get response cache statistics (hit rate, latency saved)"""
+        if self.response_cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.response_cache.get_stats()}
+    
+    def get_parking_suggestions(self, context: Dict, limit: int = 3,
+                                min_available: int = 1) -> List[Dict]:
+        """
+        Get parking suggestions based on context
+        
+        Args:
+            context: Context with 'parking_lots' and optionally 'lots_version';
+                the lots are checked against the recommendation index on every
+                call (rescoring only lots that changed) unless the version is
+                the same as last time
+            limit: Maximum number of suggestions
+            min_available: Minimum number of available slots for a suggestion
+            
+        Returns:
+            Suggested lots, best recommendation first
+        """
+        if 'parking_lots' not in context:
+            return []
+        
+        self.recommendation_index.sync(context['parking_lots'], context.get('lots_version'))
+        return [
+            {
+                'lot_name': lot.get('name', 'Unknown'),
+                'available_slots': lot.get('available_slots', 0),
+                'total_slots': lot.get('total_slots', 0),
+                'occupancy_rate': lot.get('occupancy_rate', 0),
+                'recommendation_score': score
+            }
+            for lot, score in self.recommendation_index.top(limit, min_available)
+        ]
+    
+    def update_lot_availability(self, lot: Dict):
+        """
+        Update one lot in the recommendation index (e.g. from a live occupancy feed)
+        
+        Args:
+            lot: Lot data including 'id' or 'name'
+        """
+        key = RecommendationIndex.lot_key(lot)
+        if key is None:
+            raise ValueError("Lot update needs an 'id' or 'name'")
+        self.recommendation_index.update(key, lot)
     
     def _calculate_recommendation_score(self, lot: Dict) -> float:
         """Calculate recommendation score for a parking lot"""
@@ -345,7 +1636,7 @@ class ChatbotService:
         occupancy_rate = lot.get('occupancy_rate', 100)
         
         # Prefer lots with good availability but not completely empty
-        availability_score = available / total
+        availability_score = available / total if total > 0 else 0.0
         if availability_score > 0.8:
             availability_score = 0.8  # Cap very empty lots
         
@@ -354,8 +1645,23 @@ class ChatbotService:
         
         return (availability_score * 0.7) + (occupancy_score * 0.3)
     
-    def handle_conversation_context(self, conversation_history: List[Dict]) -> Dict:
-        """Analyze conversation history for context"""
+    def handle_conversation_context(self, conversation_history: Optional[List[Dict]] = None,
+                                    session_id: Optional[str] = None) -> Dict:
+        """
+        Analyze conversation history for context
+        
+        Args:
+            conversation_history: Full message history (scanned on every call)
+            session_id: Session whose turns were recorded via process_query();
+                its context is maintained incrementally and takes precedence
+            
+        Returns:
+            Previous intents, mentioned entities and conversation length
+        """
+        if session_id is not None:
+            return self.conversations.get_context(session_id)
+        
+        conversation_history = conversation_history or []
         context = {
             'previous_intents': [],
             'mentioned_entities': {},
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Detection Cache
+On-disk cache of per-frame vehicle detections for re-analysis of videos
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+from utils import setup_logging, lazy_import
+
+np = lazy_import('numpy')
+
+logger = setup_logging(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Content hashes keyed by (path, mtime, size) so one process hashes a file once
+_content_hash_cache: Dict[tuple, str] = {}
+_content_hash_lock = threading.Lock()
+
+def video_content_hash(video_path: str) -> str:
+    """
+    Compute a content hash of a video file
+
+    Args:
+        video_path: Path to video file
+
+    Returns:
+        Hex digest of the file contents
+    """
+    stat = os.stat(video_path)
+    stat_key = (os.path.realpath(video_path), stat.st_mtime_ns, stat.st_size)
+
+    with _content_hash_lock:
+        cached = _content_hash_cache.get(stat_key)
+    if cached:
+        return cached
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(video_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    content_hash = digest.hexdigest()
+    with _content_hash_lock:
+        _content_hash_cache[stat_key] = content_hash
+    return content_hash
+
+class FrameDetections:
+    """Per-frame detections of one video under one model configuration"""
+
+    def __init__(self, frames: Optional[Dict[int, List[Dict]]] = None):
+        self.frames: Dict[int, List[Dict]] = frames or {}
+        self.dirty = False
+
+    def get(self, frame_index: int) -> Optional[List[Dict]]:
+        """Return cached detections for a frame, or None if it was never inferred"""
+        detections = self.frames.get(frame_index)
+        if detections is None:
+            return None
+        # Callers may annotate detections, so hand out copies
+        return [dict(det, bbox=list(det['bbox'])) for det in detections]
+
+    def put(self, frame_index: int, detections: List[Dict]):
+        """Record detections for a frame"""
+        self.frames[frame_index] = [dict(det, bbox=list(det['bbox'])) for det in detections]
+        self.dirty = True
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def to_arrays(self) -> Dict[str, 'np.ndarray']:
+        """Convert to columnar arrays (CSR layout indexed by frame)"""
+        frame_indices = sorted(self.frames)
+        counts = [len(self.frames[i]) for i in frame_indices]
+        detections = [det for i in frame_indices for det in self.frames[i]]
+
+        offsets = np.zeros(len(frame_indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return {
+            'frames': np.asarray(frame_indices, dtype=np.int32),
+            'offsets': offsets,
+            'boxes': np.asarray([det['bbox'] for det in detections], dtype=np.int32).reshape(-1, 4),
+            'scores': np.asarray([det['confidence'] for det in detections], dtype=np.float32),
+            'classes': np.asarray([det['class_id'] for det in detections], dtype=np.int16)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, class_names: Dict[int, str]) -> 'FrameDetections':
+        """Rebuild per-frame detection dictionaries from columnar arrays"""
+        frame_indices = arrays['frames'].tolist()
+        offsets = arrays['offsets'].tolist()
+        boxes = arrays['boxes'].tolist()
+        scores = arrays['scores'].tolist()
+        classes = arrays['classes'].tolist()
+
+        frames = {}
+        for i, frame_index in enumerate(frame_indices):
+            frames[frame_index] = [
+                {
+                    'bbox': boxes[j],
+                    'confidence': scores[j],
+                    'class_id': classes[j],
+                    'class': class_names.get(classes[j], 'vehicle')
+                }
+                for j in range(offsets[i], offsets[i + 1])
+            ]
+        return cls(frames)
+
+class DetectionCache:
+    """Size-bounded LRU cache of per-frame detections stored as columnar .npz files"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize detection cache
+
+        Args:
+            cache_dir: Directory holding cache entries
+            max_bytes: Total size budget; least recently used entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash: str, model_identity: str, input_size: int,
+                 confidence_threshold: float) -> str:
+        """Build the cache key for a video under a model configuration"""
+        key_data = json.dumps({
+            'video': content_hash,
+            'model': model_identity,
+            'input_size': int(input_size),
+            'confidence': round(float(confidence_threshold), 4)
+        }, sort_keys=True)
+        return hashlib.sha1(key_data.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key: str, class_names: Dict[int, str]) -> FrameDetections:
+        """
+        Load cached detections for a key
+
+        Args:
+            key: Cache key from make_key()
+            class_names: Class id to name mapping used to rebuild detections
+
+        Returns:
+            FrameDetections (empty on a miss)
+        """
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as arrays:
+                frame_detections = FrameDetections.from_arrays(arrays, class_names)
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return FrameDetections()
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            self.stats['misses'] += 1
+            return FrameDetections()
+
+        # Touch the entry so eviction treats it as recently used
+        os.utime(path)
+        self.stats['hits'] += 1
+        logger.info(f"Detection cache hit: {len(frame_detections)} frames")
+        return frame_detections
+
+    def store(self, key: str, frame_detections: FrameDetections):
+        """
+        Persist detections for a key and enforce the size budget
+
+        Args:
+            key: Cache key from make_key()
+            frame_detections: Detections to store
+        """
+        if not frame_detections.dirty:
+            return
+
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **frame_detections.to_arrays())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to store detection cache entry: {str(e)}")
+            self._remove(tmp_path)
+            return
+
+        frame_detections.dirty = False
+        self.stats['stores'] += 1
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits its budget"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self.stats['evictions'] += 1
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict:
+        """Get cache hit/miss statistics"""
+        return dict(self.stats, cache_dir=self.cache_dir, max_bytes=self.max_bytes)
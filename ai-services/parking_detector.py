@@ -4,37 +4,181 @@ AI Parking System - Parking Detector
 YOLO-based vehicle detection for parking lot analysis
 """
 
-import cv2
-import numpy as np
-from typing import List, Dict, Tuple, Optional
+from __future__ import annotations
+
+from typing import Any, List, Dict, Tuple, Optional
 import os
+import threading
+import time
 from pathlib import Path
 
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
-    print("Warning: ultralytics not available, using mock detection")
+from utils import setup_logging, lazy_import, module_available
+from profiling import StageProfiler
+from synthetic_detector import SyntheticDetector
+from video_writer import draw_detections, draw_parking_slots
+
+# Heavy dependencies are imported on first use so CLI startup, argument
+# parsing and configuration errors never pay for torch/ultralytics
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
-from utils import setup_logging
+# Cheap availability probe; the actual ultralytics import happens in _load_model
+YOLO_AVAILABLE = module_available('ultralytics')
 
 logger = setup_logging(__name__)
 
+DEFAULT_MODEL = 'yolov8n.pt'  # Lightweight model
+DEFAULT_INPUT_SIZE = 640
+
+class ModelRegistry:
+    """Process-wide cache of loaded YOLO models shared by all detectors"""
+    
+    def __init__(self):
+        self._models: Dict[Tuple, Any] = {}
+        self._warmed: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(model_path: Optional[str], device: Optional[str], input_size: int) -> Tuple:
+        """Build the registry key for a model path, inference backend and input size"""
+        if model_path and os.path.exists(model_path):
+            resolved = os.path.realpath(model_path)
+        else:
+            resolved = DEFAULT_MODEL
+        return (resolved, device or 'auto', int(input_size))
+    
+    def get(self, model_path: Optional[str] = None, device: Optional[str] = None,
+            input_size: int = DEFAULT_INPUT_SIZE):
+        """
+        Return a shared model instance, loading it on first request
+        
+        Args:
+            model_path: Path to custom YOLO model, if None uses default YOLOv8
+            device: Inference device/backend ('cpu', 'cuda:0', ...), None for auto
+            input_size: Inference resolution the model will be run at
+            
+        Returns:
+            Loaded YOLO model
+        """
+        key = self.make_key(model_path, device, input_size)
+        
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(key[0])
+                self._models[key] = model
+            return model
+    
+    def _load(self, model_path: str):
+        """Load YOLO weights from disk (or download the default model)"""
+        from ultralytics import YOLO
+        
+        if model_path != DEFAULT_MODEL:
+            logger.info(f"Loading custom YOLO model: {model_path}")
+            return YOLO(model_path)
+        
+        logger.info("Loading default YOLOv8n model")
+        # Suppress download progress output
+        import sys
+        from io import StringIO
+        
+        # Redirect stdout and stderr to suppress download progress
+        old_stdout = sys.stdout
+        old_stderr = sys.stderr
+        sys.stdout = StringIO()
+        sys.stderr = StringIO()
+        
+        try:
+            return YOLO(model_path)
+        finally:
+            # Restore stdout and stderr
+            sys.stdout = old_stdout
+            sys.stderr = old_stderr
+    
+    def warmup(self, model, key: Tuple, runs: int = 2) -> List[float]:
+        """
+        Run dummy inferences so graph setup and allocations happen up front
+        
+        Warm-up is performed once per registry key; later calls return the
+        recorded timings without running the model again.
+        
+        Args:
+            model: Model returned by get()
+            key: Registry key of the model
+            runs: Number of dummy inferences
+            
+        Returns:
+            Per-run warm-up latency in seconds
+        """
+        with self._lock:
+            if key in self._warmed:
+                return self._warmed[key]
+        
+        _, device, input_size = key
+        dummy = np.zeros((input_size, input_size, 3), dtype=np.uint8)
+        kwargs = {'imgsz': input_size, 'verbose': False}
+        if device != 'auto':
+            kwargs['device'] = device
+        
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(dummy, **kwargs)
+            timings.append(time.perf_counter() - start)
+        
+        with self._lock:
+            self._warmed[key] = timings
+        
+        logger.info(f"Model warm-up completed: {', '.join(f'{t * 1000:.1f}ms' for t in timings)}")
+        return timings
+    
+    def is_warm(self, key: Tuple) -> bool:
+        """Check whether a model key has already been warmed up"""
+        return key in self._warmed
+    
+    def loaded_keys(self) -> List[Tuple]:
+        """List keys of all models currently held by the registry"""
+        with self._lock:
+            return list(self._models)
+    
+    def clear(self):
+        """Drop all cached models (mainly for tests and reloads)"""
+        with self._lock:
+            self._models.clear()
+            self._warmed.clear()
+
+# Shared registry for the whole process
+model_registry = ModelRegistry()
+
 class ParkingDetector:
     """YOLO-based vehicle detector for parking lot analysis"""
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, device: Optional[str] = None,
+                 input_size: int = DEFAULT_INPUT_SIZE, warmup: bool = False,
+                 profiler: Optional[StageProfiler] = None,
+                 synthetic: Optional[SyntheticDetector] = None):
         """
         Initialize parking detector with YOLO model
         
         Args:
             model_path: Path to custom YOLO model, if None uses default YOLOv8
+            device: Inference device/backend ('cpu', 'cuda:0', ...), None for auto
+            input_size: Inference resolution passed to the model
+            warmup: Run dummy inferences right after loading
+            profiler: Stage profiler for inference timings (disabled if omitted)
+            synthetic: Mock detector used without a model (seed 0 if omitted)
         """
         self.model = None
+        self.profiler = profiler or StageProfiler(enabled=False)
+        self.synthetic = synthetic or SyntheticDetector()
         self.model_path = model_path
+        self.device = device
+        self.input_size = input_size
+        self.model_key = ModelRegistry.make_key(model_path, device, input_size)
         self.confidence_threshold = 0.5
         self.nms_threshold = 0.4
+        # Set when the last detect_vehicles call fell back to mock detections
+        self.last_detection_fallback = False
         
         # Vehicle class IDs in COCO dataset
         self.vehicle_classes = {
@@ -46,33 +190,14 @@ class ParkingDetector:
         
         self._load_model()
         
+        if warmup:
+            self.warmup()
+        
     def _load_model(self):
-        """Load YOLO model"""
+        """Load YOLO model from the shared registry"""
         try:
             if YOLO_AVAILABLE:
-                if self.model_path and os.path.exists(self.model_path):
-                    logger.info(f"Loading custom YOLO model: {self.model_path}")
-                    self.model = YOLO(self.model_path)
-                else:
-                    logger.info("Loading default YOLOv8n model")
-                    # Suppress download progress output
-                    import sys
-                    from contextlib import redirect_stdout, redirect_stderr
-                    from io import StringIO
-                    
-                    # Redirect stdout and stderr to suppress download progress
-                    old_stdout = sys.stdout
-                    old_stderr = sys.stderr
-                    sys.stdout = StringIO()
-                    sys.stderr = StringIO()
-                    
-                    try:
-                        self.model = YOLO('yolov8n.pt')  # Lightweight model
-                    finally:
-                        # Restore stdout and stderr
-                        sys.stdout = old_stdout
-                        sys.stderr = old_stderr
-                    
+                self.model = model_registry.get(self.model_path, self.device, self.input_size)
                 logger.info("YOLO model loaded successfully")
             else:
                 logger.warning("YOLO not available, using mock detector")
@@ -82,85 +207,172 @@ class ParkingDetector:
             logger.error(f"Failed to load YOLO model: {str(e)}")
             self.model = None
     
-    def detect_vehicles(self, frame: np.ndarray) -> List[Dict]:
+    def warmup(self, runs: int = 2) -> List[float]:
+        """
+        Warm up the model at the configured input size
+        
+        Args:
+            runs: Number of dummy inferences
+            
+        Returns:
+            Per-run warm-up latency in seconds (empty for the mock detector)
+        """
+        if self.model is None:
+            return []
+        
+        try:
+            return model_registry.warmup(self.model, self.model_key, runs)
+        except Exception as e:
+            logger.error(f"Model warm-up failed: {str(e)}")
+            return []
+    
+    def detect_vehicles(self, frame: np.ndarray, slots: Optional[List[Dict]] = None) -> List[Dict]:
         """
         Detect vehicles in a frame
         
         Args:
             frame: Input image frame
+            slots: Parking slots in view; only the mock detector uses them,
+                to park its synthetic vehicles in
             
         Returns:
             List of detection dictionaries with bbox, confidence, class
         """
+        self.last_detection_fallback = self.model is None
         if self.model is None:
-            return self._mock_detect_vehicles(frame)
+            with self.profiler.stage('inference'):
+                return self._mock_detect_vehicles(frame, slots)
         
         try:
             # Run YOLO inference
-            results = self.model(frame, conf=self.confidence_threshold, verbose=False)
-            
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Extract box data
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = box.conf[0].cpu().numpy()
-                        class_id = int(box.cls[0].cpu().numpy())
-                        
-                        # Filter for vehicle classes only
-                        if class_id in self.vehicle_classes:
-                            detections.append({
-                                'bbox': [int(x1), int(y1), int(x2-x1), int(y2-y1)],  # x, y, w, h
-                                'confidence': float(confidence),
-                                'class_id': class_id,
-                                'class': self.vehicle_classes[class_id]
-                            })
+            start = time.perf_counter_ns()
+            results = self.model(frame, **self._inference_kwargs())
+            detections = self._parse_results(results, time.perf_counter_ns() - start)
             
             logger.debug(f"Detected {len(detections)} vehicles")
             return detections
             
         except Exception as e:
             logger.error(f"Vehicle detection failed: {str(e)}")
-            return self._mock_detect_vehicles(frame)
+            self.last_detection_fallback = True
+            return self._mock_detect_vehicles(frame, slots)
     
-    def _mock_detect_vehicles(self, frame: np.ndarray) -> List[Dict]:
+    def detect_vehicles_batch(self, frames: List[np.ndarray],
+                              layouts: Optional[List[Optional[List[Dict]]]] = None) -> List[List[Dict]]:
         """
-        Mock vehicle detection for testing without YOLO
+        Detect vehicles in several frames with a single inference call
         
         Args:
-            frame: Input image frame
+            frames: Input image frames (may differ in size)
+            layouts: Parking slots in view per frame, for the mock detector
             
         Returns:
-            List of mock detection dictionaries
+            List of detection lists, one per frame
         """
-        height, width = frame.shape[:2]
-        
-        # Generate random mock detections
-        num_detections = np.random.randint(0, 5)  # 0-4 vehicles
-        detections = []
+        self.last_detection_fallback = self.model is None
+        if self.model is None:
+            with self.profiler.stage('inference'):
+                return self.synthetic.detect_batch(frames, layouts)
+        if not frames:
+            return []
         
-        for i in range(num_detections):
-            # Random position and size
-            x = np.random.randint(0, width - 100)
-            y = np.random.randint(0, height - 60)
-            w = np.random.randint(80, 150)
-            h = np.random.randint(40, 80)
-            
-            # Ensure bbox is within frame
-            x = min(x, width - w)
-            y = min(y, height - h)
+        try:
+            start = time.perf_counter_ns()
+            results = list(self.model(list(frames), **self._inference_kwargs()))
+            post_ns = self._record_model_stages(results, time.perf_counter_ns() - start)
             
-            detections.append({
-                'bbox': [x, y, w, h],
-                'confidence': np.random.uniform(0.6, 0.95),
-                'class_id': 2,  # Car
-                'class': 'car'
-            })
+            start = time.perf_counter_ns()
+            detections = [self._parse_results([result]) for result in results]
+            self.profiler.record('postprocess', post_ns + time.perf_counter_ns() - start)
+            return detections
+        except Exception as e:
+            logger.error(f"Batch vehicle detection failed: {str(e)}")
+            self.last_detection_fallback = True
+            return self.synthetic.detect_batch(frames, layouts)
+    
+    def _record_model_stages(self, results: List, call_ns: int) -> int:
+        """
+        Record preprocess/inference timings of a model call
         
+        Ultralytics reports per-image preprocess, inference and postprocess
+        (NMS) times; without them the whole call counts as inference.
+        
+        Returns:
+            Model-side postprocessing time in nanoseconds
+        """
+        speeds = [getattr(result, 'speed', None) for result in results]
+        if not speeds or not all(isinstance(speed, dict) for speed in speeds):
+            self.profiler.record('inference', call_ns)
+            return 0
+        
+        self.profiler.record('preprocess', sum(s.get('preprocess') or 0 for s in speeds) * 1e6)
+        self.profiler.record('inference', sum(s.get('inference') or 0 for s in speeds) * 1e6)
+        return int(sum(s.get('postprocess') or 0 for s in speeds) * 1e6)
+    
+    def _parse_results(self, results, call_ns: Optional[int] = None) -> List[Dict]:
+        """
+        Convert YOLO results into vehicle detection dictionaries
+        
+        Args:
+            results: YOLO results
+            call_ns: Duration of the model call, to record stage timings for
+        """
+        if call_ns is not None:
+            results = list(results)
+            post_ns = self._record_model_stages(results, call_ns)
+            start = time.perf_counter_ns()
+        
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    # Extract box data
+                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                    confidence = box.conf[0].cpu().numpy()
+                    class_id = int(box.cls[0].cpu().numpy())
+                    
+                    # Filter for vehicle classes only
+                    if class_id in self.vehicle_classes:
+                        detections.append({
+                            'bbox': [int(x1), int(y1), int(x2-x1), int(y2-y1)],  # x, y, w, h
+                            'confidence': float(confidence),
+                            'class_id': class_id,
+                            'class': self.vehicle_classes[class_id]
+                        })
+        
+        if call_ns is not None:
+            self.profiler.record('postprocess', post_ns + time.perf_counter_ns() - start)
         return detections
     
+    def _inference_kwargs(self) -> Dict:
+        """Keyword arguments for a YOLO inference call"""
+        kwargs = {
+            'conf': self.confidence_threshold,
+            'imgsz': self.input_size,
+            'verbose': False
+        }
+        if self.device:
+            kwargs['device'] = self.device
+        return kwargs
+    
+    def _mock_detect_vehicles(self, frame: np.ndarray, slots: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Mock vehicle detection for testing without YOLO
+        
+        Detections come from the seeded synthetic detector: vehicles park in
+        the given slots (a grid over the frame without them) and stay over
+        consecutive calls, so mock runs are reproducible.
+        
+        Args:
+            frame: Input image frame
+            slots: Parking slots in view
+            
+        Returns:
+            List of mock detection dictionaries
+        """
+        return self.synthetic.detect(frame, slots)
+    
     def detect_in_regions(self, frame: np.ndarray, regions: List[Dict]) -> List[Dict]:
         """
         Detect vehicles in specific regions (parking slots)
@@ -173,7 +385,7 @@ class ParkingDetector:
             List of detections with region associations
         """
         # Get all vehicle detections
-        all_detections = self.detect_vehicles(frame)
+        all_detections = self.detect_vehicles(frame, regions)
         
         region_detections = []
         
@@ -254,25 +466,7 @@ class ParkingDetector:
         Returns:
             Frame with drawn bounding boxes
         """
-        vis_frame = frame.copy()
-        
-        for detection in detections:
-            x, y, w, h = detection['bbox']
-            confidence = detection['confidence']
-            class_name = detection['class']
-            
-            # Draw bounding box
-            cv2.rectangle(vis_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            
-            # Draw label
-            label = f"{class_name}: {confidence:.2f}"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(vis_frame, (x, y - label_size[1] - 10), 
-                         (x + label_size[0], y), (0, 255, 0), -1)
-            cv2.putText(vis_frame, label, (x, y - 5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
-        
-        return vis_frame
+        return draw_detections(frame.copy(), detections)
     
     def visualize_parking_slots(self, frame: np.ndarray, slots: List[Dict], 
                                detections: Optional[List[Dict]] = None) -> np.ndarray:
@@ -287,33 +481,11 @@ class ParkingDetector:
         Returns:
             Frame with drawn parking slots
         """
-        vis_frame = frame.copy()
-        
-        for slot in slots:
-            coords = slot['coordinates']
-            x, y, w, h = int(coords['x']), int(coords['y']), int(coords['width']), int(coords['height'])
-            slot_number = slot.get('slot_number', '?')
-            
-            # Determine slot color based on occupancy
-            if detections:
-                slot_detection = next((d for d in detections if d.get('region_id') == slot.get('id')), None)
-                is_occupied = slot_detection['is_occupied'] if slot_detection else False
-                color = (0, 0, 255) if is_occupied else (0, 255, 0)  # Red if occupied, green if free
-            else:
-                color = (255, 255, 255)  # White if no detection info
-            
-            # Draw slot rectangle
-            cv2.rectangle(vis_frame, (x, y), (x + w, y + h), color, 2)
-            
-            # Draw slot number
-            text_size = cv2.getTextSize(str(slot_number), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-            text_x = x + (w - text_size[0]) // 2
-            text_y = y + (h + text_size[1]) // 2
-            
-            cv2.putText(vis_frame, str(slot_number), (text_x, text_y),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        
-        return vis_frame
+        occupancy = None
+        if detections:
+            # First detection per region wins
+            occupancy = {d.get('region_id'): d['is_occupied'] for d in reversed(detections)}
+        return draw_parking_slots(frame.copy(), slots, occupancy)
     
     def analyze_parking_lot(self, frame: np.ndarray, slot_config: List[Dict]) -> Dict:
         """
@@ -359,6 +531,23 @@ class ParkingDetector:
             'timestamp': cv2.getTickCount()
         }
     
+    def get_model_identity(self) -> Optional[str]:
+        """
+        Identify the loaded weights for cache keys
+        
+        Returns:
+            Identity string, or None when the mock detector is active (its
+            detections are never cached)
+        """
+        if self.model is None:
+            return None
+        
+        model_file = self.model_key[0]
+        if os.path.exists(model_file):
+            stat = os.stat(model_file)
+            return f"{model_file}:{stat.st_size}:{int(stat.st_mtime)}"
+        return model_file
+    
     def set_confidence_threshold(self, threshold: float):
         """Set confidence threshold for detections"""
         self.confidence_threshold = max(0.1, min(1.0, threshold))
@@ -382,6 +571,9 @@ class ParkingDetector:
             'model_type': 'YOLO',
             'model_path': self.model_path,
             'available': YOLO_AVAILABLE,
+            'device': self.device or 'auto',
+            'input_size': self.input_size,
+            'warmed_up': model_registry.is_warm(self.model_key),
             'confidence_threshold': self.confidence_threshold,
             'nms_threshold': self.nms_threshold,
             'vehicle_classes': self.vehicle_classes
@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Profiling
+Per-stage timing of the processing hot path, memory accounting, profiler reports
+and a Prometheus endpoint
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import sys
+import time
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# Most recent samples per stage kept for percentiles
+STAGE_SAMPLE_WINDOW = 4096
+PERCENTILES = (50, 90, 99)
+PROFILE_MODES = ('cprofile', 'sampling')
+
+# Aggregation levels in order of increasing memory pressure
+MEMORY_LEVELS = ('normal', 'compact', 'streaming')
+# Fractions of the memory budget at which the compact/streaming levels start
+COMPACT_AT = 0.7
+STREAMING_AT = 0.85
+
+class StageStats:
+    """Count, total and recent durations of one stage"""
+
+    def __init__(self, window: int = STAGE_SAMPLE_WINDOW):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._samples = array('q', [0]) * window
+        self._window = window
+
+    def add(self, duration_ns: int):
+        self._samples[self.count % self._window] = duration_ns
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile_ns(self, q: float) -> int:
+        """Nearest-rank percentile over the sample window"""
+        samples = sorted(self._samples[:min(self.count, self._window)])
+        if not samples:
+            return 0
+        rank = max(1, -(-len(samples) * q // 100))
+        return samples[int(rank) - 1]
+
+    def summary(self) -> Dict:
+        summary = {
+            'count': self.count,
+            'total_ms': round(self.total_ns / 1e6, 3),
+            'mean_ms': round(self.total_ns / self.count / 1e6, 4) if self.count else 0.0,
+            'max_ms': round(self.max_ns / 1e6, 4)
+        }
+        for q in PERCENTILES:
+            summary[f'p{q}_ms'] = round(self.percentile_ns(q) / 1e6, 4)
+        return summary
+
+class _StageTimer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler: 'StageProfiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, time.perf_counter_ns() - self.start)
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+class StageProfiler:
+    """
+    Low-overhead per-stage timer for the processing hot path
+
+    Stages are timed with time.perf_counter_ns and aggregated into count,
+    total, max and percentiles over the most recent samples. Recording is
+    thread-safe; a disabled profiler costs one attribute check per stage.
+    """
+
+    def __init__(self, enabled: bool = True, window: int = STAGE_SAMPLE_WINDOW):
+        """
+        Initialize stage profiler
+
+        Args:
+            enabled: Record stage timings
+            window: Number of recent samples per stage used for percentiles
+        """
+        self.enabled = enabled
+        self.window = window
+        self.stages: 'OrderedDict[str, StageStats]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        """
+        Time a block of code
+
+        Args:
+            name: Stage name
+
+        Returns:
+            Context manager recording the block's duration
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+
+    def record(self, name: str, duration_ns: int):
+        """Record one duration of a stage in nanoseconds"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(self.window)
+            stats.add(int(duration_ns))
+
+    def total_seconds(self, *names: str) -> float:
+        """Total recorded time of the given stages in seconds"""
+        with self._lock:
+            return sum(self.stages[name].total_ns for name in names if name in self.stages) / 1e9
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-stage statistics in milliseconds, in order of first use"""
+        with self._lock:
+            return {name: stats.summary() for name, stats in self.stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+
+    def prometheus_text(self, extra_gauges: Optional[Dict[str, float]] = None,
+                        prefix: str = 'ai_parking') -> str:
+        """
+        Render stage statistics in the Prometheus text exposition format
+
+        Args:
+            extra_gauges: Additional numeric gauges (e.g. processing_stats)
+            prefix: Metric name prefix
+
+        Returns:
+            Metrics text
+        """
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each processing stage',
+            f'# TYPE {prefix}_stage_seconds summary'
+        ]
+        with self._lock:
+            for name, stats in self.stages.items():
+                for q in PERCENTILES:
+                    lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{q / 100}"}} '
+                                 f'{stats.percentile_ns(q) / 1e9:.9f}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats.total_ns / 1e9:.9f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats.count}')
+
+        for key, value in (extra_gauges or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'# TYPE {prefix}_{key} gauge')
+                lines.append(f'{prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+def current_rss_mb() -> Optional[float]:
+    """Current resident set size of this process in megabytes (None where unsupported)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        # No procfs (macOS, Windows): the peak is the best available upper bound
+        return peak_rss_mb()
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in megabytes (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class MemoryMonitor:
+    """
+    Memory accounting and budget enforcement for one processing run
+
+    A background thread samples the process RSS at a fixed interval and
+    tracks the run's peak. With a budget, the monitor's level escalates from
+    'normal' to 'compact' and 'streaming' as RSS approaches it; callers check
+    `level` on their hot path (a plain attribute read) and shrink their state
+    accordingly. Levels never go back down within a run, since dropped
+    state cannot be restored.
+
+    With tracing enabled, checkpoint() also takes a tracemalloc snapshot and
+    records the allocation sites that grew the most since the previous
+    checkpoint. Tracing slows Python allocations noticeably, so it is meant
+    for diagnosing runs, not for production.
+    """
+
+    def __init__(self, budget_mb: Optional[float] = None, trace: bool = False,
+                 interval: float = 0.25, top: int = 5):
+        """
+        Initialize memory monitor
+
+        Args:
+            budget_mb: Memory budget in megabytes of RSS (no enforcement if omitted)
+            trace: Take tracemalloc snapshots at checkpoints
+            interval: Seconds between RSS samples
+            top: Number of allocation sites reported per checkpoint
+        """
+        self.budget_mb = budget_mb
+        self.trace = trace
+        self.interval = interval
+        self.top = top
+
+        self.level = MEMORY_LEVELS[0]
+        self.start_rss_mb: Optional[float] = None
+        self.peak_rss_mb: Optional[float] = None
+        self.samples = 0
+        self.checkpoints: List[Dict] = []
+        self._snapshot = None
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'MemoryMonitor':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> 'MemoryMonitor':
+        """Reset the run state and start sampling"""
+        self.stop()
+        self.level = MEMORY_LEVELS[0]
+        self.peak_rss_mb = None
+        self.samples = 0
+        self.checkpoints = []
+        self._snapshot = None
+        self.start_rss_mb = self.sample()
+
+        if self.trace:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='memory-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling (and tracing, if this monitor started it)"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.sample()
+        if self._started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracing = False
+        self._snapshot = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> Optional[float]:
+        """Sample the current RSS, update the peak and escalate the level"""
+        rss = current_rss_mb()
+        if rss is None:
+            return None
+        with self._lock:
+            self.samples += 1
+            if self.peak_rss_mb is None or rss > self.peak_rss_mb:
+                self.peak_rss_mb = rss
+            if self.budget_mb:
+                if rss >= self.budget_mb * STREAMING_AT:
+                    level = 'streaming'
+                elif rss >= self.budget_mb * COMPACT_AT:
+                    level = 'compact'
+                else:
+                    level = 'normal'
+                if MEMORY_LEVELS.index(level) > MEMORY_LEVELS.index(self.level):
+                    logger.warning(f"Memory at {rss:.0f}MB of a {self.budget_mb:.0f}MB budget, "
+                                   f"switching to {level} aggregation")
+                    self.level = level
+        return rss
+
+    def checkpoint(self, stage: str) -> Dict:
+        """
+        Record memory use at a stage boundary
+
+        Args:
+            stage: Stage name
+
+        Returns:
+            Checkpoint with RSS and, when tracing, traced Python memory and
+            the allocation sites that grew the most since the last checkpoint
+        """
+        checkpoint = {'stage': stage, 'rss_mb': _round_mb(self.sample())}
+        if self.trace and self._thread is not None:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)])
+            if self._snapshot is None:
+                stats = snapshot.statistics('lineno')
+            else:
+                stats = snapshot.compare_to(self._snapshot, 'lineno')
+            self._snapshot = snapshot
+
+            checkpoint['traced_mb'] = _round_mb(current / (1024 * 1024))
+            checkpoint['traced_peak_mb'] = _round_mb(peak / (1024 * 1024))
+            checkpoint['top_allocations'] = [{
+                'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                'size_kb': round(stat.size / 1024, 1),
+                'growth_kb': round(getattr(stat, 'size_diff', stat.size) / 1024, 1),
+                'count': stat.count
+            } for stat in stats[:self.top]]
+        self.checkpoints.append(checkpoint)
+        return checkpoint
+
+    def summary(self) -> Dict:
+        """Memory statistics of the run"""
+        with self._lock:
+            return {
+                'budget_mb': self.budget_mb,
+                'level': self.level,
+                'start_rss_mb': _round_mb(self.start_rss_mb),
+                'peak_rss_mb': _round_mb(self.peak_rss_mb),
+                'samples': self.samples,
+                'checkpoints': list(self.checkpoints)
+            }
+
+def _round_mb(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the stack of one thread at a fixed interval
+
+    Much cheaper than cProfile on hot loops since the profiled code runs
+    uninstrumented; the report counts how often each function was on the
+    stack (inclusive) and at the top of it (exclusive).
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        """
+        Initialize sampling profiler
+
+        Args:
+            interval: Seconds between samples
+            thread_id: Thread to sample (defaults to the thread calling start())
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = 0
+        self.exclusive: Counter = Counter()
+        self.inclusive: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if leaf:
+                    self.exclusive[key] += 1
+                    leaf = False
+                if key not in seen:
+                    seen.add(key)
+                    self.inclusive[key] += 1
+                frame = frame.f_back
+
+    def report(self, limit: int = 40) -> str:
+        """Text report of the most sampled functions"""
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f}ms",
+                 f"{'inclusive':>10} {'exclusive':>10}  function"]
+        for key, count in self.inclusive.most_common(limit):
+            filename, lineno, name = key
+            lines.append(f"{count / max(self.samples, 1):>9.1%} {self.exclusive[key] / max(self.samples, 1):>10.1%}"
+                         f"  {name} ({filename}:{lineno})")
+        return '\n'.join(lines) + '\n'
+
+class ProfileRun:
+    """
+    Run a block under cProfile or the sampling profiler and write a report
+
+    Example:
+        with ProfileRun('sampling', 'profile.txt'):
+            processor.process_video(...)
+    """
+
+    def __init__(self, mode: Optional[str], output_path: Optional[str] = None, limit: int = 40):
+        """
+        Initialize profile run
+
+        Args:
+            mode: 'cprofile', 'sampling' or None (no profiling)
+            output_path: Report file (stderr if omitted)
+            limit: Number of functions in the report
+        """
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode} (expected one of {', '.join(PROFILE_MODES)})")
+        self.mode = mode
+        self.output_path = output_path
+        self.limit = limit
+        self._profiler = None
+
+    def __enter__(self) -> 'ProfileRun':
+        if self.mode == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.mode == 'sampling':
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is None:
+            return
+        if self.mode == 'cprofile':
+            import pstats
+            self._profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(self.limit)
+            report = stream.getvalue()
+        else:
+            self._profiler.stop()
+            report = self._profiler.report(self.limit)
+
+        if self.output_path:
+            with open(self.output_path, 'w') as f:
+                f.write(report)
+            logger.info(f"{self.mode} report saved: {self.output_path}")
+        else:
+            sys.stderr.write(report)
+
+class MetricsServer:
+    """Background HTTP server exposing stage metrics at /metrics in Prometheus text format"""
+
+    def __init__(self, profiler: StageProfiler, port: int, host: str = '0.0.0.0',
+                 gauges: Optional[Callable[[], Dict[str, float]]] = None):
+        """
+        Initialize metrics server
+
+        Args:
+            profiler: Stage profiler to expose
+            port: Port to listen on (0 picks a free port)
+            host: Interface to bind
+            gauges: Optional callable returning extra numeric gauges per scrape
+        """
+        # Only worker runs that expose metrics pay for importing the HTTP stack
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.profiler = profiler
+        self.gauges = gauges
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.profiler.prometheus_text(server.gauges() if server.gauges else None).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='metrics-server',
+                                        daemon=True)
+
+    def __enter__(self) -> 'MetricsServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> 'MetricsServer':
+        self._thread.start()
+        logger.info(f"Serving metrics on port {self.port}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Semantic Intent Classifier
+Embedding-based intent classification against precomputed intent centroids
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import setup_logging, lazy_import, module_available
+
+np = lazy_import('numpy')
+
+# sentence-transformers (and torch) are imported only when the default encoder is used
+SENTENCE_TRANSFORMERS_AVAILABLE = module_available('sentence_transformers')
+
+logger = setup_logging(__name__)
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+DEFAULT_CENTROID_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'ai-parking-system', 'intent-centroids'
+)
+
+# Example phrasings per intent; each intent's centroid is the mean of their embeddings
+INTENT_EXAMPLES = {
+    'find_parking': [
+        "I need somewhere to leave my car",
+        "Is there a spot open near the entrance?",
+        "Can you find me an empty space?",
+        "Where should I park?",
+        "Any free places to park around here?"
+    ],
+    'check_occupancy': [
+        "How crowded is the lot right now?",
+        "Is the garage packed?",
+        "How many cars are parked at the moment?",
+        "Are there many spaces left?",
+        "What is the current occupancy?"
+    ],
+    'get_directions': [
+        "How do I reach the parking garage?",
+        "Which way to the visitor lot?",
+        "Where is the entrance to the car park?",
+        "Guide me to level 2",
+        "Can you give me directions to the lot?"
+    ],
+    'check_duration': [
+        "How long am I allowed to stay?",
+        "Is there a maximum stay?",
+        "Can I leave my car overnight?",
+        "When do I have to move my car?",
+        "What is the time limit for visitors?"
+    ],
+    'check_pricing': [
+        "How much does it cost to park?",
+        "What are the rates?",
+        "Is parking free on Sundays?",
+        "Do I have to pay for the garage?",
+        "What is the daily maximum charge?"
+    ],
+    'report_issue': [
+        "The gate will not open",
+        "Someone is blocking my car",
+        "The payment machine ate my ticket",
+        "There is a problem with the barrier",
+        "I want to complain about the lighting"
+    ],
+    'get_help': [
+        "What can you do?",
+        "I need assistance",
+        "How does this assistant work?",
+        "Can you help me?",
+        "Who do I contact for support?"
+    ]
+}
+
+Encoder = Callable[[List[str]], 'np.ndarray']
+
+def _normalize(vectors: 'np.ndarray') -> 'np.ndarray':
+    """L2-normalize rows so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def sentence_transformer_encoder(model_name: str = DEFAULT_EMBEDDING_MODEL,
+                                 device: Optional[str] = None) -> Encoder:
+    """
+    Create an encoder backed by a local sentence-transformers model
+
+    The model is loaded on first use.
+
+    Args:
+        model_name: sentence-transformers model name or path
+        device: Torch device (None for automatic selection)
+
+    Returns:
+        Function mapping a list of texts to an embedding matrix
+    """
+    model = None
+    lock = threading.Lock()
+
+    def encode(texts: List[str]) -> 'np.ndarray':
+        nonlocal model
+        with lock:
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"Loading embedding model {model_name}")
+                model = SentenceTransformer(model_name, device=device)
+        return model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+    return encode
+
+class SemanticIntentClassifier:
+    """
+    Nearest-centroid intent classifier over sentence embeddings
+
+    Intent centroids are computed once from INTENT_EXAMPLES and cached on
+    disk per model, so classifying a message is one embedding plus a single
+    matrix-vector product. Embeddings of repeated messages come from an LRU
+    cache.
+    """
+
+    def __init__(self, encoder: Optional[Encoder] = None, model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 examples: Optional[Dict[str, List[str]]] = None, min_similarity: float = 0.35,
+                 cache_dir: Optional[str] = DEFAULT_CENTROID_CACHE_DIR,
+                 embedding_cache_size: int = 4096):
+        """
+        Initialize semantic intent classifier
+
+        Args:
+            encoder: Function texts -> embeddings (defaults to a sentence-transformers model)
+            model_name: Model name; also identifies the encoder in the centroid cache
+            examples: Mapping of intent to example phrasings
+            min_similarity: Cosine similarity below which no intent is reported
+            cache_dir: Directory for cached centroids (None disables the disk cache)
+            embedding_cache_size: Number of message embeddings kept in memory
+        """
+        self.encoder = encoder or sentence_transformer_encoder(model_name)
+        self.model_name = model_name
+        self.examples = examples or INTENT_EXAMPLES
+        self.min_similarity = min_similarity
+        self.cache_dir = cache_dir
+        self.embedding_cache_size = embedding_cache_size
+
+        self.labels: List[str] = list(self.examples)
+        self._centroids = None
+        self._embeddings: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'embedding_hits': 0, 'embedding_misses': 0}
+
+    def _centroid_path(self) -> str:
+        key_data = json.dumps({'model': self.model_name, 'examples': self.examples}, sort_keys=True)
+        key = hashlib.sha1(key_data.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    @property
+    def centroids(self) -> 'np.ndarray':
+        """Normalized intent centroid matrix (one row per label), built on first use"""
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    self._centroids = self._load_centroids()
+        return self._centroids
+
+    def _load_centroids(self) -> 'np.ndarray':
+        path = self._centroid_path() if self.cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as cached:
+                    if cached['labels'].tolist() == self.labels:
+                        return cached['centroids']
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable centroid cache {path}: {str(e)}")
+
+        centroids = []
+        for label in self.labels:
+            embeddings = _normalize(np.asarray(self.encoder(self.examples[label]), dtype=np.float32))
+            centroids.append(embeddings.mean(axis=0))
+        centroids = _normalize(np.stack(centroids)).astype(np.float32)
+
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, labels=np.asarray(self.labels), centroids=centroids)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to cache intent centroids: {str(e)}")
+
+        logger.info(f"Computed {len(self.labels)} intent centroids with {self.model_name}")
+        return centroids
+
+    def warmup(self):
+        """Load the model and centroids ahead of the first query"""
+        self.embed("warmup")
+
+    def embed(self, message: str) -> 'np.ndarray':
+        """
+        Get the normalized embedding of a message
+
+        Args:
+            message: User message
+
+        Returns:
+            Embedding vector
+        """
+        key = message.strip().lower()
+        with self._lock:
+            vector = self._embeddings.get(key)
+            if vector is not None:
+                self._embeddings.move_to_end(key)
+                self.stats['embedding_hits'] += 1
+                return vector
+
+        vector = _normalize(np.asarray(self.encoder([key]), dtype=np.float32)[0])
+        with self._lock:
+            self.stats['embedding_misses'] += 1
+            self._embeddings[key] = vector
+            if len(self._embeddings) > self.embedding_cache_size:
+                self._embeddings.popitem(last=False)
+        return vector
+
+    def classify(self, message: str) -> Tuple[Optional[str], float]:
+        """
+        Classify a message by its nearest intent centroid
+
+        Args:
+            message: User message
+
+        Returns:
+            Tuple of (intent or None if below min_similarity, cosine similarity)
+        """
+        similarities = self.centroids @ self.embed(message)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self.min_similarity:
+            return None, similarity
+        return self.labels[best], similarity
+
+    def get_stats(self) -> Dict:
+        """Get embedding cache statistics"""
+        return dict(self.stats, cached_embeddings=len(self._embeddings), model=self.model_name)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Snapshot Service
+Annotated JPEG snapshots of a single video frame for dashboard occupancy images
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from parking_detector import ParkingDetector, DEFAULT_INPUT_SIZE
+from video_writer import draw_parking_slots
+from utils import (setup_logging, lazy_import, parse_slot_config, probe_video, serialize_results,
+                   VideoProcessingError)
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = setup_logging(__name__)
+
+DEFAULT_JPEG_QUALITY = 80
+DEFAULT_CACHE_SIZE = 64
+
+class SnapshotService:
+    """
+    Render annotated occupancy snapshots from single video frames
+
+    A snapshot seeks directly to one frame, analyzes the parking lot on it,
+    draws the slot overlay and JPEG-encodes the result. Snapshots are cached
+    in memory per (video file, frame, configuration), so repeated dashboard
+    polls do not decode or run inference again. A video that is replaced or
+    appended to gets a new cache key through its mtime and size.
+    """
+
+    def __init__(self, detector: Optional[ParkingDetector] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 jpeg_quality: int = DEFAULT_JPEG_QUALITY):
+        """
+        Initialize snapshot service
+
+        Args:
+            detector: Parking detector to analyze frames with (a default one is created if omitted)
+            cache_size: Maximum number of snapshots kept in memory
+            jpeg_quality: Default JPEG quality (1-100)
+        """
+        self.detector = detector or ParkingDetector()
+        self.cache_size = max(0, cache_size)
+        self.jpeg_quality = jpeg_quality
+
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # One render lock per snapshot key being rendered (with its number of
+        # waiters): concurrent polls for the same snapshot wait for the first
+        # render instead of repeating it, while other snapshots render in parallel
+        self._render_locks: Dict[tuple, list] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'render_time': 0.0}
+
+    def _config_hash(self, slot_config: List[Dict], quality: int,
+                     max_width: Optional[int]) -> str:
+        """Hash everything besides the frame that changes the rendered snapshot"""
+        key_data = json.dumps({
+            'slots': slot_config,
+            'model': self.detector.get_model_identity() or 'mock',
+            'input_size': self.detector.input_size,
+            'confidence': round(float(self.detector.confidence_threshold), 4),
+            'quality': quality,
+            'max_width': max_width
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(key_data.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _video_identity(video_path: str) -> Tuple[str, int, int]:
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            raise VideoProcessingError(f"Video file not found: {video_path}")
+        return os.path.realpath(video_path), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _seek(cap: cv2.VideoCapture, video_info: Dict, timestamp: Optional[float]) -> int:
+        """
+        Position a capture on the frame shown at a timestamp
+
+        Args:
+            cap: Open video capture
+            video_info: Probed video metadata
+            timestamp: Seconds from the start (None or negative for the last frame)
+
+        Returns:
+            Frame index the capture is positioned on
+        """
+        fps = video_info['fps']
+        frame_count = video_info['frame_count']
+
+        if timestamp is None or timestamp < 0:
+            frame_index = frame_count - 1
+        else:
+            frame_index = int(timestamp * fps) if fps > 0 else 0
+        if frame_count > 0:
+            frame_index = min(frame_index, frame_count - 1)
+        frame_index = max(frame_index, 0)
+
+        if frame_index > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        return frame_index
+
+    def _read_frame(self, video_path: str, timestamp: Optional[float]) -> Tuple[np.ndarray, int, float]:
+        # Probing is cached per file, so repeated snapshots only open and seek
+        cap, video_info = probe_video(video_path)
+        try:
+            frame_index = self._seek(cap, video_info, timestamp)
+            ret, frame = cap.read()
+            if not ret and frame_index > 0:
+                # Container frame counts can overshoot; fall back to the last decodable frame
+                cap.set(cv2.CAP_PROP_POS_FRAMES, max(frame_index - 1, 0))
+                ret, frame = cap.read()
+                frame_index = max(frame_index - 1, 0)
+            if not ret or frame is None:
+                raise VideoProcessingError(f"Cannot decode frame {frame_index} of {video_path}")
+            return frame, frame_index, video_info['fps']
+        finally:
+            cap.release()
+
+    def _render(self, video_path: str, slot_config: List[Dict], timestamp: Optional[float],
+                quality: int, max_width: Optional[int]) -> Dict:
+        start_time = time.time()
+        frame, frame_index, fps = self._read_frame(video_path, timestamp)
+
+        analysis = self.detector.analyze_parking_lot(frame, slot_config)
+        occupancy = {slot['slot_id']: slot['is_occupied'] for slot in reversed(analysis['slot_results'])}
+
+        # The decoded frame is ours, so the overlay is drawn in place
+        draw_parking_slots(frame, slot_config, occupancy)
+        if max_width and frame.shape[1] > max_width:
+            scale = max_width / frame.shape[1]
+            frame = cv2.resize(frame, (max_width, max(1, int(frame.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if not ok:
+            raise VideoProcessingError("JPEG encoding failed")
+
+        render_time = time.time() - start_time
+        with self._cache_lock:
+            self.stats['render_time'] += render_time
+        logger.info(f"Rendered snapshot of {os.path.basename(video_path)} "
+                    f"frame {frame_index} in {render_time * 1000:.1f}ms")
+
+        return {
+            'image': buffer.tobytes(),
+            'content_type': 'image/jpeg',
+            'frame_index': frame_index,
+            'timestamp': frame_index / fps if fps > 0 else 0.0,
+            'width': frame.shape[1],
+            'height': frame.shape[0],
+            'total_slots': analysis['total_slots'],
+            'occupied_slots': analysis['occupied_slots'],
+            'available_slots': analysis['available_slots'],
+            'occupancy_rate': analysis['occupancy_rate'],
+            'slot_results': analysis['slot_results'],
+            'rendered_at': datetime.now().isoformat()
+        }
+
+    def get_snapshot(self, video_path: str, slot_config: List[Dict],
+                     timestamp: Optional[float] = None, quality: Optional[int] = None,
+                     max_width: Optional[int] = None) -> Dict:
+        """
+        Get an annotated snapshot of a video frame
+
+        Args:
+            video_path: Path to video file
+            slot_config: List of parking slot configurations
+            timestamp: Seconds from the start of the video (None for the last frame)
+            quality: JPEG quality (defaults to the service setting)
+            max_width: Downscale snapshots wider than this (thumbnails)
+
+        Returns:
+            Dictionary with the JPEG bytes ('image'), the frame position and
+            the occupancy analysis of that frame. Cached snapshots are shared,
+            so callers must not modify them.
+        """
+        quality = int(quality or self.jpeg_quality)
+        video_identity = self._video_identity(video_path)
+        config_hash = self._config_hash(slot_config, quality, max_width)
+        # Nearby timestamps usually land on the same frame; key on the requested
+        # time at millisecond resolution so the lookup needs no decoding
+        time_key = None if timestamp is None or timestamp < 0 else round(float(timestamp), 3)
+        key = (video_identity, time_key, config_hash)
+
+        snapshot = self._lookup(key)
+        if snapshot is not None:
+            return snapshot
+
+        with self._cache_lock:
+            render_lock = self._render_locks.setdefault(key, [threading.Lock(), 0])
+            render_lock[1] += 1
+        try:
+            with render_lock[0]:
+                snapshot = self._lookup(key, count_miss=True)
+                if snapshot is not None:
+                    return snapshot
+                snapshot = self._render(video_path, slot_config, timestamp, quality, max_width)
+
+                # Cached before the key's lock is released, so waiters find it
+                with self._cache_lock:
+                    if self.cache_size:
+                        self._cache[key] = snapshot
+                        while len(self._cache) > self.cache_size:
+                            self._cache.popitem(last=False)
+                return snapshot
+        finally:
+            with self._cache_lock:
+                render_lock[1] -= 1
+                if not render_lock[1]:
+                    del self._render_locks[key]
+
+    def get_snapshot_jpeg(self, video_path: str, slot_config: List[Dict],
+                          timestamp: Optional[float] = None, **kwargs) -> bytes:
+        """Get only the JPEG-encoded snapshot buffer (see get_snapshot)"""
+        return self.get_snapshot(video_path, slot_config, timestamp, **kwargs)['image']
+
+    def _lookup(self, key: tuple, count_miss: bool = False) -> Optional[Dict]:
+        with self._cache_lock:
+            snapshot = self._cache.get(key)
+            if snapshot is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+            elif count_miss:
+                self.stats['misses'] += 1
+        return snapshot
+
+    def invalidate(self, video_path: Optional[str] = None):
+        """
+        Drop cached snapshots
+
+        Args:
+            video_path: Only drop snapshots of this video (all if omitted)
+        """
+        with self._cache_lock:
+            if video_path is None:
+                self._cache.clear()
+                return
+            real_path = os.path.realpath(video_path)
+            for key in [key for key in self._cache if key[0][0] == real_path]:
+                del self._cache[key]
+
+    def get_stats(self) -> Dict:
+        """Get snapshot cache statistics"""
+        with self._cache_lock:
+            return dict(self.stats, cached_snapshots=len(self._cache), cache_size=self.cache_size)
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='AI Parking System Snapshot Service')
+    parser.add_argument('--video_path', required=True, help='Path to video file')
+    parser.add_argument('--slot_config', required=True, help='JSON string of slot configuration')
+    parser.add_argument('--timestamp', type=float,
+                       help='Seconds from the start of the video (last frame if omitted)')
+    parser.add_argument('--output', required=True, help='Path to write the JPEG snapshot to')
+    parser.add_argument('--quality', type=int, default=DEFAULT_JPEG_QUALITY, help='JPEG quality (1-100)')
+    parser.add_argument('--max_width', type=int, help='Downscale snapshots wider than this')
+    parser.add_argument('--model_path', help='Path to custom YOLO model')
+    parser.add_argument('--device', help='Inference device (e.g. cpu, cuda:0), auto if omitted')
+    parser.add_argument('--input_size', type=int, default=DEFAULT_INPUT_SIZE,
+                       help='Model input resolution')
+
+    args = parser.parse_args()
+
+    try:
+        slot_config = parse_slot_config(args.slot_config)
+        detector = ParkingDetector(args.model_path, device=args.device, input_size=args.input_size)
+        service = SnapshotService(detector, cache_size=0, jpeg_quality=args.quality)
+
+        snapshot = service.get_snapshot(args.video_path, slot_config, args.timestamp,
+                                        max_width=args.max_width)
+        with open(args.output, 'wb') as f:
+            f.write(snapshot.pop('image'))
+
+        # Snapshot metadata goes to stdout like the video processor's results
+        snapshot['output'] = args.output
+        sys.stdout.buffer.write(serialize_results(snapshot) + b'\n')
+        sys.stdout.buffer.flush()
+    except Exception as e:
+        logger.error(f"Snapshot failed: {str(e)}")
+        print(json.dumps({
+            'error': str(e),
+            'video_filename': os.path.basename(args.video_path),
+            'timestamp': datetime.now().isoformat(),
+            'success': False
+        }))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
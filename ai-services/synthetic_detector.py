@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Synthetic Detector
+Seeded stand-in for the YOLO model producing slot-correlated, persistent detections
+"""
+
+from __future__ import annotations
+
+import math
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils import setup_logging, lazy_import
+
+np = lazy_import('numpy')
+
+logger = setup_logging(__name__)
+
+# COCO vehicle classes and how often each is generated
+VEHICLE_CLASSES = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+CLASS_WEIGHTS = {2: 0.85, 3: 0.03, 5: 0.05, 7: 0.07}
+
+# Lot states kept per slot layout (cameras, regions) before the oldest is dropped
+MAX_LAYOUTS = 32
+# Slots laid out over the frame when the detector is not told the real layout
+DEFAULT_GRID_SLOTS = 24
+
+def grid_layout(frame_size: Tuple[int, int], slot_count: int = DEFAULT_GRID_SLOTS) -> 'np.ndarray':
+    """
+    Slot rectangles in a grid covering a frame
+
+    Args:
+        frame_size: Frame size (width, height)
+        slot_count: Number of slots
+
+    Returns:
+        Array of (x, y, w, h) rows
+    """
+    width, height = frame_size
+    cols = min(slot_count, max(1, round(math.sqrt(2 * slot_count * width / height))))
+    rows = max(1, math.ceil(slot_count / cols))
+    cell_w, cell_h = width // cols, height // rows
+    index = np.arange(slot_count)
+    rects = np.empty((slot_count, 4), dtype=np.int32)
+    rects[:, 0] = (index % cols) * cell_w + cell_w // 10
+    rects[:, 1] = (index // cols) * cell_h + cell_h // 10
+    rects[:, 2] = cell_w - 2 * (cell_w // 10)
+    rects[:, 3] = cell_h - 2 * (cell_h // 10)
+    return rects
+
+def _slot_rects(slots: Sequence[Dict]) -> 'np.ndarray':
+    return np.array([[s['coordinates']['x'], s['coordinates']['y'],
+                      s['coordinates']['width'], s['coordinates']['height']] for s in slots],
+                    dtype=np.int32).reshape(-1, 4)
+
+class _LotState:
+    """Occupancy and parked-vehicle boxes of one slot layout"""
+
+    def __init__(self, rects: 'np.ndarray', rng: 'np.random.Generator'):
+        self.rects = rects
+        self.rng = rng
+        count = len(rects)
+        self.occupied = np.zeros(count, dtype=bool)
+        self.boxes = np.zeros((count, 4), dtype=np.int32)
+        self.scores = np.zeros(count, dtype=np.float32)
+        self.classes = np.zeros(count, dtype=np.int16)
+        self.steps = 0
+
+class SyntheticDetector:
+    """
+    Deterministic synthetic vehicle detector
+
+    Vehicles park in the configured slots: each slot is occupied with
+    probability `density`, and on every call each slot re-draws its state
+    with probability `churn`, so occupancy persists across frames and the
+    long-run occupied fraction stays at `density`. A parked vehicle keeps
+    its box, class and confidence until it leaves (boxes jitter by a few
+    pixels per frame). Stray vehicles driving through the lot are added at
+    `strays` per frame on average. All randomness comes from `seed` and the
+    layout, so the same calls always return the same detections.
+
+    Detections are generated with NumPy for the whole lot at once;
+    detect_arrays() returns them in columnar form for large batches.
+    """
+
+    def __init__(self, seed: int = 0, density: float = 0.6, churn: float = 0.02,
+                 strays: float = 0.5, latency: float = 0.0, latency_per_frame: float = 0.0,
+                 confidence_range: Tuple[float, float] = (0.55, 0.95), jitter: int = 2):
+        """
+        Initialize synthetic detector
+
+        Args:
+            seed: Random seed
+            density: Long-run fraction of occupied slots (0-1)
+            churn: Probability per call that a slot re-draws its occupancy
+            strays: Mean number of vehicles per frame outside slots
+            latency: Seconds each call sleeps, to emulate a model
+            latency_per_frame: Additional seconds per frame of a call
+            confidence_range: Range parked-vehicle confidences are drawn from
+            jitter: Maximum per-frame box jitter in pixels
+        """
+        self.seed = seed
+        self.density = min(max(density, 0.0), 1.0)
+        self.churn = min(max(churn, 0.0), 1.0)
+        self.strays = max(strays, 0.0)
+        self.latency = latency
+        self.latency_per_frame = latency_per_frame
+        self.confidence_range = confidence_range
+        self.jitter = jitter
+
+        self._class_ids = np.array(list(CLASS_WEIGHTS), dtype=np.int16)
+        self._class_p = np.array(list(CLASS_WEIGHTS.values()), dtype=np.float64)
+        self._class_p /= self._class_p.sum()
+        self._states: 'OrderedDict[bytes, _LotState]' = OrderedDict()
+
+    def reset(self):
+        """Forget all lot states (the next calls start over from the seed)"""
+        self._states.clear()
+
+    def _state(self, rects: 'np.ndarray') -> _LotState:
+        key = rects.tobytes()
+        state = self._states.get(key)
+        if state is None:
+            # Seed per layout with a stable hash so every process sees the same lot
+            rng = np.random.default_rng([self.seed, zlib.crc32(key)])
+            state = self._states[key] = _LotState(rects, rng)
+            while len(self._states) > MAX_LAYOUTS:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def _park(self, state: _LotState, arrivals: 'np.ndarray'):
+        """Draw box, class and confidence for vehicles arriving in the given slots"""
+        count = int(arrivals.sum())
+        if not count:
+            return
+        rng = state.rng
+        rects = state.rects[arrivals]
+        # Vehicles fill 80-94% of the slot in each direction, so they overlap it well
+        inset = rng.uniform(0.03, 0.10, (count, 2))
+        offset = rng.uniform(0.2, 0.8, (count, 2))
+        size = rects[:, 2:] * (1 - 2 * inset)
+        state.boxes[arrivals, :2] = rects[:, :2] + (rects[:, 2:] - size) * offset
+        state.boxes[arrivals, 2:] = np.maximum(size, 1)
+        state.scores[arrivals] = rng.uniform(*self.confidence_range, count)
+        state.classes[arrivals] = rng.choice(self._class_ids, count, p=self._class_p)
+
+    def _advance(self, state: _LotState):
+        rng = state.rng
+        count = len(state.rects)
+        if state.steps == 0:
+            arrivals = rng.random(count) < self.density
+        else:
+            redraw = rng.random(count) < self.churn
+            now_occupied = rng.random(count) < self.density
+            arrivals = redraw & now_occupied & ~state.occupied
+            state.occupied &= ~(redraw & ~now_occupied)
+        self._park(state, arrivals)
+        state.occupied |= arrivals
+        state.steps += 1
+
+    def detect_arrays(self, frame_size: Tuple[int, int],
+                      slots: Optional[Sequence[Dict]] = None) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """
+        Generate the detections of the next frame in columnar form
+
+        Args:
+            frame_size: Frame size (width, height)
+            slots: Slot configurations the vehicles park in (a grid over the frame if omitted)
+
+        Returns:
+            Tuple of (boxes int32 (N, 4) as x, y, w, h; confidences float32; class ids int16)
+        """
+        width, height = frame_size
+        rects = _slot_rects(slots) if slots else grid_layout(frame_size)
+        state = self._state(rects)
+        self._advance(state)
+        rng = state.rng
+
+        boxes = state.boxes[state.occupied]
+        scores = state.scores[state.occupied]
+        classes = state.classes[state.occupied]
+        if self.jitter and len(boxes):
+            boxes = boxes + rng.integers(-self.jitter, self.jitter + 1, boxes.shape, dtype=np.int32)
+            scores = np.clip(scores + rng.normal(0, 0.01, len(scores)).astype(np.float32), 0.05, 0.99)
+
+        stray_count = int(rng.poisson(self.strays)) if self.strays else 0
+        if stray_count:
+            typical = np.median(rects[:, 2:], axis=0) if len(rects) else np.array([80, 60])
+            size = (typical * rng.uniform(0.6, 1.1, (stray_count, 2))).astype(np.int32)
+            stray_boxes = np.empty((stray_count, 4), dtype=np.int32)
+            stray_boxes[:, 2:] = np.maximum(size, 1)
+            stray_boxes[:, 0] = rng.integers(0, np.maximum(width - stray_boxes[:, 2], 1))
+            stray_boxes[:, 1] = rng.integers(0, np.maximum(height - stray_boxes[:, 3], 1))
+            boxes = np.concatenate([boxes, stray_boxes])
+            scores = np.concatenate([scores, rng.uniform(0.3, 0.8, stray_count).astype(np.float32)])
+            classes = np.concatenate([classes, rng.choice(self._class_ids, stray_count, p=self._class_p)])
+
+        # Keep boxes inside the frame
+        boxes[:, 0] = np.clip(boxes[:, 0], 0, max(width - 1, 0))
+        boxes[:, 1] = np.clip(boxes[:, 1], 0, max(height - 1, 0))
+        boxes[:, 2] = np.clip(boxes[:, 2], 1, width - boxes[:, 0])
+        boxes[:, 3] = np.clip(boxes[:, 3], 1, height - boxes[:, 1])
+        return boxes, scores, classes
+
+    @staticmethod
+    def to_detections(boxes: 'np.ndarray', scores: 'np.ndarray', classes: 'np.ndarray') -> List[Dict]:
+        """Convert columnar detections to the detector's dictionaries"""
+        return [
+            {'bbox': bbox, 'confidence': score, 'class_id': class_id,
+             'class': VEHICLE_CLASSES.get(class_id, 'vehicle')}
+            for bbox, score, class_id in zip(boxes.tolist(), scores.tolist(), classes.tolist())
+        ]
+
+    def _sleep(self, frames: int):
+        delay = self.latency + self.latency_per_frame * frames
+        if delay > 0:
+            time.sleep(delay)
+
+    def detect(self, frame: 'np.ndarray', slots: Optional[Sequence[Dict]] = None) -> List[Dict]:
+        """
+        Detect vehicles in a frame
+
+        Args:
+            frame: Input image frame (only its size is used)
+            slots: Slot configurations the vehicles park in
+
+        Returns:
+            List of detection dictionaries with bbox, confidence, class
+        """
+        self._sleep(1)
+        height, width = frame.shape[:2]
+        return self.to_detections(*self.detect_arrays((width, height), slots))
+
+    def detect_batch(self, frames: Sequence['np.ndarray'],
+                     layouts: Optional[Sequence[Optional[Sequence[Dict]]]] = None) -> List[List[Dict]]:
+        """
+        Detect vehicles in several frames with one emulated model call
+
+        Args:
+            frames: Input image frames
+            layouts: Slot configurations per frame (None entries use a grid)
+
+        Returns:
+            List of detection lists, one per frame
+        """
+        self._sleep(len(frames))
+        layouts = layouts or [None] * len(frames)
+        return [
+            self.to_detections(*self.detect_arrays((frame.shape[1], frame.shape[0]), slots))
+            for frame, slots in zip(frames, layouts)
+        ]
@@ -0,0 +1,10 @@
+"""
+Test configuration: make the service modules importable as top-level modules
+"""
+
+import sys
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
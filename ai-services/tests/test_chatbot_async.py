@@ -0,0 +1,86 @@
+"""
+Async LLM path tests against the stand-in chat completions server
+"""
+
+import asyncio
+import gc
+import logging
+import time
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from benchmark import start_stand_in_llm
+from chatbot_service import ChatbotService
+
+STAND_IN_RESPONSE = 'Stand-in LLM response'
+
+@pytest.fixture
+def stand_in():
+    """Start a stand-in server; call it with the upstream latency in seconds"""
+    servers = []
+
+    def start(latency):
+        server, api_base = start_stand_in_llm(latency)
+        servers.append(server)
+        return api_base
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+def _chatbot(api_base, **options):
+    return ChatbotService(api_key='stand-in', api_base=api_base, response_cache_size=0, **options)
+
+async def _gather(chatbot, count):
+    try:
+        return await asyncio.gather(*(chatbot.process_query_async(f'where can I park {i}')
+                                      for i in range(count)))
+    finally:
+        await chatbot.aclose()
+
+def test_responses_come_from_upstream(stand_in):
+    chatbot = _chatbot(stand_in(0.01))
+    results = asyncio.run(_gather(chatbot, 3))
+    assert [r['response'] for r in results] == [STAND_IN_RESPONSE] * 3
+    assert chatbot.llm_stats == {'calls': 3, 'timeouts': 0, 'errors': 0, 'fallbacks': 0}
+
+def test_timeout_falls_back_to_mock(stand_in):
+    chatbot = _chatbot(stand_in(1.0), llm_timeout=0.1)
+    start = time.perf_counter()
+    result, = asyncio.run(_gather(chatbot, 1))
+    assert time.perf_counter() - start < 0.8
+    assert result['response'] != STAND_IN_RESPONSE
+    assert chatbot.llm_stats['timeouts'] == 1
+    assert chatbot.llm_stats['fallbacks'] == 1
+
+def test_concurrency_is_capped(stand_in):
+    chatbot = _chatbot(stand_in(0.2), max_concurrency=2, llm_timeout=5.0)
+    start = time.perf_counter()
+    results = asyncio.run(_gather(chatbot, 6))
+    elapsed = time.perf_counter() - start
+    assert all(r['response'] == STAND_IN_RESPONSE for r in results)
+    # Three rounds of two calls, not one round of six
+    assert elapsed >= 0.55
+
+def test_waiting_for_a_slot_counts_toward_the_timeout(stand_in):
+    chatbot = _chatbot(stand_in(0.3), max_concurrency=1, llm_timeout=0.45)
+    results = asyncio.run(_gather(chatbot, 2))
+    assert sorted(r['response'] == STAND_IN_RESPONSE for r in results) == [False, True]
+    assert chatbot.llm_stats['timeouts'] == 1
+
+def test_sessions_of_closed_loops_are_closed(stand_in, caplog):
+    chatbot = _chatbot(stand_in(0.01))
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        # One event loop per request, as a synchronous wrapper would do
+        for _ in range(3):
+            result = asyncio.run(chatbot.process_query_async('where can I park'))
+            assert result['response'] == STAND_IN_RESPONSE
+            gc.collect()
+        assert len(chatbot._http_sessions) == 1
+
+        asyncio.run(chatbot.aclose())
+        gc.collect()
+    assert chatbot._http_sessions == {}
+    assert 'Unclosed client session' not in caplog.text
@@ -0,0 +1,124 @@
+"""
+Regression tests of optimized paths against the implementations they replaced
+"""
+
+import random
+
+import pytest
+
+from benchmark import build_intent_corpus, reference_analyze
+from chatbot_service import ChatbotService, RecommendationIndex
+
+@pytest.fixture(scope='module')
+def chatbot():
+    return ChatbotService(api_key='')
+
+def test_intent_engine_matches_reference(chatbot):
+    mismatches = []
+    for message in build_intent_corpus(2000):
+        query = chatbot._analyze_intent(message)
+        actual = (query.intent, query.confidence, query.entities)
+        expected = reference_analyze(chatbot.intent_patterns, message)
+        if actual != expected:
+            mismatches.append((message, expected, actual))
+    assert mismatches == []
+
+def _random_lots(rng: random.Random, count: int):
+    lots = []
+    for i in range(count):
+        total = rng.randint(1, 200)
+        available = rng.choice([0, rng.randint(0, total)])
+        lots.append({
+            'id': i,
+            'name': f'Lot {i}',
+            'total_slots': total,
+            'available_slots': available,
+            # Coarse rates produce plenty of score ties
+            'occupancy_rate': rng.choice([0, 25, 50, 60, 75, 100])
+        })
+    return lots
+
+def reference_suggestions(chatbot, lots, limit=3):
+    """Original suggestions: stable descending sort of all available lots"""
+    suggestions = [
+        {
+            'lot_name': lot.get('name', 'Unknown'),
+            'available_slots': lot.get('available_slots', 0),
+            'total_slots': lot.get('total_slots', 0),
+            'occupancy_rate': lot.get('occupancy_rate', 0),
+            'recommendation_score': chatbot._calculate_recommendation_score(lot)
+        }
+        for lot in lots if lot.get('available_slots', 0) > 0
+    ]
+    suggestions.sort(key=lambda x: x['recommendation_score'], reverse=True)
+    return suggestions[:limit]
+
+def test_suggestions_match_sorted_ranking(chatbot):
+    rng = random.Random(11)
+    for trial in range(200):
+        lots = _random_lots(rng, rng.randint(0, 40))
+        context = {'parking_lots': lots, 'lots_version': trial}
+        limit = rng.randint(1, 6)
+        assert (chatbot.get_parking_suggestions(context, limit=limit)
+                == reference_suggestions(chatbot, lots, limit))
+
+def test_live_updates_match_sorted_ranking():
+    chatbot = ChatbotService(api_key='')
+    rng = random.Random(5)
+    lots = _random_lots(rng, 30)
+    context = {'parking_lots': lots, 'lots_version': 1}
+    chatbot.get_parking_suggestions(context)
+
+    for _ in range(300):
+        lot = rng.choice(lots)
+        lot['available_slots'] = rng.randint(0, lot['total_slots'])
+        lot['occupancy_rate'] = rng.choice([0, 25, 50, 60, 75, 100])
+        chatbot.update_lot_availability(dict(lot))
+        # Same version: served from the index without a resync
+        assert chatbot.get_parking_suggestions(context, limit=5) == reference_suggestions(chatbot, lots, 5)
+
+def test_lots_without_slots_are_skipped(chatbot):
+    lots = [
+        {'id': 'a', 'name': 'Empty', 'total_slots': 0, 'available_slots': 0, 'occupancy_rate': 0},
+        {'id': 'b', 'name': 'Broken', 'total_slots': 0, 'available_slots': 3, 'occupancy_rate': 0},
+        {'id': 'c', 'name': 'Open', 'total_slots': 10, 'available_slots': 4, 'occupancy_rate': 60}
+    ]
+    suggestions = chatbot.get_parking_suggestions({'parking_lots': lots, 'lots_version': 'zero'})
+    assert [s['lot_name'] for s in suggestions] == ['Open']
+
+def test_index_sync_skips_unchanged_version():
+    index = RecommendationIndex(lambda lot: lot['available_slots'])
+    lots = [{'id': 1, 'available_slots': 2, 'total_slots': 5}]
+    assert index.sync(lots, version=1)
+    assert not index.sync(lots, version=1)
+    assert index.sync(lots, version=2)
+    # Without a version the lots are always checked
+    assert index.sync(lots)
+    assert index.sync(lots)
+
+def test_in_place_updates_without_version(chatbot):
+    lots = [
+        {'id': 'main', 'name': 'Main Lot', 'total_slots': 100, 'available_slots': 50, 'occupancy_rate': 50},
+        {'id': 'north', 'name': 'North Lot', 'total_slots': 40, 'available_slots': 4, 'occupancy_rate': 90}
+    ]
+    context = {'parking_lots': lots}
+    assert chatbot.get_parking_suggestions(context)[0]['lot_name'] == 'Main Lot'
+
+    lots[0]['available_slots'] = 0
+    lots[0]['occupancy_rate'] = 100
+    assert chatbot.get_parking_suggestions(context) == reference_suggestions(chatbot, lots)
+    assert [s['lot_name'] for s in chatbot.get_parking_suggestions(context)] == ['North Lot']
+
+    lots[1]['available_slots'] = 30
+    assert chatbot.get_parking_suggestions(context) == reference_suggestions(chatbot, lots)
+
+def test_sync_rescores_only_changed_lots():
+    scored = []
+    index = RecommendationIndex(lambda lot: scored.append(lot['id']) or lot['available_slots'])
+    lots = [{'id': i, 'available_slots': i + 1, 'total_slots': 10} for i in range(5)]
+    index.sync(lots)
+    scored.clear()
+    lots[3]['available_slots'] = 9
+    index.sync(lots)
+    assert scored == [3]
+    assert index.top(1)[0][0]['id'] == 3
@@ -0,0 +1,99 @@
+"""
+Round-trip tests for serialize_results across the JSON and msgpack encoders
+"""
+
+import json
+import math
+
+import numpy as np
+import pytest
+
+import utils
+from utils import serialize_results, to_native
+
+def _payload():
+    """Results as the processor produces them, with NumPy values and non-finite floats"""
+    return {
+        'video_path': 'lot.mp4',
+        'total_frames': np.int64(120),
+        'fps': np.float64(29.97),
+        'occupancy_rate': float('nan'),
+        'peak': np.float64('inf'),
+        'confidence': np.float32(0.1),
+        'occupied': np.bool_(True),
+        'slot_counts': np.array([3, 0, 7], dtype=np.int32),
+        'scores': np.array([0.25, np.nan, 0.9], dtype=np.float32),
+        'boxes': np.arange(8, dtype=np.int16).reshape(2, 4),
+        'slots': [
+            {'slot_id': 'A1', 'is_occupied': np.bool_(False), 'overlap': np.float64(np.nan)},
+            {'slot_id': 'A2', 'is_occupied': True, 'overlap': 0.5}
+        ],
+        'empty': np.zeros(0, dtype=np.float64)
+    }
+
+EXPECTED = {
+    'video_path': 'lot.mp4',
+    'total_frames': 120,
+    'fps': 29.97,
+    'occupancy_rate': None,
+    'peak': None,
+    'confidence': 0.1,
+    'occupied': True,
+    'slot_counts': [3, 0, 7],
+    'scores': [0.25, None, 0.9],
+    'boxes': [[0, 1, 2, 3], [4, 5, 6, 7]],
+    'slots': [
+        {'slot_id': 'A1', 'is_occupied': False, 'overlap': None},
+        {'slot_id': 'A2', 'is_occupied': True, 'overlap': 0.5}
+    ],
+    'empty': []
+}
+
+@pytest.fixture
+def without_orjson(monkeypatch):
+    """Force the standard library JSON path"""
+    available = utils.module_available
+    monkeypatch.setattr(utils, 'module_available', lambda name: name != 'orjson' and available(name))
+
+def _decode_strict(data: bytes):
+    """Decode JSON rejecting the non-standard NaN/Infinity literals"""
+    def reject(literal):
+        raise ValueError(f"non-standard JSON literal {literal}")
+    return json.loads(data, parse_constant=reject)
+
+def test_stdlib_json_round_trip(without_orjson):
+    assert _decode_strict(serialize_results(_payload())) == EXPECTED
+
+def test_orjson_round_trip():
+    pytest.importorskip('orjson')
+    assert _decode_strict(serialize_results(_payload())) == EXPECTED
+
+def test_json_backends_decode_identically(monkeypatch):
+    pytest.importorskip('orjson')
+    payload = _payload()
+    fast = serialize_results(payload)
+    available = utils.module_available
+    monkeypatch.setattr(utils, 'module_available', lambda name: name != 'orjson' and available(name))
+    assert json.loads(serialize_results(payload)) == json.loads(fast)
+
+def test_stdlib_json_finite_payload_is_unchanged(without_orjson):
+    results = {'frames': [{'frame': 1, 'rate': 0.5}], 'count': np.int32(2)}
+    assert json.loads(serialize_results(results)) == {'frames': [{'frame': 1, 'rate': 0.5}], 'count': 2}
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    assert msgpack.unpackb(serialize_results(_payload(), 'msgpack'), raw=False) == EXPECTED
+
+def test_msgpack_matches_json():
+    msgpack = pytest.importorskip('msgpack')
+    payload = _payload()
+    assert (msgpack.unpackb(serialize_results(payload, 'msgpack'), raw=False)
+            == json.loads(serialize_results(payload)))
+
+def test_to_native_drops_non_finite_floats():
+    native = to_native({'values': np.array([1.5, np.inf, -np.inf]), 'nan': math.nan})
+    assert native == {'values': [1.5, None, None], 'nan': None}
+
+def test_unsupported_format_is_rejected():
+    with pytest.raises(utils.ConfigurationError):
+        serialize_results({}, 'xml')
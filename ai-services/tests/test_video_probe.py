@@ -0,0 +1,51 @@
+"""
+Tests of probe_video caching
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+import utils
+from utils import VideoProcessingError, probe_video
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / 'lot.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48))
+    for i in range(5):
+        writer.write(np.full((48, 64, 3), i * 40, dtype=np.uint8))
+    writer.release()
+    return path
+
+class _ClosedCapture:
+    def isOpened(self):
+        return False
+
+    def release(self):
+        pass
+
+def test_open_failure_is_not_cached(video, monkeypatch):
+    opened = utils.open_video_capture
+    monkeypatch.setattr(utils, 'open_video_capture', lambda path, decode=None: _ClosedCapture())
+    with pytest.raises(VideoProcessingError, match='Cannot open'):
+        probe_video(video, open_capture=False)
+
+    # Once the file can be opened again the probe succeeds
+    monkeypatch.setattr(utils, 'open_video_capture', opened)
+    _, info = probe_video(video, open_capture=False)
+    assert (info['width'], info['height']) == (64, 48)
+
+def test_metadata_is_cached(video, monkeypatch):
+    _, info = probe_video(video, open_capture=False)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('probe reopened a cached file')
+    monkeypatch.setattr(utils, '_probe_uncached', fail)
+    assert probe_video(video, open_capture=False)[1] == info
+
+def test_unsupported_format(tmp_path):
+    path = tmp_path / 'lot.txt'
+    path.write_text('not a video')
+    with pytest.raises(VideoProcessingError, match='Unsupported'):
+        probe_video(str(path))
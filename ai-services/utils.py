@@ -4,15 +4,59 @@ AI Parking System - Utilities
 Common utility functions for AI services
 """
 
+from __future__ import annotations
+
 import os
+import sys
 import json
+import math
+import types
+import queue
 import logging
-import cv2
-import numpy as np
+import threading
+import importlib.util
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
 
+class _LazyModule(types.ModuleType):
+    """Module placeholder that performs the real import on first attribute access"""
+    
+    def __getattr__(self, attr: str) -> Any:
+        module = importlib.import_module(self.__name__)
+        # Copy the real namespace so later lookups bypass __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Defer importing a heavy module until it is first used
+    
+    Args:
+        name: Fully qualified module name
+        
+    Returns:
+        The module itself if already imported, otherwise a lazy placeholder
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
+
+def module_available(name: str) -> bool:
+    """Check whether a module can be imported without importing it"""
+    if name in sys.modules:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
 def setup_logging(name: str, level: str = "INFO") -> logging.Logger:
     """
     Setup logging configuration
@@ -42,38 +86,325 @@ def setup_logging(name: str, level: str = "INFO") -> logging.Logger:
     
     return logger
 
-def validate_video_file(video_path: str) -> bool:
+logger = setup_logging(__name__)
+
+# Capture backends by name; 'auto' lets OpenCV pick the first that can open the file
+DECODE_BACKENDS = {
+    'auto': 'CAP_ANY',
+    'ffmpeg': 'CAP_FFMPEG',
+    'gstreamer': 'CAP_GSTREAMER',
+    'msmf': 'CAP_MSMF',
+    'dshow': 'CAP_DSHOW',
+    'avfoundation': 'CAP_AVFOUNDATION',
+    'v4l2': 'CAP_V4L2'
+}
+
+@dataclass(frozen=True)
+class DecodeOptions:
     """
-    Validate video file exists and is readable
+    How video frames are decoded
+    
+    Attributes:
+        backend: Capture backend name (see DECODE_BACKENDS)
+        threads: Decoder threads (0 lets the decoder use all cores, None keeps the backend default)
+        hw_acceleration: Use any available hardware decoder, falling back to software
+        max_width: Downscale frames wider than this right after decoding
+        grayscale: Convert frames to single-channel grayscale right after decoding
+    """
+    backend: str = 'auto'
+    threads: Optional[int] = None
+    hw_acceleration: bool = False
+    max_width: Optional[int] = None
+    grayscale: bool = False
+    
+    @property
+    def reduced(self) -> bool:
+        """Whether frames differ from the full-size BGR frames of the video"""
+        return bool(self.max_width) or self.grayscale
+    
+    def capture_params(self) -> List[int]:
+        """VideoCapture open parameters for these options"""
+        params = []
+        if self.threads is not None and hasattr(cv2, 'CAP_PROP_N_THREADS'):
+            params += [cv2.CAP_PROP_N_THREADS, int(self.threads)]
+        if self.hw_acceleration and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        return params
+
+def _backend_id(backend: str) -> int:
+    """Resolve a backend name, falling back to automatic selection if it is unavailable"""
+    if backend not in DECODE_BACKENDS:
+        raise ConfigurationError(f"Unknown decode backend: {backend} (expected one of {', '.join(DECODE_BACKENDS)})")
+    
+    api = getattr(cv2, DECODE_BACKENDS[backend], None)
+    if api is None or (api != cv2.CAP_ANY and not cv2.videoio_registry.hasBackend(api)):
+        logger.warning(f"Decode backend '{backend}' is not available in this OpenCV build, using auto")
+        return cv2.CAP_ANY
+    return api
+
+def open_video_capture(video_path: str, decode: Optional[DecodeOptions] = None) -> cv2.VideoCapture:
+    """
+    Open a video capture with the requested backend and decoder settings
     
     Args:
         video_path: Path to video file
+        decode: Decode options (backend defaults when omitted)
         
     Returns:
-        True if valid, False otherwise
+        cv2.VideoCapture (check isOpened())
     """
-    if not os.path.exists(video_path):
-        return False
+    if decode is None:
+        return cv2.VideoCapture(video_path)
     
-    # Check file extension
-    valid_extensions = ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv']
-    file_ext = Path(video_path).suffix.lower()
+    api = _backend_id(decode.backend)
+    params = decode.capture_params()
+    if params:
+        cap = cv2.VideoCapture(video_path, api, params)
+        if cap.isOpened():
+            return cap
+        # Backends refuse to open with parameters they do not support
+        cap.release()
+        logger.warning(f"Decoder settings not supported for {video_path}, opening with defaults")
+    return cv2.VideoCapture(video_path, api)
+
+class FrameSource:
+    """
+    Video frame reader with configurable decoding
     
-    if file_ext not in valid_extensions:
-        return False
+    Wraps a cv2.VideoCapture and offers the same read/grab/retrieve/get/set/
+    release interface, so existing capture loops work unchanged. Frames are
+    downscaled and/or converted to grayscale as soon as they are decoded, so
+    consumers never hold full-size frames they do not need.
+    """
     
-    # Try to open with OpenCV
+    def __init__(self, video_path: str, decode: Optional[DecodeOptions] = None,
+                 capture: Optional[cv2.VideoCapture] = None):
+        """
+        Initialize frame source
+        
+        Args:
+            video_path: Path to video file
+            decode: Decode options
+            capture: Already opened capture to wrap (opened from video_path if omitted)
+        """
+        self.video_path = video_path
+        self.decode = decode or DecodeOptions()
+        self.capture = capture if capture is not None else open_video_capture(video_path, decode)
+        
+        width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.source_size = (width, height)
+        self.frame_size = self.source_size
+        if self.decode.max_width and width > self.decode.max_width:
+            self.frame_size = (self.decode.max_width, max(1, round(height * self.decode.max_width / width)))
+        self._scratch: Optional[np.ndarray] = None
+    
+    def __enter__(self) -> 'FrameSource':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+    
+    def __iter__(self):
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                return
+            yield frame
+    
+    def frame_shape(self) -> Tuple[int, ...]:
+        """Array shape of the frames this source produces"""
+        width, height = self.frame_size
+        return (height, width) if self.decode.grayscale else (height, width, 3)
+    
+    def _convert(self, frame: np.ndarray, image: Optional[np.ndarray] = None) -> np.ndarray:
+        resize = self.frame_size != self.source_size
+        if self.decode.grayscale and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=None if resize else image)
+        if resize:
+            frame = cv2.resize(frame, self.frame_size, dst=image, interpolation=cv2.INTER_AREA)
+        return frame
+    
+    def isOpened(self) -> bool:
+        return self.capture.isOpened()
+    
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """Decode the next frame (into image when given, see retrieve())"""
+        if not self.capture.grab():
+            return False, None
+        return self.retrieve(image)
+    
+    def grab(self) -> bool:
+        """Advance to the next frame without converting it"""
+        return self.capture.grab()
+    
+    def retrieve(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Convert the last grabbed frame
+        
+        Args:
+            image: Optional preallocated array of frame_shape() to write the
+                frame into instead of allocating a new one
+        
+        Returns:
+            Tuple of (success, frame)
+        """
+        if not self.decode.reduced:
+            ret, frame = self.capture.retrieve(image)
+        else:
+            # Full-size decodes go to a reused scratch buffer when the caller recycles memory
+            ret, frame = self.capture.retrieve(self._scratch if image is not None else None)
+            if ret and frame is not None:
+                if image is not None:
+                    self._scratch = frame
+                frame = self._convert(frame, image)
+        if not ret or frame is None:
+            return False, None
+        return True, frame
+    
+    def get(self, prop_id: int) -> float:
+        return self.capture.get(prop_id)
+    
+    def set(self, prop_id: int, value: float) -> bool:
+        return self.capture.set(prop_id, value)
+    
+    def getBackendName(self) -> str:
+        return self.capture.getBackendName()
+    
+    def release(self):
+        self.capture.release()
+
+VALID_VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv']
+PROBE_CACHE_SIZE = 256
+
+# Metadata of successfully probed files keyed by (path, mtime, size). Failures
+# are not cached: they may be transient (file locked, descriptor limits) or
+# depend on the decode options
+_probe_cache: 'OrderedDict[tuple, Dict]' = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+def _decode_fourcc(value: float) -> str:
+    """Turn a CAP_PROP_FOURCC value into its four character code"""
+    code = int(value)
+    chars = ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ')
+    return chars if chars.isprintable() else ''
+
+def _read_video_metadata(cap: cv2.VideoCapture, file_size: int) -> Dict:
+    """Collect stream properties from an open capture"""
+    info = {
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'duration': 0,
+        'codec': _decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+        'file_size': file_size
+    }
+    
+    if info['fps'] > 0:
+        info['duration'] = info['frame_count'] / info['fps']
+    
+    return info
+
+def probe_video(video_path: str, open_capture: bool = True,
+                decode: Optional[DecodeOptions] = None) -> Tuple[Optional[FrameSource], Dict]:
+    """
+    Validate a video file and read its metadata with a single open
+    
+    The first probe of a file opens it, decodes the first frame to check it
+    is readable and rewinds the capture. Metadata of valid files is cached
+    by path, mtime and size, so later probes of an unchanged file (retries,
+    re-analysis) skip validation and only open the capture when one is
+    requested. Failed probes are retried every time.
+    
+    Args:
+        video_path: Path to video file
+        open_capture: Return an open frame source positioned at the first frame
+            (False releases it and returns None)
+        decode: Decode options for the returned frame source
+        
+    Returns:
+        Tuple of (frame source or None, metadata dictionary with width,
+        height, fps, frame_count, duration, codec and file_size of the stream)
+        
+    Raises:
+        VideoProcessingError: If the file is missing, unsupported or unreadable
+    """
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        raise VideoProcessingError(f"Video file not found: {video_path}")
+    
+    key = (os.path.realpath(video_path), stat.st_mtime_ns, stat.st_size)
+    with _probe_cache_lock:
+        info = _probe_cache.get(key)
+        if info is not None:
+            _probe_cache.move_to_end(key)
+    
+    if info is not None:
+        if not open_capture:
+            return None, dict(info)
+        
+        cap = open_video_capture(video_path, decode)
+        if cap.isOpened():
+            return FrameSource(video_path, decode, cap), dict(info)
+        cap.release()
+        # Could be transient (file locked, descriptor limits); probe again below
+    
+    cap, info, error = _probe_uncached(video_path, stat.st_size, decode)
+    if error:
+        raise VideoProcessingError(error)
+    
+    with _probe_cache_lock:
+        _probe_cache[key] = info
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    
+    if not open_capture:
+        cap.release()
+        return None, dict(info)
+    return FrameSource(video_path, decode, cap), dict(info)
+
+def _probe_uncached(video_path: str, file_size: int,
+                    decode: Optional[DecodeOptions]) -> Tuple[Optional[cv2.VideoCapture], Optional[Dict], Optional[str]]:
+    """Open and validate a video; returns (capture, metadata, error message)"""
+    if Path(video_path).suffix.lower() not in VALID_VIDEO_EXTENSIONS:
+        return None, None, f"Unsupported video format: {video_path}"
+    
+    cap = open_video_capture(video_path, decode)
     try:
-        cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
-            return False
+            cap.release()
+            return None, None, f"Cannot open video file: {video_path}"
+        
+        info = _read_video_metadata(cap, file_size)
         
-        # Try to read first frame
+        # Try to read first frame, then rewind for the caller
         ret, frame = cap.read()
+        if not ret or frame is None:
+            cap.release()
+            return None, None, f"Cannot decode video file: {video_path}"
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    except Exception as e:
         cap.release()
+        return None, None, f"Cannot read video file {video_path}: {str(e)}"
+    
+    return cap, info, None
+
+def validate_video_file(video_path: str) -> bool:
+    """
+    Validate video file exists and is readable
+    
+    Args:
+        video_path: Path to video file
         
-        return ret and frame is not None
-    except Exception:
+    Returns:
+        True if valid, False otherwise
+    """
+    try:
+        probe_video(video_path, open_capture=False)
+        return True
+    except VideoProcessingError:
         return False
 
 def parse_slot_config(slot_config_str: str) -> List[Dict]:
@@ -88,30 +419,76 @@ def parse_slot_config(slot_config_str: str) -> List[Dict]:
     """
     try:
         slot_config = json.loads(slot_config_str)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in slot configuration: {str(e)}")
+    
+    _validate_slot_config(slot_config)
+    return slot_config
+
+def _validate_slot_config(slot_config: Any):
+    """Check a decoded slot configuration, raising ValueError on problems"""
+    if not isinstance(slot_config, list):
+        raise ValueError("Slot configuration must be a list")
+    
+    for slot in slot_config:
+        required_fields = ['id', 'slot_number', 'coordinates']
+        for field in required_fields:
+            if field not in slot:
+                raise ValueError(f"Missing required field: {field}")
         
-        # Validate slot configuration
-        if not isinstance(slot_config, list):
-            raise ValueError("Slot configuration must be a list")
+        # Validate coordinates
+        coords = slot['coordinates']
+        required_coords = ['x', 'y', 'width', 'height']
+        for coord in required_coords:
+            if coord not in coords:
+                raise ValueError(f"Missing coordinate: {coord}")
+            if not isinstance(coords[coord], (int, float)):
+                raise ValueError(f"Invalid coordinate type: {coord}")
+
+def parse_camera_config(camera_config_str: str) -> List[Dict]:
+    """
+    Parse a multi-camera lot configuration from JSON string
+    
+    The configuration is a list of cameras, each with a video_path, a
+    slot_config in that camera's pixel coordinates and an optional
+    camera_id. Slots with the same id in several cameras are one physical
+    slot seen from different views.
+    
+    Args:
+        camera_config_str: JSON string containing camera configuration
         
-        for slot in slot_config:
-            required_fields = ['id', 'slot_number', 'coordinates']
-            for field in required_fields:
-                if field not in slot:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            # Validate coordinates
-            coords = slot['coordinates']
-            required_coords = ['x', 'y', 'width', 'height']
-            for coord in required_coords:
-                if coord not in coords:
-                    raise ValueError(f"Missing coordinate: {coord}")
-                if not isinstance(coords[coord], (int, float)):
-                    raise ValueError(f"Invalid coordinate type: {coord}")
+    Returns:
+        List of camera dictionaries with camera_id, video_path and slot_config
+    """
+    try:
+        cameras = json.loads(camera_config_str)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in camera configuration: {str(e)}")
+    
+    if not isinstance(cameras, list) or not cameras:
+        raise ValueError("Camera configuration must be a non-empty list")
+    
+    parsed = []
+    for index, camera in enumerate(cameras):
+        if not isinstance(camera, dict):
+            raise ValueError(f"Camera {index} must be an object")
+        for field in ('video_path', 'slot_config'):
+            if field not in camera:
+                raise ValueError(f"Camera {index} is missing required field: {field}")
         
-        return slot_config
+        slot_config = camera['slot_config']
+        if isinstance(slot_config, str):
+            slot_config = parse_slot_config(slot_config)
+        else:
+            _validate_slot_config(slot_config)
         
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON in slot configuration: {str(e)}")
+        parsed.append(dict(camera, camera_id=camera.get('camera_id', index), slot_config=slot_config))
+    
+    camera_ids = [camera['camera_id'] for camera in parsed]
+    if len(set(map(str, camera_ids))) != len(camera_ids):
+        raise ValueError("Camera ids must be unique")
+    
+    return parsed
 
 def validate_slot_coordinates(coordinates: Dict, frame_shape: Tuple[int, int]) -> bool:
     """
@@ -272,59 +649,419 @@ def load_detection_results(input_path: str) -> Dict:
     except Exception as e:
         raise IOError(f"Failed to load results: {str(e)}")
 
-def create_output_video(frames: List[np.ndarray], output_path: str, fps: int = 30):
+# Binary detection log: magic, little-endian uint32 header length, JSON header,
+# padding to DETECTION_LOG_ALIGN, then fixed-width records sorted by frame
+DETECTION_LOG_MAGIC = b'PKDETLOG'
+DETECTION_LOG_VERSION = 1
+DETECTION_LOG_ALIGN = 64
+DETECTION_RECORD_FIELDS = [
+    ('frame', '<u4'),
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('width', '<i4'),
+    ('height', '<i4'),
+    ('score', '<f4'),
+    ('class_id', '<u2')
+]
+
+def detection_record_dtype() -> np.dtype:
+    """NumPy structured dtype of one detection log record"""
+    return np.dtype(DETECTION_RECORD_FIELDS)
+
+def detections_to_records(frame_detections: Dict[int, List[Dict]]) -> np.ndarray:
+    """
+    Convert per-frame detection dictionaries to detection log records
+    
+    Args:
+        frame_detections: Mapping of frame index to detections with 'bbox',
+            'confidence' and 'class_id'
+        
+    Returns:
+        Structured array sorted by frame index
+    """
+    rows = [
+        (frame_index, *det['bbox'], det['confidence'], det.get('class_id', 0))
+        for frame_index in sorted(frame_detections)
+        for det in frame_detections[frame_index]
+    ]
+    return np.array(rows, dtype=detection_record_dtype())
+
+def save_detection_log(records: np.ndarray, output_path: str, metadata: Optional[Dict] = None):
+    """
+    Save detection records in the compact binary detection log format
+    
+    Args:
+        records: Structured array with detection_record_dtype()
+        output_path: Path to save the log
+        metadata: Optional JSON-serializable metadata stored in the header
+    """
+    try:
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        records = np.asarray(records, dtype=detection_record_dtype())
+        if records.size > 1 and np.any(np.diff(records['frame'].astype(np.int64)) < 0):
+            records = np.sort(records, order='frame', kind='stable')
+        
+        header = json.dumps({
+            'version': DETECTION_LOG_VERSION,
+            'fields': DETECTION_RECORD_FIELDS,
+            'count': int(records.size),
+            'saved_at': datetime.now().isoformat(),
+            'metadata': metadata or {}
+        }).encode('utf-8')
+        
+        prefix_len = len(DETECTION_LOG_MAGIC) + 4 + len(header)
+        padding = -prefix_len % DETECTION_LOG_ALIGN
+        
+        with open(output_path, 'wb') as f:
+            f.write(DETECTION_LOG_MAGIC)
+            f.write(len(header).to_bytes(4, 'little'))
+            f.write(header)
+            f.write(b' ' * padding)
+            f.write(records.tobytes())
+            
+    except Exception as e:
+        raise IOError(f"Failed to save detection log: {str(e)}")
+
+class DetectionLog:
+    """Memory-mapped reader for binary detection logs"""
+    
+    def __init__(self, input_path: str):
+        """
+        Open a detection log without reading its records into memory
+        
+        Args:
+            input_path: Path to detection log file
+        """
+        try:
+            with open(input_path, 'rb') as f:
+                if f.read(len(DETECTION_LOG_MAGIC)) != DETECTION_LOG_MAGIC:
+                    raise ValueError("Not a detection log file")
+                header_len = int.from_bytes(f.read(4), 'little')
+                header = json.loads(f.read(header_len).decode('utf-8'))
+        except (OSError, ValueError) as e:
+            raise IOError(f"Failed to load detection log: {str(e)}")
+        
+        if header.get('version') != DETECTION_LOG_VERSION:
+            raise IOError(f"Unsupported detection log version: {header.get('version')}")
+        
+        prefix_len = len(DETECTION_LOG_MAGIC) + 4 + header_len
+        offset = prefix_len + (-prefix_len % DETECTION_LOG_ALIGN)
+        dtype = np.dtype([tuple(field) for field in header['fields']])
+        
+        self.path = input_path
+        self.metadata = header.get('metadata', {})
+        self.saved_at = header.get('saved_at')
+        if header['count'] > 0:
+            self.records = np.memmap(input_path, dtype=dtype, mode='r',
+                                     offset=offset, shape=(header['count'],))
+        else:
+            self.records = np.zeros(0, dtype=dtype)
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def frame_range(self, start: int, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Zero-copy view of the records for frames in [start, stop)
+        
+        Args:
+            start: First frame index (inclusive)
+            stop: Last frame index (exclusive), None for end of log
+            
+        Returns:
+            Structured array view into the memory map
+        """
+        frames = self.records['frame']
+        lo = int(np.searchsorted(frames, start, side='left'))
+        hi = len(frames) if stop is None else int(np.searchsorted(frames, stop, side='left'))
+        return self.records[lo:hi]
+    
+    def frame(self, frame_index: int) -> np.ndarray:
+        """Records of a single frame"""
+        return self.frame_range(frame_index, frame_index + 1)
+    
+    def frame_indices(self) -> np.ndarray:
+        """Unique frame indices that have at least one detection"""
+        return np.unique(self.records['frame'])
+    
+    @staticmethod
+    def to_detections(records: np.ndarray, class_names: Optional[Dict[int, str]] = None) -> List[Dict]:
+        """
+        Convert records back to detection dictionaries
+        
+        Args:
+            records: Structured array slice (e.g. from frame_range)
+            class_names: Optional class id to name mapping
+            
+        Returns:
+            List of detection dictionaries including their frame index
+        """
+        class_names = class_names or {}
+        return [
+            {
+                'frame': frame,
+                'bbox': [x, y, w, h],
+                'confidence': score,
+                'class_id': class_id,
+                'class': class_names.get(class_id, 'vehicle')
+            }
+            for frame, x, y, w, h, score, class_id in records.tolist()
+        ]
+
+def load_detection_log(input_path: str) -> DetectionLog:
     """
-    Create output video from list of frames
+    Open a binary detection log for memory-mapped replay
     
     Args:
-        frames: List of video frames
+        input_path: Path to detection log file
+        
+    Returns:
+        DetectionLog reader
+    """
+    return DetectionLog(input_path)
+
+def _encode_default(o: Any) -> Any:
+    """Encode values the JSON encoders do not support natively"""
+    # NumPy scalars/arrays convert in bulk through the C implementations
+    if isinstance(o, (np.generic, np.ndarray)):
+        if o.dtype.kind == 'f' and o.dtype.itemsize < 8:
+            # Shortest repr at the value's own precision, as orjson writes float32
+            o = o.astype(str).astype(np.float64)
+        return o.tolist()
+    if isinstance(o, datetime):
+        return o.isoformat()
+    # Fallbacks
+    if hasattr(o, '__float__'):
+        return float(o)
+    if hasattr(o, '__int__'):
+        return int(o)
+    if hasattr(o, '__dict__'):
+        return o.__dict__
+    return str(o)
+
+def to_native(value: Any) -> Any:
+    """
+    Recursively convert a result structure to built-in Python types
+    
+    Args:
+        value: Nested dicts/lists possibly containing NumPy values
+        
+    Returns:
+        Equivalent structure made of dict, list, str, int, float, bool and
+        None, with NaN and infinity converted to None (as orjson encodes them)
+    """
+    if isinstance(value, dict):
+        return {k: to_native(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_native(v) for v in value]
+    if isinstance(value, float):
+        return float(value) if math.isfinite(value) else None
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    return to_native(_encode_default(value))
+
+def serialize_results(results: Dict, output_format: str = 'json') -> bytes:
+    """
+    Serialize analysis results for the backend
+    
+    JSON uses orjson when installed (native NumPy support) and the standard
+    library otherwise. msgpack is an optional compact binary alternative.
+    All paths decode to the same data: NaN and infinity are encoded as
+    null, and float32 values with their shortest float32 representation.
+    
+    Args:
+        results: Results dictionary
+        output_format: 'json' or 'msgpack'
+        
+    Returns:
+        Encoded results
+    """
+    if output_format == 'msgpack':
+        if not module_available('msgpack'):
+            raise ConfigurationError("msgpack output requires the msgpack package")
+        import msgpack
+        return msgpack.packb(to_native(results), use_bin_type=True)
+    
+    if output_format != 'json':
+        raise ConfigurationError(f"Unsupported output format: {output_format}")
+    
+    if module_available('orjson'):
+        import orjson
+        return orjson.dumps(
+            results,
+            default=_encode_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    
+    try:
+        return json.dumps(results, default=_encode_default, allow_nan=False).encode('utf-8')
+    except ValueError:
+        # Non-finite floats: json would write NaN/Infinity, which is not JSON
+        return json.dumps(to_native(results)).encode('utf-8')
+
+def create_output_video(frames: Iterable[np.ndarray], output_path: str, fps: int = 30):
+    """
+    Create output video from frames
+    
+    Frames are written as they are produced, so a generator keeps memory
+    use independent of video length (see video_writer.AnnotatedVideoWriter
+    for annotating while processing).
+    
+    Args:
+        frames: List or iterable of video frames
         output_path: Path to save video
         fps: Frames per second
     """
-    if not frames:
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
         raise ValueError("No frames provided")
     
-    height, width = frames[0].shape[:2]
+    height, width = first.shape[:2]
     
     # Define codec and create VideoWriter
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
     
     try:
+        out.write(first)
         for frame in frames:
             out.write(frame)
     finally:
         out.release()
 
-def extract_frames(video_path: str, interval: int = 30) -> List[np.ndarray]:
+def _decode_sampled(source: FrameSource, interval: int, buffers: Optional[List[np.ndarray]],
+                    free: Optional[threading.Semaphore] = None,
+                    stop: Optional[threading.Event] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """Decode every interval-th frame, cycling through buffers when given"""
+    frame_index = 0
+    slot = 0
+    # Skipped frames are only grabbed, never converted
+    while source.grab():
+        if frame_index % interval == 0:
+            if free is not None:
+                # Wait until the consumer has finished with the oldest buffer
+                while not free.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+            image = None
+            if buffers:
+                image = buffers[slot]
+                slot = (slot + 1) % len(buffers)
+            ret, frame = source.retrieve(image)
+            if not ret:
+                return
+            yield frame_index, frame
+        frame_index += 1
+
+def iter_frames(video_path: str, interval: int = 1, decode: Optional[DecodeOptions] = None,
+                pool_size: int = 0, prefetch: int = 0) -> Iterator[Tuple[int, float, np.ndarray]]:
     """
-    Extract frames from video at specified interval
+    Lazily decode frames from a video at a specified interval
+    
+    With pool_size, frames are decoded into a ring of preallocated buffers
+    instead of fresh arrays, so a yielded frame is only valid until the next
+    one is requested; copy it to keep it. With prefetch, a background thread
+    decodes up to that many frames ahead of the consumer (and the pool needs
+    prefetch + 2 buffers to never stall it).
     
     Args:
         video_path: Path to video file
-        interval: Frame interval (extract every nth frame)
+        interval: Frame interval (yield every nth frame)
+        decode: Decode options (backend, threads, reduced resolution, grayscale)
+        pool_size: Number of reused frame buffers (0 allocates every frame)
+        prefetch: Maximum number of frames decoded ahead in a background thread
         
-    Returns:
-        List of extracted frames
+    Yields:
+        Tuples of (frame index, timestamp in seconds, frame)
     """
-    cap = cv2.VideoCapture(video_path)
-    frames = []
-    frame_count = 0
+    interval = max(1, int(interval))
+    source = FrameSource(video_path, decode)
+    if not source.isOpened():
+        source.release()
+        raise VideoProcessingError(f"Cannot open video file: {video_path}")
+    
+    fps = source.get(cv2.CAP_PROP_FPS)
+    buffers = None
+    if pool_size > 0:
+        buffers = [np.empty(source.frame_shape(), dtype=np.uint8) for _ in range(pool_size)]
+    
+    def timestamp(frame_index: int) -> float:
+        return frame_index / fps if fps > 0 else 0.0
+    
+    if prefetch <= 0:
+        try:
+            for frame_index, frame in _decode_sampled(source, interval, buffers):
+                yield frame_index, timestamp(frame_index), frame
+        finally:
+            source.release()
+        return
+    
+    pending = queue.Queue(maxsize=prefetch)
+    free = threading.Semaphore(pool_size) if buffers else None
+    stop = threading.Event()
+    done = object()
     
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in _decode_sampled(source, interval, buffers, free, stop):
+                if not put(item):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+    
+    thread = threading.Thread(target=produce, name='frame-prefetch', daemon=True)
+    thread.start()
     try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            item = pending.get()
+            if item is done:
                 break
-            
-            if frame_count % interval == 0:
-                frames.append(frame.copy())
-            
-            frame_count += 1
+            if isinstance(item, Exception):
+                raise VideoProcessingError(f"Frame decoding failed: {str(item)}") from item
+            frame_index, frame = item
+            yield frame_index, timestamp(frame_index), frame
+            if free is not None:
+                free.release()
     finally:
-        cap.release()
+        stop.set()
+        thread.join()
+        source.release()
+
+def extract_frames(video_path: str, interval: int = 30,
+                   decode: Optional[DecodeOptions] = None) -> List[np.ndarray]:
+    """
+    Extract frames from video at specified interval
+    
+    Holds every extracted frame in memory; prefer iter_frames() for long
+    videos or small intervals.
     
-    return frames
+    Args:
+        video_path: Path to video file
+        interval: Frame interval (extract every nth frame)
+        decode: Decode options (backend, threads, reduced resolution, grayscale)
+        
+    Returns:
+        List of extracted frames
+    """
+    try:
+        return [frame for _, _, frame in iter_frames(video_path, interval, decode)]
+    except VideoProcessingError:
+        # Unreadable videos have no frames
+        return []
 
 def get_video_info(video_path: str) -> Dict:
     """
@@ -334,26 +1071,193 @@ def get_video_info(video_path: str) -> Dict:
         video_path: Path to video file
         
     Returns:
-        Dictionary with video information
+        Dictionary with video information (zeroed for unreadable files)
     """
-    cap = cv2.VideoCapture(video_path)
-    
     try:
-        info = {
-            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-            'fps': cap.get(cv2.CAP_PROP_FPS),
-            'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        return probe_video(video_path, open_capture=False)[1]
+    except VideoProcessingError:
+        return {
+            'width': 0,
+            'height': 0,
+            'fps': 0,
+            'frame_count': 0,
             'duration': 0,
+            'codec': '',
             'file_size': os.path.getsize(video_path) if os.path.exists(video_path) else 0
         }
+
+class SlotOverlay:
+    """
+    Prerendered slot outlines and labels for one slot layout and frame size
+    
+    The layout is rasterized once (label positions and text sizes included)
+    into a static mask and a label map recording which slot (or the label
+    color) drew each pixel last. Annotating a frame then builds a color layer
+    from the per-slot colors (only when they change) and copies it through
+    the mask with cv2.copyTo. Slots and labels are drawn with the default
+    LINE_8 (hard-edged) rasterization, so the result matches drawing the
+    slots one by one.
+    """
+    
+    def __init__(self, slots: List[Dict], frame_size: Tuple[int, int], font_scale: float = 0.6,
+                 text_thickness: int = 2, line_thickness: int = 2,
+                 coordinate_space: Optional[Tuple[int, int]] = None,
+                 static_labels: bool = False, default_label: str = '?'):
+        """
+        Prerender a slot layout
         
-        if info['fps'] > 0:
-            info['duration'] = info['frame_count'] / info['fps']
+        Args:
+            slots: List of parking slot configurations
+            frame_size: (width, height) of the frames to annotate
+            font_scale: Label font scale
+            text_thickness: Label stroke thickness
+            line_thickness: Slot rectangle thickness
+            coordinate_space: (width, height) the slot coordinates are given in,
+                scaled to frame_size (None uses coordinates as pixels)
+            static_labels: Labels are drawn in the label color passed to
+                render() instead of the slot color
+            default_label: Label of slots without a slot_number
+        """
+        width, height = frame_size
+        self.frame_size = frame_size
+        self.slot_ids = [slot.get('id') for slot in slots]
+        self.slot_index: Dict[Any, List[int]] = {}
+        for i, slot_id in enumerate(self.slot_ids):
+            self.slot_index.setdefault(slot_id, []).append(i)
+        self.label_positions: List[Tuple[int, int]] = []
         
-        return info
-    finally:
-        cap.release()
+        # Palette index of the last draw per pixel (-1 where nothing is drawn);
+        # the label color comes after the slot colors
+        label_code = len(slots)
+        label_map = np.full((height, width), -1, dtype=np.int32)
+        scratch = np.zeros((height, width), dtype=np.uint8)
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        margin = 2 * max(text_thickness, line_thickness) + 4
+        
+        for i, slot in enumerate(slots):
+            coords = slot['coordinates']
+            if coordinate_space:
+                space_width, space_height = coordinate_space
+                x = int(coords['x'] * width / space_width)
+                y = int(coords['y'] * height / space_height)
+                w = int(coords['width'] * width / space_width)
+                h = int(coords['height'] * height / space_height)
+            else:
+                x, y = int(coords['x']), int(coords['y'])
+                w, h = int(coords['width']), int(coords['height'])
+            
+            label = str(slot.get('slot_number', default_label))
+            (text_w, text_h), baseline = cv2.getTextSize(label, font, font_scale, text_thickness)
+            text_x = x + (w - text_w) // 2
+            text_y = y + (h + text_h) // 2
+            self.label_positions.append((text_x, text_y))
+            
+            # Only the neighbourhood of the slot can be touched by its drawing
+            top = max(0, min(y, text_y - text_h) - margin)
+            bottom = min(height, max(y + h, text_y + baseline) + margin)
+            left = max(0, min(x, text_x) - margin)
+            right = min(width, max(x + w, text_x + text_w) + margin)
+            if top >= bottom or left >= right:
+                continue
+            region = (slice(top, bottom), slice(left, right))
+            
+            cv2.rectangle(scratch, (x, y), (x + w, y + h), 255, line_thickness)
+            self._stamp(scratch[region], label_map[region], i)
+            cv2.putText(scratch, label, (text_x, text_y), font, font_scale, 255, text_thickness)
+            self._stamp(scratch[region], label_map[region], label_code if static_labels else i)
+        
+        self.mask = (label_map >= 0).astype(np.uint8) * 255
+        self._rows, self._cols = np.nonzero(self.mask)
+        self._codes = label_map[self._rows, self._cols]
+        self._color_layer = None
+    
+    @staticmethod
+    def _stamp(roi: np.ndarray, label_map: np.ndarray, code: int):
+        """Assign the pixels drawn into the scratch region to a palette index"""
+        label_map[roi > 0] = code
+        roi.fill(0)
+    
+    def states(self, occupancy: Optional[Dict], missing: int = 0) -> np.ndarray:
+        """
+        Convert an occupancy mapping into a per-slot state array
+        
+        Args:
+            occupancy: Mapping of slot id to occupied flag
+            missing: State of slots without an entry
+            
+        Returns:
+            Array with 0 (missing), 1 (free) or 2 (occupied) per slot
+        """
+        states = np.full(len(self.slot_ids), missing, dtype=np.intp)
+        if occupancy:
+            for slot_id, is_occupied in occupancy.items():
+                indices = self.slot_index.get(slot_id)
+                if indices is not None:
+                    states[indices] = 2 if is_occupied else 1
+        return states
+    
+    def render(self, frame: np.ndarray, slot_colors: np.ndarray,
+               label_color: Tuple[int, int, int] = (255, 255, 255)) -> np.ndarray:
+        """
+        Draw the slots onto a frame in place
+        
+        Args:
+            frame: BGR frame of the prerendered size
+            slot_colors: (n_slots, 3) array with the color of each slot
+            label_color: Color of static labels
+            
+        Returns:
+            The same frame
+        """
+        palette = np.vstack([np.asarray(slot_colors, dtype=np.uint8).reshape(-1, 3),
+                             np.array(label_color, dtype=np.uint8)])
+        
+        # The color layer only changes when the slot colors do
+        cached = self._color_layer
+        if cached is None or not np.array_equal(cached[0], palette):
+            layer = np.zeros(frame.shape, dtype=np.uint8)
+            layer[self._rows, self._cols] = palette[self._codes]
+            cached = self._color_layer = (palette, layer)
+        cv2.copyTo(cached[1], self.mask, frame)
+        return frame
+
+SLOT_OVERLAY_CACHE_SIZE = 4  # Each entry holds a full-frame color layer and mask
+GRID_RENDER_CACHE_SIZE = 8
+_slot_overlay_cache: 'OrderedDict[tuple, SlotOverlay]' = OrderedDict()
+_grid_layer_cache: 'OrderedDict[tuple, tuple]' = OrderedDict()
+# Overlays are shared by concurrent renders (e.g. the snapshot service)
+_overlay_cache_lock = threading.Lock()
+
+def _layout_key(slots: List[Dict]) -> tuple:
+    """Hashable description of everything a slot overlay depends on"""
+    return tuple(
+        (slot.get('id'), slot.get('slot_number'),
+         tuple(slot['coordinates'][k] for k in ('x', 'y', 'width', 'height')))
+        for slot in slots
+    )
+
+def get_slot_overlay(slots: List[Dict], frame_size: Tuple[int, int], **style) -> SlotOverlay:
+    """
+    Get the prerendered overlay for a slot layout, building it on first use
+    
+    Args:
+        slots: List of parking slot configurations
+        frame_size: (width, height) of the frames to annotate
+        **style: SlotOverlay drawing options
+        
+    Returns:
+        Cached SlotOverlay
+    """
+    key = (_layout_key(slots), tuple(frame_size), tuple(sorted(style.items())))
+    with _overlay_cache_lock:
+        overlay = _slot_overlay_cache.get(key)
+        if overlay is None:
+            overlay = _slot_overlay_cache[key] = SlotOverlay(slots, frame_size, **style)
+            while len(_slot_overlay_cache) > SLOT_OVERLAY_CACHE_SIZE:
+                _slot_overlay_cache.popitem(last=False)
+        else:
+            _slot_overlay_cache.move_to_end(key)
+    return overlay
 
 def create_parking_grid_visualization(slot_config: List[Dict], 
                                     detections: Optional[List[Dict]] = None,
@@ -370,62 +1274,79 @@ def create_parking_grid_visualization(slot_config: List[Dict],
         Visualization image
     """
     width, height = grid_size
-    vis_image = np.zeros((height, width, 3), dtype=np.uint8)
-    vis_image.fill(50)  # Dark gray background
+    overlay, legend, rendered = _grid_layers(slot_config, grid_size)
     
     # Create detection lookup
-    detection_lookup = {}
+    occupancy = {}
     if detections:
         for det in detections:
             slot_id = det.get('slot_id') or det.get('region_id')
             if slot_id:
-                detection_lookup[slot_id] = det
+                occupancy[slot_id] = det.get('is_occupied', False)
     
-    # Draw slots
-    for slot in slot_config:
-        coords = slot['coordinates']
-        slot_id = slot['id']
-        slot_number = slot.get('slot_number', slot_id)
-        
-        # Scale coordinates to fit visualization
-        x = int(coords['x'] * width / 1000)  # Assume original coordinates are in 1000x1000 space
-        y = int(coords['y'] * height / 1000)
-        w = int(coords['width'] * width / 1000)
-        h = int(coords['height'] * height / 1000)
-        
-        # Determine color based on occupancy
-        if slot_id in detection_lookup:
-            is_occupied = detection_lookup[slot_id].get('is_occupied', False)
-            color = (0, 0, 255) if is_occupied else (0, 255, 0)  # Red if occupied, green if free
-        else:
-            color = (128, 128, 128)  # Gray if unknown
+    states = overlay.states(occupancy)
+    
+    # With a fixed background the image depends only on the slot states
+    state_key = states.tobytes()
+    with _overlay_cache_lock:
+        vis_image = rendered.get(state_key)
+        if vis_image is not None:
+            rendered.move_to_end(state_key)
+    
+    if vis_image is None:
+        vis_image = np.zeros((height, width, 3), dtype=np.uint8)
+        vis_image.fill(50)  # Dark gray background
         
-        # Draw slot rectangle
-        cv2.rectangle(vis_image, (x, y), (x + w, y + h), color, 2)
+        # Gray if unknown, green if free, red if occupied; labels in white
+        palette = np.array([(128, 128, 128), (0, 255, 0), (0, 0, 255)], dtype=np.uint8)
+        overlay.render(vis_image, palette[states], label_color=(255, 255, 255))
         
-        # Draw slot number
-        text_size = cv2.getTextSize(str(slot_number), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-        text_x = x + (w - text_size[0]) // 2
-        text_y = y + (h + text_size[1]) // 2
+        # Add legend (drawn over the slots)
+        layer, mask = legend
+        cv2.copyTo(layer, mask, vis_image)
         
-        cv2.putText(vis_image, str(slot_number), (text_x, text_y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    
-    # Add legend
-    legend_y = height - 60
-    cv2.rectangle(vis_image, (10, legend_y), (30, legend_y + 20), (0, 255, 0), -1)
-    cv2.putText(vis_image, "Available", (40, legend_y + 15), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        with _overlay_cache_lock:
+            rendered[state_key] = vis_image
+            while len(rendered) > GRID_RENDER_CACHE_SIZE:
+                rendered.popitem(last=False)
     
-    cv2.rectangle(vis_image, (150, legend_y), (170, legend_y + 20), (0, 0, 255), -1)
-    cv2.putText(vis_image, "Occupied", (180, legend_y + 15), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    
-    cv2.rectangle(vis_image, (280, legend_y), (300, legend_y + 20), (128, 128, 128), -1)
-    cv2.putText(vis_image, "Unknown", (310, legend_y + 15), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return vis_image.copy()
+
+def _grid_layers(slot_config: List[Dict], grid_size: Tuple[int, int]) -> tuple:
+    """
+    Prerendered layers of a parking grid
     
-    return vis_image
+    Returns:
+        Tuple of (slot overlay, legend as (color layer, mask), rendered
+        images by slot states)
+    """
+    key = (_layout_key(slot_config), tuple(grid_size))
+    with _overlay_cache_lock:
+        cached = _grid_layer_cache.get(key)
+        if cached is not None:
+            _grid_layer_cache.move_to_end(key)
+            return cached
+        
+        # Assume original coordinates are in 1000x1000 space
+        overlay = SlotOverlay(slot_config, grid_size, font_scale=0.5, text_thickness=1,
+                              coordinate_space=(1000, 1000), static_labels=True)
+        
+        width, height = grid_size
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        legend_y = height - 60
+        for x, color, text in ((10, (0, 255, 0), "Available"), (150, (0, 0, 255), "Occupied"),
+                               (280, (128, 128, 128), "Unknown")):
+            for image, ink, text_ink in ((layer, color, (255, 255, 255)), (mask, 255, 255)):
+                cv2.rectangle(image, (x, legend_y), (x + 20, legend_y + 20), ink, -1)
+                cv2.putText(image, text, (x + 30, legend_y + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                            text_ink, 1)
+        mask[mask > 0] = 255
+        
+        cached = _grid_layer_cache[key] = (overlay, (layer, mask), OrderedDict())
+        while len(_grid_layer_cache) > SLOT_OVERLAY_CACHE_SIZE:
+            _grid_layer_cache.popitem(last=False)
+        return cached
 
 def benchmark_processing_time(func, *args, **kwargs) -> Tuple[Any, float]:
     """
@@ -441,9 +1362,9 @@ def benchmark_processing_time(func, *args, **kwargs) -> Tuple[Any, float]:
     """
     import time
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     result = func(*args, **kwargs)
-    end_time = time.time()
+    end_time = time.perf_counter()
     
     execution_time = end_time - start_time
     return result, execution_time
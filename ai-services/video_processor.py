@@ -4,34 +4,138 @@ AI Parking System - Video Processor
 Processes parking lot videos to detect vehicle occupancy using YOLO
 """
 
-import cv2
-import numpy as np
+from __future__ import annotations
+
 import json
 import argparse
 import sys
 import os
+import threading
 from pathlib import Path
+from array import array
+from collections import OrderedDict
 from datetime import datetime
 import time
 from typing import List, Dict, Tuple, Optional
 
 # Import custom modules
-from parking_detector import ParkingDetector
-from utils import setup_logging, validate_video_file, parse_slot_config
+from parking_detector import ParkingDetector, DEFAULT_INPUT_SIZE
+from detection_cache import DetectionCache, FrameDetections, video_content_hash
+from video_writer import AnnotatedVideoWriter
+from profiling import StageProfiler, ProfileRun, MetricsServer, MemoryMonitor, PROFILE_MODES
+from utils import (setup_logging, probe_video, parse_slot_config, lazy_import,
+                   detections_to_records, save_detection_log, serialize_results,
+                   parse_camera_config, iter_frames, DecodeOptions, FrameSource, DECODE_BACKENDS,
+                   VideoProcessingError)
+
+# OpenCV/NumPy are only needed once a video is actually processed
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
 # Setup logging
 logger = setup_logging(__name__)
 
+# Frames decoded ahead per camera in multi-camera runs
+CAMERA_PREFETCH = 2
+
+class SlotTimeline:
+    """
+    Occupancy samples of one parking slot over a video
+    
+    Running totals for the duration analysis are always kept; the samples
+    themselves are kept as dictionaries ('normal'), packed into typed
+    arrays ('compact', 9 bytes per sample) or dropped ('streaming').
+    Every mode yields the same duration analysis.
+    """
+    
+    def __init__(self, mode: str = 'normal'):
+        self.mode = 'normal'
+        self.entries: Optional[List[Dict]] = []
+        self._packed = None
+        self.count = 0
+        self.occupied_count = 0
+        self.changes = 0
+        self.confidence_sum = 0.0
+        self._last_status = None
+        self.compact(mode)
+    
+    def append(self, frame: int, is_occupied: bool, confidence: float):
+        """Record one sample"""
+        if self.count and is_occupied != self._last_status:
+            self.changes += 1
+        self._last_status = is_occupied
+        self.count += 1
+        self.occupied_count += bool(is_occupied)
+        self.confidence_sum += confidence
+        
+        if self.mode == 'normal':
+            self.entries.append({'frame': frame, 'is_occupied': is_occupied, 'confidence': confidence})
+        elif self.mode == 'compact':
+            frames, occupied, confidences = self._packed
+            frames.append(frame)
+            occupied.append(bool(is_occupied))
+            confidences.append(confidence)
+    
+    def compact(self, mode: str):
+        """Switch to a smaller representation ('compact' or 'streaming'); never grows back"""
+        if mode == 'compact' and self.mode == 'normal':
+            self._packed = (array('i', (e['frame'] for e in self.entries)),
+                            array('b', (e['is_occupied'] for e in self.entries)),
+                            array('f', (e['confidence'] for e in self.entries)))
+            self.entries = None
+            self.mode = mode
+        elif mode == 'streaming' and self.mode != 'streaming':
+            self.entries = None
+            self._packed = None
+            self.mode = mode
+    
+    def samples(self) -> List[Dict]:
+        """Retained samples as dictionaries (empty in streaming mode)"""
+        if self.mode == 'normal':
+            return list(self.entries)
+        if self.mode == 'compact':
+            return [{'frame': frame, 'is_occupied': bool(occupied), 'confidence': confidence}
+                    for frame, occupied, confidence in zip(*self._packed)]
+        return []
+
 class VideoProcessor:
     """Main video processing class for parking lot analysis"""
     
-    def __init__(self, model_path: Optional[str] = None):
-        """Initialize video processor with YOLO model"""
-        self.detector = ParkingDetector(model_path)
+    def __init__(self, model_path: Optional[str] = None, device: Optional[str] = None,
+                 input_size: int = DEFAULT_INPUT_SIZE, warmup: bool = False,
+                 detection_cache: Optional[DetectionCache] = None,
+                 decode: Optional[DecodeOptions] = None,
+                 profiler: Optional[StageProfiler] = None,
+                 memory: Optional[MemoryMonitor] = None):
+        """Initialize video processor with a shared, optionally warmed-up YOLO model"""
+        # Per-stage timings, reported in processing_stats['stages']
+        self.profiler = profiler or StageProfiler()
+        # Peak RSS and memory budget, reported in processing_stats['memory']
+        self.memory = memory or MemoryMonitor()
+        self.aggregation = 'normal'
+        # Per-slot SlotTimeline of the last duration pass
+        self.slot_timelines: Dict = {}
+        if decode is not None and decode.reduced:
+            # Slot coordinates and detections refer to full-size color frames
+            raise ValueError("Video processing needs full-size color frames; "
+                             "max_width/grayscale decoding is not supported here")
+        self.decode = decode
+        self.detector = ParkingDetector(model_path, device=device, input_size=input_size,
+                                        warmup=warmup, profiler=self.profiler)
+        self.detection_cache = detection_cache
+        self._frame_detections = FrameDetections()
+        self._video_writer: Optional[AnnotatedVideoWriter] = None
+        # Per-frame slot timings, recorded once per frame instead of per slot
+        self._slot_stage_ns = {'slot_association': 0, 'image_analysis': 0}
+        # Guards adding keys to processing_stats against concurrent metrics scrapes
+        self._stats_lock = threading.Lock()
         self.processing_stats = {
             'total_frames': 0,
             'processed_frames': 0,
+            'cached_frames': 0,
+            'inference_batches': 0,
             'detection_time': 0,
+            'peak_rss_mb': 0,
             'start_time': None,
             'end_time': None
         }
@@ -40,7 +144,9 @@ class VideoProcessor:
                      video_path: str, 
                      slot_config: List[Dict], 
                      analysis_type: str = 'full',
-                     output_format: str = 'json') -> Dict:
+                     output_format: str = 'json',
+                     output_video: Optional[str] = None,
+                     overlay: bool = True) -> Dict:
         """
         Process video file to detect parking slot occupancy
         
@@ -49,6 +155,8 @@ class VideoProcessor:
             slot_config: List of parking slot configurations
             analysis_type: Type of analysis ('occupancy', 'duration', 'full')
             output_format: Output format ('json', 'csv')
+            output_video: Optional path to stream an annotated copy of the video to
+            overlay: Draw slots and detections on the output video
             
         Returns:
             Dictionary containing analysis results
@@ -58,20 +166,18 @@ class VideoProcessor:
         logger.info(f"Slot configuration: {len(slot_config)} slots")
         
         # Validate inputs
-        if not validate_video_file(video_path):
-            raise ValueError(f"Invalid video file: {video_path}")
-            
         if not slot_config:
             raise ValueError("Slot configuration is required")
         
-        # Initialize video capture
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Cannot open video file: {video_path}")
+        # Validate and open the video in one go (cached per file for retries)
+        try:
+            cap, video_info = probe_video(video_path, decode=self.decode)
+        except VideoProcessingError as e:
+            raise ValueError(f"Invalid video file: {video_path} ({str(e)})")
         
         # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = int(video_info['fps'])
+        total_frames = video_info['frame_count']
         duration = total_frames / fps if fps > 0 else 0
         
         logger.info(f"Video properties: {total_frames} frames, {fps} FPS, {duration:.1f}s duration")
@@ -79,18 +185,30 @@ class VideoProcessor:
         # Initialize processing
         self.processing_stats['total_frames'] = total_frames
         self.processing_stats['start_time'] = time.time()
+        cache_key = self._load_cached_detections(video_path)
+        self._start_memory_accounting()
+        if output_video:
+            self._video_writer = AnnotatedVideoWriter(output_video, fps, slots=slot_config,
+                                                      overlay=overlay)
         
         # Process video based on analysis type
-        if analysis_type == 'occupancy':
-            results = self._process_occupancy_analysis(cap, slot_config)
-        elif analysis_type == 'duration':
-            results = self._process_duration_analysis(cap, slot_config)
-        else:  # full analysis
-            results = self._process_full_analysis(cap, slot_config)
+        try:
+            if analysis_type == 'occupancy':
+                results = self._process_occupancy_analysis(cap, slot_config)
+            elif analysis_type == 'duration':
+                results = self._process_duration_analysis(cap, slot_config)
+            else:  # full analysis
+                results = self._process_full_analysis(cap, slot_config)
+        finally:
+            self._close_video_writer()
+            self.memory.stop()
         
         # Cleanup
         cap.release()
+        if cache_key:
+            self.detection_cache.store(cache_key, self._frame_detections)
         self.processing_stats['end_time'] = time.time()
+        self._update_stage_stats()
         
         # Compile final results
         final_results = {
@@ -115,7 +233,302 @@ class VideoProcessor:
         
         return final_results
     
-    def _process_occupancy_analysis(self, cap: cv2.VideoCapture, slot_config: List[Dict]) -> Dict:
+    def process_cameras(self, cameras: List[Dict], sample_interval: float = 1.0) -> Dict:
+        """
+        Process the videos of several cameras covering one lot in a single run
+        
+        Sources are decoded concurrently (one prefetch thread per camera) and
+        advanced in lockstep: each step takes the next sampled frame of every
+        camera and runs them through one batched inference call. Per-slot
+        results are fused across cameras and samples by confidence, so a
+        slot visible in two views takes the state of the more confident view.
+        
+        Args:
+            cameras: List of camera dictionaries with video_path, slot_config
+                (in that camera's pixel coordinates) and optional camera_id;
+                slots sharing an id across cameras are the same physical slot
+            sample_interval: Seconds of video between analyzed frames
+            
+        Returns:
+            Dictionary containing lot-level analysis results
+        """
+        if not cameras:
+            raise ValueError("At least one camera is required")
+        
+        logger.info(f"Starting multi-camera processing: {len(cameras)} cameras")
+        self.processing_stats['start_time'] = time.time()
+        
+        sources = []
+        for index, camera in enumerate(cameras):
+            camera_id = camera.get('camera_id', index)
+            if not camera.get('slot_config'):
+                raise ValueError(f"Slot configuration is required for camera {camera_id}")
+            try:
+                video_info = probe_video(camera['video_path'], open_capture=False)[1]
+            except VideoProcessingError as e:
+                raise ValueError(f"Invalid video file for camera {camera_id}: {str(e)}")
+            
+            cache_key, frame_detections = self._open_cached_detections(camera['video_path'])
+            fps = video_info['fps']
+            sources.append({
+                'camera_id': camera_id,
+                'video_path': camera['video_path'],
+                'slots': camera['slot_config'],
+                'info': video_info,
+                'frame_interval': max(1, round(fps * sample_interval)) if fps > 0 else 1,
+                'cache_key': cache_key,
+                'frame_detections': frame_detections,
+                'processed_frames': 0
+            })
+        
+        # Physical slots in order of first appearance, with the cameras that cover them
+        lot_slots = OrderedDict()
+        for source in sources:
+            for slot in source['slots']:
+                entry = lot_slots.setdefault(slot['id'], {'slot': slot, 'cameras': []})
+                entry['cameras'].append(source['camera_id'])
+        
+        self.processing_stats['total_frames'] = sum(s['info']['frame_count'] for s in sources)
+        best_results = {}
+        
+        self._start_memory_accounting()
+        streams = [iter_frames(s['video_path'], s['frame_interval'], self.decode,
+                               prefetch=CAMERA_PREFETCH) for s in sources]
+        try:
+            active = list(zip(sources, streams))
+            while active:
+                self._check_memory()
+                # Next sampled frame of every camera that has frames left
+                step = []
+                remaining = []
+                for source, stream in active:
+                    # With prefetching this is the time spent waiting on the decoder
+                    with self.profiler.stage('decode'):
+                        item = next(stream, None)
+                    if item is not None:
+                        step.append((source, item[0], item[2]))
+                        remaining.append((source, stream))
+                active = remaining
+                
+                for (source, frame_index, frame), detections in zip(step, self._detect_step(step)):
+                    for slot in source['slots']:
+                        result = self._analyze_slot_occupancy(frame, slot, detections)
+                        result['camera_id'] = source['camera_id']
+                        best = best_results.get(slot['id'])
+                        if best is None or result['confidence'] > best['confidence']:
+                            best_results[slot['id']] = result
+                    self._record_slot_stages()
+                    source['processed_frames'] += 1
+                    self.processing_stats['processed_frames'] += 1
+            self.memory.checkpoint('cameras')
+        finally:
+            for stream in streams:
+                stream.close()
+            self.memory.stop()
+        
+        for source in sources:
+            if source['cache_key']:
+                self.detection_cache.store(source['cache_key'], source['frame_detections'])
+        self.processing_stats['end_time'] = time.time()
+        self._update_stage_stats()
+        
+        slot_detections = []
+        for slot_id, entry in lot_slots.items():
+            result = best_results.get(slot_id) or {
+                'slot_id': slot_id,
+                'slot_number': entry['slot']['slot_number'],
+                'is_occupied': False,
+                'confidence': 0.0,
+                'vehicle_type': None,
+                'detection_box': None,
+                'camera_id': None
+            }
+            slot_detections.append(dict(result, views=entry['cameras']))
+        
+        occupied_slots = sum(1 for slot in slot_detections if slot['is_occupied'])
+        occupancy_rate = (occupied_slots / len(slot_detections)) * 100 if slot_detections else 0
+        confidences = [slot['confidence'] for slot in slot_detections]
+        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+        
+        final_results = {
+            'cameras': [{
+                'camera_id': s['camera_id'],
+                'video_filename': os.path.basename(s['video_path']),
+                'total_frames': s['info']['frame_count'],
+                'processed_frames': s['processed_frames'],
+                'fps': s['info']['fps'],
+                'duration': s['info']['duration'],
+                'slots': len(s['slots'])
+            } for s in sources],
+            'processing_time': self.processing_stats['end_time'] - self.processing_stats['start_time'],
+            'total_frames': self.processing_stats['total_frames'],
+            'processed_frames': self.processing_stats['processed_frames'],
+            'analysis_type': 'multi_camera',
+            'timestamp': datetime.now().isoformat(),
+            'slot_detections': slot_detections,
+            'vehicle_count': occupied_slots,
+            'occupancy_rate': occupancy_rate,
+            'confidence_scores': {
+                'overall': avg_confidence,
+                'vehicle_detection': avg_confidence,
+                'slot_classification': avg_confidence
+            },
+            'processing_stats': self.processing_stats
+        }
+        
+        logger.info(f"Multi-camera processing completed: {final_results['processing_time']:.2f}s")
+        logger.info(f"Occupancy rate: {occupancy_rate:.1f}% of {len(slot_detections)} slots")
+        
+        return final_results
+    
+    def _detect_step(self, step: List[Tuple[Dict, int, np.ndarray]]) -> List[List[Dict]]:
+        """Detect vehicles in one frame per camera, batching frames missing from the cache"""
+        detections = [source['frame_detections'].get(frame_index) for source, frame_index, _ in step]
+        misses = [i for i, cached in enumerate(detections) if cached is None]
+        self.processing_stats['cached_frames'] += len(step) - len(misses)
+        
+        if misses:
+            batch = self.detector.detect_vehicles_batch([step[i][2] for i in misses],
+                                                        [step[i][0]['slots'] for i in misses])
+            self.processing_stats['inference_batches'] += 1
+            for i, frame_detections in zip(misses, batch):
+                detections[i] = frame_detections
+                if not self.detector.last_detection_fallback and self.aggregation != 'streaming':
+                    source, frame_index, _ = step[i]
+                    source['frame_detections'].put(frame_index, frame_detections)
+        
+        return detections
+    
+    def _load_cached_detections(self, video_path: str) -> Optional[str]:
+        """
+        Prepare per-frame detections for this run, reusing the on-disk cache when possible
+        
+        Detections are always shared between passes of one run (full analysis
+        visits the same frames twice); they are persisted only when a cache is
+        configured and a real model is loaded.
+        
+        Returns:
+            Cache key to store results under, or None if caching is disabled
+        """
+        cache_key, self._frame_detections = self._open_cached_detections(video_path)
+        return cache_key
+    
+    def _open_cached_detections(self, video_path: str) -> Tuple[Optional[str], FrameDetections]:
+        """Look up the cache key and cached detections of one video"""
+        model_identity = self.detector.get_model_identity()
+        if self.detection_cache is None or model_identity is None:
+            return None, FrameDetections()
+        
+        try:
+            cache_key = DetectionCache.make_key(
+                video_content_hash(video_path),
+                model_identity,
+                self.detector.input_size,
+                self.detector.confidence_threshold
+            )
+        except OSError as e:
+            logger.warning(f"Detection cache disabled for this run: {str(e)}")
+            return None, FrameDetections()
+        
+        return cache_key, self.detection_cache.load(cache_key, self.detector.vehicle_classes)
+    
+    def _update_stage_stats(self):
+        """Copy stage timings into processing_stats"""
+        stages = self.profiler.summary()
+        memory = self.memory.summary()
+        with self._stats_lock:
+            self.processing_stats['detection_time'] = self.profiler.total_seconds(
+                'preprocess', 'inference', 'postprocess')
+            self.processing_stats['stages'] = stages
+            self.processing_stats['memory'] = memory
+            self.processing_stats['peak_rss_mb'] = memory['peak_rss_mb'] or 0
+            self.processing_stats['aggregation'] = self.aggregation
+    
+    def metrics_gauges(self) -> Dict:
+        """Snapshot of processing_stats for the metrics endpoint (safe from other threads)"""
+        with self._stats_lock:
+            gauges = dict(self.processing_stats)
+        gauges['peak_rss_mb'] = self.memory.peak_rss_mb or 0
+        return gauges
+    
+    def _record_slot_stages(self):
+        """Record the slot timings accumulated over one frame"""
+        for name, duration_ns in self._slot_stage_ns.items():
+            if duration_ns:
+                self.profiler.record(name, duration_ns)
+                self._slot_stage_ns[name] = 0
+    
+    def _start_memory_accounting(self):
+        """Start memory sampling for a run with full-size per-run state"""
+        self.aggregation = 'normal'
+        self.slot_timelines = {}
+        self.memory.start()
+        self.memory.checkpoint('open')
+    
+    def _check_memory(self):
+        """
+        Shrink per-run state once the memory monitor escalates
+        
+        Slot timelines are packed ('compact') or reduced to running totals
+        ('streaming'). In streaming mode newly inferred frames are no longer
+        recorded; detections already held (loaded from the cache or
+        recorded earlier in the run) are kept, so they still save inference.
+        """
+        level = self.memory.level
+        if level == self.aggregation:
+            return
+        self.aggregation = level
+        for timeline in self.slot_timelines.values():
+            timeline.compact(level)
+        
+        if level == 'streaming':
+            logger.warning("No longer recording per-frame detections to stay within the memory budget")
+    
+    def _detect_vehicles(self, frame_index: int, frame: np.ndarray,
+                         slot_config: List[Dict]) -> List[Dict]:
+        """Detect vehicles in a frame, skipping inference for frames already detected"""
+        detections = self._frame_detections.get(frame_index)
+        if detections is not None:
+            self.processing_stats['cached_frames'] += 1
+            return detections
+        
+        detections = self.detector.detect_vehicles(frame, slot_config)
+        if not self.detector.last_detection_fallback and self.aggregation != 'streaming':
+            self._frame_detections.put(frame_index, detections)
+        return detections
+    
+    def _write_annotated_frame(self, frame: np.ndarray, detections: Optional[List[Dict]],
+                               occupancy: Optional[Dict]):
+        """Stream a frame to the annotated output video, if one is being written"""
+        if self._video_writer is not None:
+            self._video_writer.write(frame, detections, occupancy)
+    
+    def _close_video_writer(self):
+        """Finish the annotated output video (later passes over the video are not written)"""
+        if self._video_writer is not None:
+            writer, self._video_writer = self._video_writer, None
+            writer.close()
+    
+    def save_detection_log(self, output_path: str, video_path: Optional[str] = None):
+        """
+        Save the per-frame detections of the last run as a binary detection log
+        
+        Args:
+            output_path: Path to save the log
+            video_path: Optional source video recorded in the log metadata
+        """
+        records = detections_to_records(self._frame_detections.frames)
+        save_detection_log(records, output_path, metadata={
+            'video_filename': os.path.basename(video_path) if video_path else None,
+            'model': self.detector.get_model_identity() or 'mock',
+            'input_size': self.detector.input_size,
+            'confidence_threshold': self.detector.confidence_threshold,
+            'class_names': {str(k): v for k, v in self.detector.vehicle_classes.items()},
+            'frames': len(self._frame_detections)
+        })
+        logger.info(f"Detection log saved: {output_path} ({len(records)} detections)")
+    
+    def _process_occupancy_analysis(self, cap: FrameSource, slot_config: List[Dict]) -> Dict:
         """Process video for occupancy detection only"""
         logger.info("Processing occupancy analysis...")
         
@@ -125,21 +538,29 @@ class VideoProcessor:
         vehicle_count = 0
         confidence_scores = []
         
+        # Latest sampled state, drawn on every frame of the annotated output
+        detections = None
+        occupancy = None
+        
         frame_count = 0
         while True:
-            ret, frame = cap.read()
+            with self.profiler.stage('decode'):
+                ret, frame = cap.read()
             if not ret:
                 break
                 
             if frame_count % frame_interval == 0:
+                self._check_memory()
                 # Detect vehicles in current frame
-                detections = self.detector.detect_vehicles(frame)
+                detections = self._detect_vehicles(frame_count, frame, slot_config)
+                occupancy = {}
                 
                 # Analyze each parking slot
                 for slot in slot_config:
                     slot_result = self._analyze_slot_occupancy(
                         frame, slot, detections
                     )
+                    occupancy[slot['id']] = slot_result['is_occupied']
                     
                     # Check if this slot already has a detection
                     existing_slot = next(
@@ -154,9 +575,12 @@ class VideoProcessor:
                     else:
                         slot_detections.append(slot_result)
                 
+                self._record_slot_stages()
                 self.processing_stats['processed_frames'] += 1
-                
+            
+            self._write_annotated_frame(frame, detections, occupancy)
             frame_count += 1
+        self.memory.checkpoint('occupancy')
         
         # Calculate final statistics
         occupied_slots = sum(1 for slot in slot_detections if slot['is_occupied'])
@@ -177,39 +601,45 @@ class VideoProcessor:
             }
         }
     
-    def _process_duration_analysis(self, cap: cv2.VideoCapture, slot_config: List[Dict]) -> Dict:
+    def _process_duration_analysis(self, cap: FrameSource, slot_config: List[Dict]) -> Dict:
         """Process video for duration prediction analysis"""
         logger.info("Processing duration analysis...")
         
         # Track slot occupancy over time
-        slot_timeline = {slot['id']: [] for slot in slot_config}
+        self.slot_timelines = {slot['id']: SlotTimeline(self.aggregation) for slot in slot_config}
         frame_interval = 15  # Process every 15 frames
+        detections = None
+        occupancy = None
         
         frame_count = 0
         while True:
-            ret, frame = cap.read()
+            with self.profiler.stage('decode'):
+                ret, frame = cap.read()
             if not ret:
                 break
                 
             if frame_count % frame_interval == 0:
-                detections = self.detector.detect_vehicles(frame)
+                self._check_memory()
+                detections = self._detect_vehicles(frame_count, frame, slot_config)
+                occupancy = {}
                 
                 for slot in slot_config:
                     slot_result = self._analyze_slot_occupancy(frame, slot, detections)
-                    slot_timeline[slot['id']].append({
-                        'frame': frame_count,
-                        'is_occupied': slot_result['is_occupied'],
-                        'confidence': slot_result['confidence']
-                    })
+                    occupancy[slot['id']] = slot_result['is_occupied']
+                    self.slot_timelines[slot['id']].append(
+                        frame_count, slot_result['is_occupied'], slot_result['confidence'])
                 
+                self._record_slot_stages()
                 self.processing_stats['processed_frames'] += 1
-                
+            
+            self._write_annotated_frame(frame, detections, occupancy)
             frame_count += 1
+        self.memory.checkpoint('duration')
         
         # Analyze duration patterns
         slot_detections = []
         for slot in slot_config:
-            duration_analysis = self._analyze_slot_duration(slot_timeline[slot['id']])
+            duration_analysis = self._analyze_slot_duration(self.slot_timelines[slot['id']])
             slot_detections.append({
                 'slot_id': slot['id'],
                 'slot_number': slot['slot_number'],
@@ -234,12 +664,13 @@ class VideoProcessor:
             }
         }
     
-    def _process_full_analysis(self, cap: cv2.VideoCapture, slot_config: List[Dict]) -> Dict:
+    def _process_full_analysis(self, cap: FrameSource, slot_config: List[Dict]) -> Dict:
         """Process video for comprehensive analysis"""
         logger.info("Processing full analysis...")
         
         # Combine occupancy and duration analysis
         occupancy_results = self._process_occupancy_analysis(cap, slot_config)
+        self._close_video_writer()
         
         # Reset video capture for duration analysis
         cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
@@ -278,7 +709,13 @@ class VideoProcessor:
         }
     
     def _analyze_slot_occupancy(self, frame: np.ndarray, slot: Dict, detections: List) -> Dict:
-        """Analyze occupancy for a single parking slot"""
+        """
+        Analyze occupancy for a single parking slot
+        
+        Stage timings are accumulated; callers record them once per frame
+        with _record_slot_stages().
+        """
+        timed = self.profiler.enabled
         slot_coords = slot['coordinates']
         
         # Extract slot region
@@ -291,6 +728,7 @@ class VideoProcessor:
         vehicle_type = None
         detection_box = None
         
+        start = time.perf_counter_ns() if timed else 0
         for detection in detections:
             det_x, det_y, det_w, det_h = detection['bbox']
             det_confidence = detection['confidence']
@@ -307,10 +745,15 @@ class VideoProcessor:
                 best_confidence = det_confidence
                 vehicle_type = detection.get('class', 'vehicle')
                 detection_box = detection['bbox']
+        if timed:
+            self._slot_stage_ns['slot_association'] += time.perf_counter_ns() - start
         
         # If no vehicle detection, use image analysis
         if not is_occupied:
+            start = time.perf_counter_ns() if timed else 0
             occupancy_score = self._analyze_slot_image(slot_region)
+            if timed:
+                self._slot_stage_ns['image_analysis'] += time.perf_counter_ns() - start
             is_occupied = occupancy_score > 0.6
             best_confidence = occupancy_score
         
@@ -323,9 +766,9 @@ class VideoProcessor:
             'detection_box': detection_box
         }
     
-    def _analyze_slot_duration(self, timeline: List[Dict]) -> Dict:
+    def _analyze_slot_duration(self, timeline: SlotTimeline) -> Dict:
         """Analyze slot occupancy timeline to predict duration"""
-        if not timeline:
+        if not timeline.count:
             return {
                 'final_status': False,
                 'confidence': 0.5,
@@ -334,21 +777,14 @@ class VideoProcessor:
                 'stability': 0.0
             }
         
-        # Count occupancy changes
-        changes = 0
-        prev_status = timeline[0]['is_occupied']
-        
-        for entry in timeline[1:]:
-            if entry['is_occupied'] != prev_status:
-                changes += 1
-                prev_status = entry['is_occupied']
+        # Occupancy changes are counted as samples are added
+        changes = timeline.changes
         
         # Calculate stability (fewer changes = more stable)
-        stability = max(0, 1 - (changes / len(timeline)))
+        stability = max(0, 1 - (changes / timeline.count))
         
         # Determine final status (majority vote)
-        occupied_count = sum(1 for entry in timeline if entry['is_occupied'])
-        final_status = occupied_count > len(timeline) / 2
+        final_status = timeline.occupied_count > timeline.count / 2
         
         # Predict duration based on patterns
         if final_status:
@@ -362,7 +798,7 @@ class VideoProcessor:
             predicted_duration = 0
         
         # Calculate average confidence
-        avg_confidence = sum(entry['confidence'] for entry in timeline) / len(timeline)
+        avg_confidence = timeline.confidence_sum / timeline.count
         
         return {
             'final_status': final_status,
@@ -419,61 +855,124 @@ class VideoProcessor:
             (1 - mean_intensity / 255) * 0.3
         )
         
-        return min(occupancy_score, 1.0)
+        # Plain float so downstream results never carry NumPy scalars
+        return float(min(occupancy_score, 1.0))
 
 def main():
     """Main function for command line usage"""
     parser = argparse.ArgumentParser(description='AI Parking System Video Processor')
-    parser.add_argument('--video_path', required=True, help='Path to video file')
-    parser.add_argument('--slot_config', required=True, help='JSON string of slot configuration')
+    parser.add_argument('--video_path', help='Path to video file')
+    parser.add_argument('--slot_config', help='JSON string of slot configuration')
+    parser.add_argument('--cameras',
+                       help='JSON list of cameras ({camera_id, video_path, slot_config}) '
+                            'covering one lot; replaces --video_path/--slot_config')
+    parser.add_argument('--sample_interval', type=float, default=1.0,
+                       help='Seconds between analyzed frames per camera in multi-camera runs')
     parser.add_argument('--analysis_type', default='full', choices=['occupancy', 'duration', 'full'],
                        help='Type of analysis to perform')
-    parser.add_argument('--output_format', default='json', choices=['json', 'csv'],
+    parser.add_argument('--output_format', default='json', choices=['json', 'msgpack', 'csv'],
                        help='Output format')
     parser.add_argument('--model_path', help='Path to custom YOLO model')
+    parser.add_argument('--device', help='Inference device (e.g. cpu, cuda:0), auto if omitted')
+    parser.add_argument('--input_size', type=int, default=DEFAULT_INPUT_SIZE,
+                       help='Model input resolution')
+    parser.add_argument('--warmup', action='store_true',
+                       help='Run dummy inferences before processing the first frame')
+    parser.add_argument('--decode_backend', default='auto', choices=list(DECODE_BACKENDS),
+                       help='Video capture backend')
+    parser.add_argument('--decode_threads', type=int,
+                       help='Decoder threads (0 for all cores, backend default if omitted)')
+    parser.add_argument('--hw_decode', action='store_true',
+                       help='Use hardware video decoding when available')
     parser.add_argument('--parking_lot_id', type=int, help='Parking lot ID')
+    parser.add_argument('--cache_dir', default=os.getenv('DETECTION_CACHE_DIR'),
+                       help='Directory for the per-frame detection cache (disabled if omitted)')
+    parser.add_argument('--cache_max_mb', type=float,
+                       default=float(os.getenv('DETECTION_CACHE_MAX_MB', 512)),
+                       help='Detection cache size budget in megabytes')
+    parser.add_argument('--output_video',
+                       help='Optional path to stream an annotated copy of the video to')
+    parser.add_argument('--no_overlay', action='store_true',
+                       help='Write the output video without slot/detection annotations')
+    parser.add_argument('--profile', choices=list(PROFILE_MODES),
+                       help='Profile the run with cProfile or the sampling profiler')
+    parser.add_argument('--profile_output',
+                       help='Path to write the profiler report to (stderr if omitted)')
+    parser.add_argument('--metrics_port', type=int,
+                       help='Serve stage metrics in Prometheus text format on this port while processing')
+    parser.add_argument('--memory_budget_mb', type=float,
+                       default=float(os.getenv('MEMORY_BUDGET_MB', 0)) or None,
+                       help='RSS budget in megabytes; long videos switch to compact and then '
+                            'streaming aggregation as it is approached (no limit if omitted)')
+    parser.add_argument('--trace_memory', action='store_true',
+                       help='Report tracemalloc allocation sites at stage boundaries (slow)')
+    parser.add_argument('--detection_log',
+                       help='Optional path to save per-frame detections as a binary detection log')
     
     args = parser.parse_args()
+    if not args.cameras and not (args.video_path and args.slot_config):
+        parser.error('either --cameras or both --video_path and --slot_config are required')
+    if args.cameras and args.detection_log:
+        parser.error('--detection_log records a single video and cannot be used with --cameras')
     
     try:
-        # Parse slot configuration
-        slot_config = parse_slot_config(args.slot_config)
+        # Parse slot (or per-camera) configuration
+        if args.cameras:
+            cameras = parse_camera_config(args.cameras)
+        else:
+            slot_config = parse_slot_config(args.slot_config)
         
         # Initialize processor
-        processor = VideoProcessor(args.model_path)
-        
-        # Process video
-        results = processor.process_video(
-            video_path=args.video_path,
-            slot_config=slot_config,
-            analysis_type=args.analysis_type,
-            output_format=args.output_format
-        )
+        detection_cache = None
+        if args.cache_dir:
+            detection_cache = DetectionCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
+        
+        processor = VideoProcessor(args.model_path, device=args.device,
+                                   input_size=args.input_size, warmup=args.warmup,
+                                   detection_cache=detection_cache,
+                                   decode=DecodeOptions(backend=args.decode_backend,
+                                                        threads=args.decode_threads,
+                                                        hw_acceleration=args.hw_decode),
+                                   memory=MemoryMonitor(args.memory_budget_mb, trace=args.trace_memory))
+        
+        metrics_server = None
+        if args.metrics_port is not None:
+            metrics_server = MetricsServer(processor.profiler, args.metrics_port,
+                                           gauges=processor.metrics_gauges).start()
+        
+        try:
+            # Process video(s)
+            with ProfileRun(args.profile, args.profile_output):
+                if args.cameras:
+                    results = processor.process_cameras(cameras, sample_interval=args.sample_interval)
+                else:
+                    results = processor.process_video(
+                        video_path=args.video_path,
+                        slot_config=slot_config,
+                        analysis_type=args.analysis_type,
+                        output_format=args.output_format,
+                        output_video=args.output_video,
+                        overlay=not args.no_overlay
+                    )
+        finally:
+            if metrics_server is not None:
+                metrics_server.stop()
+        
+        if args.detection_log:
+            processor.save_detection_log(args.detection_log, args.video_path)
         
         # Output results
-        if args.output_format == 'json':
-            # Ensure numpy types (np.bool_, np.int32, np.float32, etc.) are JSON serializable
-            def _json_default(o):
-                try:
-                    import numpy as _np  # local import to avoid hard dependency naming
-                    if isinstance(o, _np.bool_):
-                        return bool(o)
-                    if isinstance(o, _np.integer):
-                        return int(o)
-                    if isinstance(o, _np.floating):
-                        return float(o)
-                except Exception:
-                    pass
-                # Fallbacks
-                if hasattr(o, '__float__'):
-                    return float(o)
-                if hasattr(o, '__int__'):
-                    return int(o)
-                if hasattr(o, '__dict__'):
-                    return o.__dict__
-                return str(o)
-
-            print(json.dumps(results, default=_json_default))
+        if args.output_format in ('json', 'msgpack'):
+            # Encoded once; its own timing can only go to the log
+            start = time.perf_counter()
+            payload = serialize_results(results, args.output_format)
+            logger.info(f"Serialized results in {(time.perf_counter() - start) * 1000:.1f}ms "
+                        f"({len(payload)} bytes)")
+            if args.output_format == 'json':
+                payload += b'\n'  # Line-delimited for the backend's PythonShell
+            sys.stdout.flush()
+            sys.stdout.buffer.write(payload)
+            sys.stdout.buffer.flush()
         else:
             # CSV output would be implemented here
             print("CSV output not implemented yet")
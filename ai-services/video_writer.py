@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+AI Parking System - Annotated Video Writer
+Streams annotated frames to a video file from a background thread
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils import setup_logging, lazy_import, get_slot_overlay, SlotOverlay, VideoProcessingError
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+logger = setup_logging(__name__)
+
+DETECTION_COLOR = (0, 255, 0)
+OCCUPIED_COLOR = (0, 0, 255)
+FREE_COLOR = (0, 255, 0)
+UNKNOWN_COLOR = (255, 255, 255)
+
+def draw_detections(frame: np.ndarray, detections: List[Dict]) -> np.ndarray:
+    """
+    Draw detection boxes and labels onto a frame in place
+
+    Args:
+        frame: Image frame to draw on
+        detections: List of detection dictionaries
+
+    Returns:
+        The same frame
+    """
+    for detection in detections:
+        x, y, w, h = detection['bbox']
+        label = f"{detection['class']}: {detection['confidence']:.2f}"
+
+        cv2.rectangle(frame, (x, y), (x + w, y + h), DETECTION_COLOR, 2)
+        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+        cv2.rectangle(frame, (x, y - label_size[1] - 10), (x + label_size[0], y), DETECTION_COLOR, -1)
+        cv2.putText(frame, label, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+
+    return frame
+
+def draw_parking_slots(frame: np.ndarray, slots: List[Dict],
+                       occupancy: Optional[Dict] = None) -> np.ndarray:
+    """
+    Draw parking slot regions onto a frame in place
+
+    Args:
+        frame: Image frame to draw on
+        slots: List of parking slot configurations
+        occupancy: Optional mapping of slot id to occupied flag; slots
+            without an entry are drawn as free, and all slots are drawn
+            white when no occupancy is given
+
+    Returns:
+        The same frame
+    """
+    if not slots:
+        return frame
+    
+    # Layout, label positions and pixel masks are prerendered once per layout
+    height, width = frame.shape[:2]
+    overlay = get_slot_overlay(slots, (width, height))
+    return overlay.render(frame, slot_colors(overlay, occupancy))
+
+def slot_colors(overlay: SlotOverlay, occupancy: Optional[Dict]) -> np.ndarray:
+    """Per-slot colors: red occupied, green free, all white without occupancy"""
+    if occupancy:
+        palette = np.array([FREE_COLOR, FREE_COLOR, OCCUPIED_COLOR], dtype=np.uint8)
+        return palette[overlay.states(occupancy, missing=1)]
+    return np.tile(np.array(UNKNOWN_COLOR, dtype=np.uint8), (len(overlay.slot_ids), 1))
+
+class AnnotatedVideoWriter:
+    """
+    Streaming annotated-video writer
+
+    Frames are copied into a small pool of preallocated buffers, annotated
+    in place and handed to a background thread that encodes them, so memory
+    use depends on the queue size rather than on the video length. When the
+    encoder falls behind, write() blocks instead of buffering more frames.
+    """
+
+    def __init__(self, output_path: str, fps: float = 30, slots: Optional[List[Dict]] = None,
+                 overlay: bool = True, queue_size: int = 8, fourcc: str = 'mp4v'):
+        """
+        Initialize annotated video writer
+
+        Args:
+            output_path: Path to save the video
+            fps: Output frames per second
+            slots: Parking slot configurations drawn on every frame
+            overlay: Draw slots and detections (False writes the frames unchanged)
+            queue_size: Maximum number of frames waiting to be encoded
+            fourcc: Four character codec code
+        """
+        self.output_path = output_path
+        self.fps = fps if fps and fps > 0 else 30
+        self.slots = slots or []
+        self.overlay = overlay
+        self.queue_size = max(1, queue_size)
+        self.fourcc = fourcc
+
+        self.frame_size: Optional[Tuple[int, int]] = None
+        self._slot_overlay: Optional[SlotOverlay] = None
+        self._slot_colors = (None, None)
+        self.frames_written = 0
+        self._writer = None
+        self._thread = None
+        self._pending: Optional[queue.Queue] = None
+        self._free: Optional[queue.Queue] = None
+        self._error: Optional[BaseException] = None
+        self._closed = False
+
+    def __enter__(self) -> 'AnnotatedVideoWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _start(self, frame: np.ndarray):
+        """Open the video file and buffers using the first frame's geometry"""
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        if self.overlay and self.slots:
+            self._slot_overlay = get_slot_overlay(self.slots, self.frame_size)
+
+        self._writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                       self.fps, self.frame_size)
+        if not self._writer.isOpened():
+            raise VideoProcessingError(f"Cannot open video writer: {self.output_path}")
+
+        # One buffer per queued frame, plus one being encoded and one being drawn
+        self._free = queue.Queue()
+        for _ in range(self.queue_size + 2):
+            self._free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self._pending = queue.Queue(maxsize=self.queue_size)
+
+        self._thread = threading.Thread(target=self._encode_loop, name='annotated-video-writer',
+                                        daemon=True)
+        self._thread.start()
+        logger.info(f"Writing annotated video: {self.output_path} ({width}x{height} @ {self.fps} FPS)")
+
+    def _encode_loop(self):
+        while True:
+            buffer = self._pending.get()
+            if buffer is None:
+                break
+            try:
+                if self._error is None:
+                    self._writer.write(buffer)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._free.put(buffer)
+
+    def _check_error(self):
+        if self._error is not None:
+            raise VideoProcessingError(f"Annotated video writing failed: {str(self._error)}")
+
+    def write(self, frame: np.ndarray, detections: Optional[List[Dict]] = None,
+              occupancy: Optional[Dict] = None):
+        """
+        Annotate a frame and queue it for encoding
+
+        The caller's frame is not modified.
+
+        Args:
+            frame: BGR (or grayscale) video frame
+            detections: Vehicle detections to draw
+            occupancy: Mapping of slot id to occupied flag for slot colors
+        """
+        if self._closed:
+            raise VideoProcessingError("Annotated video writer is closed")
+        self._check_error()
+        if self._writer is None:
+            self._start(frame)
+
+        buffer = self._free.get()
+        width, height = self.frame_size
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        if frame.shape[1] != width or frame.shape[0] != height:
+            cv2.resize(frame, self.frame_size, dst=buffer)
+        else:
+            np.copyto(buffer, frame)
+
+        if self.overlay:
+            if self._slot_overlay is not None:
+                # Callers pass the same occupancy mapping until the next sampled frame
+                if self._slot_colors[0] is not occupancy:
+                    self._slot_colors = (occupancy, slot_colors(self._slot_overlay, occupancy))
+                self._slot_overlay.render(buffer, self._slot_colors[1])
+            if detections:
+                draw_detections(buffer, detections)
+
+        self._pending.put(buffer)
+        self.frames_written += 1
+
+    def close(self):
+        """Flush queued frames, stop the background thread and finalize the file"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join()
+        if self._writer is not None:
+            self._writer.release()
+            logger.info(f"Annotated video saved: {self.output_path} ({self.frames_written} frames)")
+        self._check_error()